@@ -0,0 +1,187 @@
+"""
+Priority admission control and per-provider token-bucket rate limiting
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Lower number = served first
+PRIORITIES = {
+    'interactive': 0,
+    'improvement': 1,
+    'batch': 2
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at limit-per-minute"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until amount tokens are available (0 if they are now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class _ProviderQueue:
+    def __init__(self, rpm: float, tpm: float):
+        self.request_bucket = TokenBucket(rpm) if rpm > 0 else None
+        self.token_bucket = TokenBucket(tpm) if tpm > 0 else None
+        self.waiting = []  # heap of (priority, seq)
+        self.depth = {name: 0 for name in PRIORITIES}
+
+    def time_until_admit(self, tokens: float) -> float:
+        wait_for = 0.0
+        if self.request_bucket:
+            wait_for = max(wait_for, self.request_bucket.time_until(1))
+        if self.token_bucket:
+            wait_for = max(wait_for, self.token_bucket.time_until(tokens))
+        return wait_for
+
+    def consume(self, tokens: float):
+        if self.request_bucket:
+            self.request_bucket.consume(1)
+        if self.token_bucket:
+            self.token_bucket.consume(tokens)
+
+
+class AdmissionController:
+    """
+    Schedules LLM calls per provider by priority class.
+
+    Callers block in acquire() until they are the highest-priority waiter for
+    their provider and both the request and token buckets have capacity.
+    Queues are bounded per class; batch work is shed as soon as its provider
+    has a backlog so it can't starve interactive traffic.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._queues: Dict[str, _ProviderQueue] = {}
+        self.max_depth = {
+            name: int(os.getenv(f'LLM_QUEUE_MAX_{name.upper()}', default))
+            for name, default in (('interactive', 100), ('improvement', 50), ('batch', 20))
+        }
+        self.max_wait = {
+            name: float(os.getenv(f'LLM_QUEUE_TIMEOUT_{name.upper()}', default))
+            for name, default in (('interactive', 30), ('improvement', 120), ('batch', 10))
+        }
+        self.batch_shed_depth = int(os.getenv('LLM_BATCH_SHED_DEPTH', 5))
+        self._stats = {
+            name: {'admitted': 0, 'rejected': 0, 'waits': deque(maxlen=500)}
+            for name in PRIORITIES
+        }
+
+    def _queue(self, provider: str) -> _ProviderQueue:
+        queue = self._queues.get(provider)
+        if queue is None:
+            prefix = provider.upper()
+            queue = self._queues[provider] = _ProviderQueue(
+                rpm=float(os.getenv(f'{prefix}_RPM', 0)),
+                tpm=float(os.getenv(f'{prefix}_TPM', 0))
+            )
+        return queue
+
+    def _reject(self, priority: str, message: str, retry_after: float):
+        self._stats[priority]['rejected'] += 1
+        raise AdmissionRejected(message, retry_after)
+
+    def acquire(self, provider: str, priority: str, tokens: float) -> float:
+        """Block until the request may run; returns the queue wait in seconds"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority class {priority}")
+
+        start = time.monotonic()
+        deadline = start + self.max_wait[priority]
+
+        with self._cond:
+            queue = self._queue(provider)
+            backlog = len(queue.waiting)
+            if queue.depth[priority] >= self.max_depth[priority]:
+                self._reject(priority, f"{priority} queue for {provider} is full", 1.0)
+            if priority == 'batch' and backlog >= self.batch_shed_depth:
+                self._reject(priority, f"Shedding batch work: {provider} has {backlog} queued requests", 5.0)
+
+            entry = (PRIORITIES[priority], next(self._seq))
+            heapq.heappush(queue.waiting, entry)
+            queue.depth[priority] += 1
+
+            try:
+                while True:
+                    if queue.waiting[0] == entry:
+                        wait_for = queue.time_until_admit(tokens)
+                        if wait_for == 0:
+                            queue.consume(tokens)
+                            break
+                    else:
+                        wait_for = None
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject(priority, f"Timed out waiting for {provider} capacity", wait_for or 1.0)
+                    self._cond.wait(min(remaining, wait_for) if wait_for else remaining)
+            finally:
+                queue.waiting.remove(entry)
+                heapq.heapify(queue.waiting)
+                queue.depth[priority] -= 1
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            self._stats[priority]['admitted'] += 1
+            self._stats[priority]['waits'].append(waited)
+            return waited
+
+    def get_stats(self) -> Dict:
+        """Get per-class admission counts and queue wait latency"""
+        with self._cond:
+            classes = {}
+            for name, stats in self._stats.items():
+                waits = sorted(stats['waits'])
+                classes[name] = {
+                    'admitted': stats['admitted'],
+                    'rejected': stats['rejected'],
+                    'avg_queue_wait': round(sum(waits) / len(waits), 4) if waits else 0,
+                    'p95_queue_wait': round(waits[int(round(0.95 * (len(waits) - 1)))], 4) if waits else 0
+                }
+            queued = {
+                provider: sum(queue.depth.values())
+                for provider, queue in self._queues.items()
+            }
+        return {
+            'classes': classes,
+            'queued': queued
+        }
+
+
+def estimate_tokens(*texts: Optional[str]) -> int:
+    """Rough token estimate (~4 chars per token)"""
+    return sum(len(t or '') for t in texts) // 4
@@ -10,6 +10,14 @@ from typing import List, Dict, Any, Optional
 
 from llm_service import llm_service
 from database_service import db_service
+from admission_control import estimate_tokens
+from prompt_compactor import compact_rules
+from reply_scorer import reply_scorer
+
+
+def format_chat_line(role: str, message: str) -> str:
+    """One chat message as it appears in the LLM's CHAT HISTORY"""
+    return f"[{str(role).upper()}] {message}"
 
 
 class AIService:
@@ -21,9 +29,13 @@ class AIService:
         with open(editor_prompt_path, "r", encoding="utf-8") as f:
             self.editor_prompt = f.read()
 
-    def _provider_used(self, provider: Optional[str]) -> str:
-        # Default to openai to avoid "claude not available" surprises
-        return provider or os.getenv("DEFAULT_LLM_PROVIDER", "openai")
+        # Improvements that push the chatbot prompt past this many tokens get compacted
+        self.prompt_token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", 1500))
+        self.llm_compaction = os.getenv("PROMPT_COMPACTION_LLM", "true").lower() != "false"
+
+    def _provider_used(self, provider: Optional[str], task: str = "chat_reply") -> str:
+        # The task's routed provider, else DEFAULT_LLM_PROVIDER (openai, to avoid "claude not available" surprises)
+        return provider or self.llm.default_provider(task)
 
     def format_chat_history(self, chat_history: List[Dict]) -> str:
         """Format chat history for LLM"""
@@ -32,9 +44,7 @@ class AIService:
 
         formatted = []
         for msg in chat_history:
-            role = str(msg.get("role", "")).upper()
-            message = str(msg.get("message", ""))
-            formatted.append(f"[{role}] {message}")
+            formatted.append(format_chat_line(msg.get("role", ""), str(msg.get("message", ""))))
 
         return "\n".join(formatted)
 
@@ -117,12 +127,18 @@ class AIService:
     # -------------------------
     # Confidence (provider-safe)
     # -------------------------
-    def calculate_confidence(self, reply: str, chat_history: List[Dict], provider: Optional[str] = None) -> dict:
+    def calculate_confidence(
+        self,
+        reply: str,
+        chat_history: List[Dict],
+        provider: Optional[str] = None,
+        priority: str = "interactive",
+    ) -> dict:
         """
         Use LLM to assess confidence when available; fallback to heuristic if it fails.
         IMPORTANT: Uses the same provider default as the rest of the app (no hardcoded 'claude').
         """
-        provider_used = self._provider_used(provider)
+        provider_used = self._provider_used(provider, "confidence")
 
         try:
             confidence_prompt = f"""Analyze this AI response and rate its confidence level.
@@ -148,6 +164,8 @@ Return STRICT JSON only:
                 prompt="You are a confidence analyzer. Assess AI responses objectively.",
                 user_message=confidence_prompt,
                 provider=provider_used,
+                priority=priority,
+                task="confidence",
             )
 
             # Some LLM wrappers return str; normalize to dict
@@ -194,6 +212,75 @@ Return STRICT JSON only:
                 "error": str(e),
             }
 
+    def build_reply_message(self, client_sequence, chat_history: List[Dict], history_text: Optional[str] = None):
+        """
+        Build the chat-reply user message; returns (message, formatted client sequence).
+        history_text is an already-formatted history (from a server-side session).
+        """
+        chat_history_formatted = history_text if history_text is not None else self.format_chat_history(chat_history)
+        client_sequence_formatted = self.format_client_sequence(client_sequence)
+
+        user_message = f"""CHAT HISTORY:
+{chat_history_formatted}
+
+CLIENT SEQUENCE:
+{client_sequence_formatted}
+
+Generate response in JSON with "reply" field only.
+"""
+        return user_message, client_sequence_formatted
+
+    def fit_prompt_budget(
+        self, prompt: str, provider: Optional[str] = None, priority: str = "improvement"
+    ) -> tuple:
+        """
+        Compact a prompt that is over the token budget.
+        Returns (prompt, compaction info or None if the prompt was within budget).
+        """
+        tokens_before = estimate_tokens(prompt)
+        if tokens_before <= self.prompt_token_budget:
+            return prompt, None
+
+        compacted, info = compact_rules(prompt)
+        info["methods"] = ["dedupe"]
+
+        if estimate_tokens(compacted) > self.prompt_token_budget and self.llm_compaction:
+            user_message = f"""CURRENT PROMPT:
+{compacted}
+
+USER INSTRUCTIONS:
+This prompt has grown past {self.prompt_token_budget} tokens. Merge overlapping or redundant rules into single rules and
+remove repetition. Keep every distinct instruction, fact, fee and example; do not add new rules.
+
+Return STRICT JSON only:
+{{"explanation": "...", "updated_prompt": "..."}}
+"""
+            try:
+                response = self.llm.generate_response(
+                    prompt="You are a prompt engineer. Compact prompts without losing instructions.",
+                    user_message=user_message,
+                    provider=self._provider_used(provider, "compaction"),
+                    priority=priority,
+                    task="compaction",
+                )
+                if isinstance(response, str):
+                    try:
+                        response = json.loads(response)
+                    except Exception:
+                        response = {}
+                merged = response.get("updated_prompt")
+                # Only accept a merge that actually made the prompt smaller
+                if merged and estimate_tokens(merged) < estimate_tokens(compacted):
+                    compacted = merged
+                    info["methods"].append("llm_merge")
+            except Exception as e:
+                info["llm_error"] = str(e)
+
+        info["tokens_before"] = tokens_before
+        info["tokens_after"] = estimate_tokens(compacted)
+        info["budget"] = self.prompt_token_budget
+        return compacted, info
+
     # -------------------------
     # Core endpoints
     # -------------------------
@@ -203,30 +290,38 @@ Return STRICT JSON only:
         chat_history: List[Dict],
         provider: str = None,
         include_analytics: bool = True,
+        priority: str = "interactive",
+        chatbot_prompt: Optional[str] = None,
+        prompt_version: Optional[int] = None,
+        history_text: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        contact_id: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Generate AI reply with confidence and sentiment"""
+        """
+        Generate AI reply with confidence and sentiment.
+        chatbot_prompt (and its prompt_version) lets batch callers reuse one prompt version for every item;
+        history_text/session_id come from a server-side chat session;
+        user_id (the consultant) and contact_id (the client) scope the saved conversation.
+        """
         start_time = time.time()
         provider_used = self._provider_used(provider)
 
-        chatbot_prompt = self.db.get_prompt()
+        if chatbot_prompt is None:
+            chatbot_prompt, prompt_version = self.db.get_prompt_version()
 
-        chat_history_formatted = self.format_chat_history(chat_history)
-        client_sequence_formatted = self.format_client_sequence(client_sequence)
-
-        user_message = f"""CHAT HISTORY:
-{chat_history_formatted}
-
-CLIENT SEQUENCE:
-{client_sequence_formatted}
-
-Generate response in JSON with "reply" field only.
-"""
+        user_message, client_sequence_formatted = self.build_reply_message(client_sequence, chat_history, history_text)
 
         response = self.llm.generate_response(
             prompt=chatbot_prompt,
             user_message=user_message,
             provider=provider_used,
+            priority=priority,
+            task="chat_reply",
         )
+        queue_wait = self.llm.last_queue_wait()
+        # Routing, failover or a hedge may have answered from another provider than the one asked for
+        provider_used = self.llm.last_provider() or provider_used
 
         # normalize if response is a JSON string
         if isinstance(response, str):
@@ -241,12 +336,16 @@ Generate response in JSON with "reply" field only.
         result: Dict[str, Any] = {
             "reply": ai_reply,
             "response_time": round(response_time, 3),
+            "queue_wait": round(queue_wait, 3),
             "provider": provider_used,
         }
 
         if include_analytics:
             sentiment = self.analyze_sentiment(client_sequence_formatted)
-            confidence = self.calculate_confidence(ai_reply, chat_history, provider=provider_used)
+            # The caller's provider choice, else the confidence task's own route
+            confidence = self.calculate_confidence(
+                ai_reply, chat_history, provider=provider, priority=priority
+            )
 
             result["sentiment"] = sentiment
             result["confidence"] = confidence
@@ -256,23 +355,31 @@ Generate response in JSON with "reply" field only.
                 {
                     "endpoint": "generate_reply",
                     "response_time": response_time,
+                    "queue_wait": queue_wait,
                     "tokens_used": len(ai_reply.split()) * 1.3,  # rough estimate
                     "estimated_cost": len(ai_reply.split()) * 0.000002,  # rough estimate
                     "provider": provider_used,
+                    "prompt_version": prompt_version,
                 }
             )
 
             # Save conversation (optional)
-            self.db.save_conversation(
-                {
-                    "client_message": client_sequence_formatted,
-                    "ai_reply": ai_reply,
-                    "sentiment": sentiment,
-                    "confidence": confidence,
-                    "response_time": response_time,
-                    "provider": provider_used,
-                }
-            )
+            conversation = {
+                "client_message": client_sequence_formatted,
+                "ai_reply": ai_reply,
+                "sentiment": sentiment,
+                "confidence": confidence,
+                "response_time": response_time,
+                "provider": provider_used,
+                "prompt_version": prompt_version,
+            }
+            if session_id:
+                conversation["session_id"] = session_id
+            if user_id:
+                conversation["user_id"] = user_id
+            if contact_id:
+                conversation["contact_id"] = contact_id
+            self.db.save_conversation(conversation)
 
         return result
 
@@ -282,14 +389,25 @@ Generate response in JSON with "reply" field only.
         chat_history: List[Dict],
         consultant_reply,
         provider: str = None,
+        priority: str = "improvement",
+        apply: bool = True,
+        predicted_reply: Optional[str] = None,
+        similarity: Optional[Dict] = None,
     ) -> Dict[str, Any]:
-        """Auto-improve prompt with diff tracking"""
-        provider_used = self._provider_used(provider)
+        """
+        Auto-improve prompt with diff tracking.
+        apply=False returns the edited prompt without making it live (for shadow evaluation);
+        predicted_reply skips the prediction call when the caller already made it, and similarity
+        is its reply_scorer result when the caller scored a whole batch at once.
+        The editor isn't called when the predicted reply already matches the consultant's.
+        """
+        provider_used = self._provider_used(provider, "editor")
 
-        predicted_result = self.generate_reply(
-            client_sequence, chat_history, provider_used, include_analytics=False
-        )
-        predicted_reply = predicted_result["reply"]
+        if predicted_reply is None:
+            predicted_result = self.generate_reply(
+                client_sequence, chat_history, provider, include_analytics=False, priority=priority
+            )
+            predicted_reply = predicted_result["reply"]
 
         current_prompt = self.db.get_prompt()
 
@@ -318,10 +436,32 @@ Analyze and provide improved prompt. Return JSON with:
 - changes_made
 """
 
+        if similarity is None:
+            similarity = reply_scorer.score(predicted_reply, consultant_reply_formatted)
+        if similarity["skip_editor"]:
+            reply_scorer.record(similarity, self._editor_savings(provider_used, current_prompt, editor_user_message))
+            analysis = f"Predicted reply already matches the consultant's (similarity {similarity['similarity']}); editor skipped"
+            return {
+                "predicted_reply": predicted_reply,
+                "actual_reply": consultant_reply_formatted,
+                "analysis": analysis,
+                "changes_made": "No changes",
+                "updated_prompt": current_prompt,
+                "old_prompt": current_prompt,
+                "new_prompt": current_prompt,
+                "metadata": {"analysis": analysis, "provider": provider_used, "similarity": similarity},
+                "provider": provider_used,
+                "similarity": similarity,
+                "editor_skipped": True,
+            }
+        reply_scorer.record(similarity)
+
         editor_response = self.llm.generate_response(
             prompt=self.editor_prompt,
             user_message=editor_user_message,
             provider=provider_used,
+            priority=priority,
+            task="editor",
         )
 
         if isinstance(editor_response, str):
@@ -333,15 +473,19 @@ Analyze and provide improved prompt. Return JSON with:
         updated_prompt = editor_response.get("updated_prompt", current_prompt)
         analysis = editor_response.get("analysis", "No analysis")
         changes_made = editor_response.get("changes_made", "No changes")
+        updated_prompt, compaction = self.fit_prompt_budget(updated_prompt, provider, priority)
 
-        update_result = self.db.set_prompt(
-            updated_prompt,
-            {
-                "analysis": analysis,
-                "changes": changes_made,
-                "provider": provider_used,
-            },
-        )
+        metadata = {
+            "analysis": analysis,
+            "changes": changes_made,
+            "provider": provider_used,
+        }
+        if compaction:
+            metadata["compaction"] = compaction
+        if apply:
+            update_result = self.db.set_prompt(updated_prompt, metadata)
+        else:
+            update_result = {"old_prompt": current_prompt, "new_prompt": updated_prompt}
 
         return {
             "predicted_reply": predicted_reply,
@@ -351,12 +495,32 @@ Analyze and provide improved prompt. Return JSON with:
             "updated_prompt": updated_prompt,
             "old_prompt": update_result["old_prompt"],
             "new_prompt": update_result["new_prompt"],
+            "metadata": metadata,
             "provider": provider_used,
+            "similarity": similarity,
+            "editor_skipped": False,
         }
 
-    def improve_prompt_manual(self, instructions: str, provider: str = None) -> Dict[str, Any]:
-        """Manually improve prompt"""
-        provider_used = self._provider_used(provider)
+    def _editor_savings(self, provider: str, current_prompt: str, editor_user_message: str) -> Dict:
+        """Estimated tokens, cost and time of an editor call that was skipped"""
+        routing = self.llm.routing
+        input_tokens = estimate_tokens(self.editor_prompt, editor_user_message)
+        # The editor answers with the whole prompt, rewritten
+        output_tokens = estimate_tokens(current_prompt)
+        price = routing.price(routing.settings("editor", provider)["model"])
+        editor_stats = routing.get_stats()["tasks"].get("editor", {})
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "estimated_cost": (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000 if price else 0.0,
+            "seconds": editor_stats.get("p50_latency") or 0.0,
+        }
+
+    def improve_prompt_manual(
+        self, instructions: str, provider: str = None, priority: str = "improvement", apply: bool = True
+    ) -> Dict[str, Any]:
+        """Manually improve prompt (apply=False leaves the live prompt unchanged)"""
+        provider_used = self._provider_used(provider, "manual_edit")
         current_prompt = self.db.get_prompt()
 
         user_message = f"""CURRENT PROMPT:
@@ -373,6 +537,8 @@ Return STRICT JSON only:
             prompt="You are a prompt engineer. Update prompts based on instructions.",
             user_message=user_message,
             provider=provider_used,
+            priority=priority,
+            task="manual_edit",
         )
 
         if isinstance(response, str):
@@ -383,17 +549,22 @@ Return STRICT JSON only:
 
         updated_prompt = response.get("updated_prompt", current_prompt)
         explanation = response.get("explanation", "Updated")
+        updated_prompt, compaction = self.fit_prompt_budget(updated_prompt, provider, priority)
 
-        update_result = self.db.set_prompt(
-            updated_prompt,
-            {"manual_instruction": instructions, "provider": provider_used},
-        )
+        metadata = {"manual_instruction": instructions, "provider": provider_used}
+        if compaction:
+            metadata["compaction"] = compaction
+        if apply:
+            update_result = self.db.set_prompt(updated_prompt, metadata)
+        else:
+            update_result = {"old_prompt": current_prompt, "new_prompt": updated_prompt}
 
         return {
             "explanation": explanation,
             "updated_prompt": updated_prompt,
             "old_prompt": update_result["old_prompt"],
             "new_prompt": update_result["new_prompt"],
+            "metadata": metadata,
             "provider": provider_used,
         }
 
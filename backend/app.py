@@ -2,20 +2,89 @@
 Enhanced Flask API with all premium features
 """
 import os
+import hmac
 import difflib
-from flask import Flask, request, jsonify
+import functools
+import time
+from datetime import datetime
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 from ai_service import ai_service
+from llm_service import llm_service
+from admission_control import AdmissionRejected
+from provider_clients import ProviderCallError
+from fast_json import FastJSONProvider, dumps, encode_object, json_bytes_response
+from http_utils import compress_response, not_modified, parse_fields, project, version_etag, with_etag
 from database_service import db_service
 from document_service import document_service
-from data_processor import load_conversations, extract_sequences
+from batch_service import batch_service
+from shadow_service import shadow_service
+from improvement_queue import improvement_queue
+from session_store import session_store
+from event_stream import KINDS, event_bus
+from training_dataset import training_dataset
+from reply_scorer import reply_scorer
+from profiler import profiler
 import traceback
 
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+app.json = FastJSONProvider(app)
+CORS(app, expose_headers=['ETag'])
+
+COMPRESSION_ENABLED = os.getenv('RESPONSE_COMPRESSION', 'true').lower() != 'false'
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+@app.before_request
+def profile_request_start():
+    """Register the request with a running profile (a single flag check otherwise)"""
+    if profiler.active and request.endpoint != 'events' and not request.path.startswith('/admin/'):
+        profiler.request_started(request.method, request.path, request.url_rule.rule if request.url_rule else None)
+
+@app.teardown_request
+def profile_request_end(exc):
+    if profiler.active:
+        profiler.request_finished()
+
+@app.after_request
+def compress(response):
+    """gzip/brotli large JSON and text responses"""
+    if COMPRESSION_ENABLED:
+        return compress_response(response, request, min_bytes=COMPRESS_MIN_BYTES)
+    return response
+
+def rejected_response(e: AdmissionRejected):
+    """429 response for requests shed by admission control"""
+    response = jsonify({'error': str(e), 'retryAfter': e.retry_after})
+    response.headers['Retry-After'] = str(max(1, int(round(e.retry_after))))
+    return response, 429
+
+def provider_error_response(e: ProviderCallError):
+    """Upstream failure after retries: 504 on timeouts, 503 when the provider is overloaded, else 502"""
+    body = {'error': str(e), 'provider': e.provider, 'upstreamStatus': e.status, 'attempts': e.attempts}
+    if e.timed_out or e.status in (408, 504):
+        return jsonify(body), 504
+    if e.status in (429, 503):
+        response = jsonify({**body, 'retryAfter': e.retry_after})
+        if e.retry_after is not None:
+            response.headers['Retry-After'] = str(max(1, int(round(e.retry_after))))
+        return response, 503
+    return jsonify(body), 502
+
+def admin_required(view):
+    """Require Authorization: Bearer <ADMIN_TOKEN>; admin endpoints are off when ADMIN_TOKEN is unset"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Admin endpoints are disabled (set ADMIN_TOKEN)'}), 403
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {ADMIN_TOKEN}'.encode('utf-8')):
+            return jsonify({'error': 'Unauthorized'}), 401
+        return view(*args, **kwargs)
+    return wrapper
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -31,7 +100,11 @@ def health():
             'conversation-history',
             'performance-metrics',
             'document-upload'
-        ]
+        ],
+        'components': {
+            'llm': llm_service.get_component_status(),
+            'documents': document_service.get_component_status()
+        }
     })
 
 @app.route('/', methods=['GET'])
@@ -41,15 +114,35 @@ def home():
         'service': 'Issa Compass AI Assistant v2.0',
         'endpoints': {
             'POST /generate-reply': 'Generate AI response with analytics',
-            'POST /improve-ai': 'Auto-improve AI',
+            'GET /sessions/<session_id>': 'Chat session history',
+            'DELETE /sessions/<session_id>': 'End a chat session',
+            'POST /generate-reply/batch': 'Generate replies for many inquiries (bulk, streaming or deferred)',
+            'GET /generate-reply/batch/<batch_id>': 'Deferred batch status and results',
+            'POST /improve-ai': 'Queue an auto-improvement job',
+            'GET /improve-ai/jobs/<job_id>': 'Improvement job status and result',
             'POST /improve-ai-manual': 'Manual improvement',
             'GET /get-prompt': 'Get current prompt',
             'GET /test-training': 'Test on sample data',
+            'GET /training-data': 'Training sequences by index, or a (stratified) sample',
             'GET /analytics': 'Get improvement analytics',
+            'GET /analytics/quality': 'Sentiment, confidence and review queues by provider, prompt version and time',
             'GET /conversations': 'Get conversation history',
             'POST /conversations/search': 'Search conversations',
             'GET /performance': 'Get performance metrics',
             'GET /prompt-diff': 'Get prompt differences',
+            'GET /events': 'Live conversations, metrics and prompt versions (server-sent events)',
+            'GET /prompt-candidates': 'Candidate prompts with shadow comparisons',
+            'POST /prompt-candidates': 'Add a candidate prompt for shadow evaluation (admin)',
+            'POST /prompt-candidates/<id>/promote': 'Make a candidate live once it meets its budgets (admin)',
+            'DELETE /prompt-candidates/<id>': 'Discard a candidate (admin)',
+            'GET /model-routing': 'Per-task provider/model routing with latency and cost',
+            'PUT /model-routing': 'Replace the routing table (admin)',
+            'POST /model-routing/reload': 'Re-read the routing file (admin)',
+            'POST /admin/profile': 'Profile the next N requests or a time window (admin)',
+            'GET /admin/profile': 'Profile result; ?format=collapsed for flamegraph stacks (admin)',
+            'DELETE /admin/profile': 'Stop the running profile (admin)',
+            'POST /admin/memory/snapshot': 'tracemalloc snapshot with top sites and diff (admin)',
+            'DELETE /admin/memory': 'Stop tracemalloc and drop snapshots (admin)',
             'POST /upload-document': 'Upload and analyze document',
             'GET /health': 'Health check'
         }
@@ -67,6 +160,10 @@ def generate_reply():
         chat_history = data.get('chatHistory', [])
         provider = data.get('provider')
         include_analytics = data.get('includeAnalytics', True)
+        session_id = data.get('sessionId')
+        # Consultant and client the conversation belongs to (for scoped history and search)
+        user_id = data.get('userId')
+        contact_id = data.get('contactId')
         
         if not client_sequence:
             return jsonify({'error': 'clientSequence required'}), 400
@@ -74,28 +171,139 @@ def generate_reply():
         if isinstance(client_sequence, str):
             client_sequence = [client_sequence]
         
-        result = ai_service.generate_reply(
-            client_sequence=client_sequence,
-            chat_history=chat_history,
-            provider=provider,
-            include_analytics=include_analytics
-        )
-        
-        return jsonify({
+        # With a sessionId the server holds the history; send chatHistory only to start
+        # a session ("session": true) or to re-seed one that expired
+        session = session_store.get(session_id) if session_id else None
+        if session is None:
+            if session_id and not chat_history:
+                return jsonify({'error': 'Unknown or expired session', 'sessionId': session_id}), 404
+            if session_id or data.get('session'):
+                session = session_store.create(chat_history, session_id)
+        elif chat_history:
+            return jsonify({'error': 'Send chatHistory or an active sessionId, not both'}), 400
+        
+        def reply(history_text):
+            return ai_service.generate_reply(
+                client_sequence=client_sequence,
+                chat_history=chat_history,
+                provider=provider,
+                include_analytics=include_analytics,
+                history_text=history_text,
+                session_id=session.id if session else None,
+                user_id=user_id,
+                contact_id=contact_id
+            )
+        
+        if session is None:
+            history_text = ai_service.format_chat_history(chat_history)
+            result = reply(history_text)
+        else:
+            # One turn at a time per session, so concurrent turns can't interleave the history
+            with session.turn_lock:
+                history_text = session.history_text()
+                result = reply(history_text)
+                session.append_turn([str(message) for message in client_sequence], result['reply'])
+        shadow_service.observe(client_sequence, history_text, provider, result)
+        
+        response = {
             'aiReply': result['reply'],
             'responseTime': result.get('response_time'),
+            'queueWait': result.get('queue_wait'),
             'sentiment': result.get('sentiment'),
             'confidence': result.get('confidence'),
-            'provider': provider or os.getenv('DEFAULT_LLM_PROVIDER', 'claude')
+            'provider': result.get('provider')
+        }
+        if session:
+            response['sessionId'] = session.id
+        return jsonify(response)
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except ProviderCallError as e:
+        return provider_error_response(e)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    """Chat session history"""
+    try:
+        session = session_store.get(session_id)
+        if session is None:
+            return jsonify({'error': 'Unknown or expired session'}), 404
+        return jsonify({**session.summary(), 'chatHistory': session.messages()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """End a chat session"""
+    try:
+        if not session_store.delete(session_id):
+            return jsonify({'error': 'Unknown or expired session'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/generate-reply/batch', methods=['POST'])
+def generate_reply_batch():
+    """Generate replies for many (clientSequence, chatHistory) items at once"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON data'}), 400
+        
+        items, error = batch_service.validate(data.get('items'))
+        if error:
+            return jsonify({'error': error}), 400
+        
+        provider = data.get('provider')
+        include_analytics = data.get('includeAnalytics', True)
+        mode = data.get('mode', 'sync')
+        
+        if mode == 'deferred':
+            try:
+                return jsonify(batch_service.submit_deferred(items, provider)), 202
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        if mode != 'sync':
+            return jsonify({'error': 'mode must be sync or deferred'}), 400
+        
+        results = batch_service.run(items, provider, include_analytics)
+        
+        if data.get('stream'):
+            # One JSON line per item, in completion order
+            return Response(
+                (dumps(result) + b'\n' for result in results),
+                mimetype='application/x-ndjson'
+            )
+        
+        ordered = sorted(results, key=lambda r: r['index'])
+        return jsonify({
+            'results': ordered,
+            'count': len(ordered),
+            'errors': sum(1 for r in ordered if 'error' in r)
         })
     except Exception as e:
         print(f"Error: {str(e)}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/generate-reply/batch/<batch_id>', methods=['GET'])
+def get_reply_batch(batch_id):
+    """Deferred batch status and results"""
+    try:
+        status = batch_service.get_deferred(batch_id)
+        if status is None:
+            return jsonify({'error': 'Unknown batch'}), 404
+        return jsonify(status)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/improve-ai', methods=['POST'])
 def improve_ai():
-    """Auto-improve AI with diff tracking"""
+    """Queue an auto-improvement job; poll /improve-ai/jobs/<job_id> for the result"""
     try:
         data = request.get_json()
         if not data:
@@ -105,6 +313,7 @@ def improve_ai():
         chat_history = data.get('chatHistory', [])
         consultant_reply = data.get('consultantReply')
         provider = data.get('provider')
+        shadow = data.get('shadow', shadow_service.enabled)
         
         if not client_sequence or not consultant_reply:
             return jsonify({'error': 'clientSequence and consultantReply required'}), 400
@@ -114,24 +323,29 @@ def improve_ai():
         if isinstance(consultant_reply, str):
             consultant_reply = [consultant_reply]
         
-        result = ai_service.improve_prompt_auto(
-            client_sequence, chat_history, consultant_reply, provider
+        job, deduplicated = improvement_queue.submit(
+            client_sequence, chat_history, consultant_reply, provider, shadow=bool(shadow)
         )
         
-        return jsonify({
-            'predictedReply': result['predicted_reply'],
-            'actualReply': result['actual_reply'],
-            'analysis': result['analysis'],
-            'changesMade': result['changes_made'],
-            'updatedPrompt': result['updated_prompt'],
-            'oldPrompt': result['old_prompt'],
-            'newPrompt': result['new_prompt']
-        })
+        response = jsonify({**job, 'deduplicated': deduplicated, 'statusUrl': f"/improve-ai/jobs/{job['jobId']}"})
+        response.headers['Location'] = f"/improve-ai/jobs/{job['jobId']}"
+        return response, 202
     except Exception as e:
         print(f"Error: {str(e)}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/improve-ai/jobs/<job_id>', methods=['GET'])
+def get_improve_job(job_id):
+    """Improvement job status; includes the prompt edit once completed"""
+    try:
+        job = improvement_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Unknown job'}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/improve-ai-manual', methods=['POST'])
 def improve_ai_manual():
     """Manual improvement with diff"""
@@ -142,18 +356,31 @@ def improve_ai_manual():
         
         instructions = data.get('instructions')
         provider = data.get('provider')
+        shadow = data.get('shadow', shadow_service.enabled)
         
         if not instructions:
             return jsonify({'error': 'instructions required'}), 400
         
-        result = ai_service.improve_prompt_manual(instructions, provider)
+        if shadow:
+            result = ai_service.improve_prompt_manual(instructions, provider, apply=False)
+        else:
+            result = improvement_queue.apply_exclusive(
+                lambda: ai_service.improve_prompt_manual(instructions, provider, apply=True)
+            )
         
-        return jsonify({
+        response = {
             'explanation': result['explanation'],
             'updatedPrompt': result['updated_prompt'],
             'oldPrompt': result['old_prompt'],
             'newPrompt': result['new_prompt']
-        })
+        }
+        if shadow:
+            response['candidate'] = shadow_service.add_candidate(result['updated_prompt'], result['metadata'])
+        return jsonify(response)
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except ProviderCallError as e:
+        return provider_error_response(e)
     except Exception as e:
         print(f"Error: {str(e)}")
         traceback.print_exc()
@@ -163,44 +390,107 @@ def improve_ai_manual():
 def get_prompt():
     """Get current prompt"""
     try:
-        current_prompt = db_service.get_prompt()
-        return jsonify({'prompt': current_prompt})
+        fields = parse_fields(request.args.get('fields'))
+        current_prompt, version = db_service.get_prompt_version()
+        etag = version_etag('prompt', version, fields)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        
+        return with_etag(jsonify(project({'prompt': current_prompt, 'version': version}, fields)), etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def select_training_sequences(args, default_n: int) -> list:
+    """
+    Sequence indices picked by query args: indices=1,5,9 for exact ones, otherwise
+    n (default_n) of them by sample=first|random|stratified, optionally within a scenario
+    """
+    if args.get('indices'):
+        indices = [int(i) for i in args['indices'].split(',')]
+        bad = [i for i in indices if not 0 <= i < len(training_dataset)]
+        if bad:
+            raise ValueError(f"indices out of range: {bad}")
+        return indices
+    
+    n = int(args.get('n', default_n))
+    sample = args.get('sample', 'first')
+    scenario = args.get('scenario')
+    seed = args.get('seed', type=int)
+    if sample == 'first':
+        if scenario:
+            return [int(i) for i in training_dataset.by_scenario().get(scenario, [])[:n]]
+        return list(range(min(n, len(training_dataset))))
+    if sample in ('random', 'stratified'):
+        return training_dataset.sample(n, stratified=sample == 'stratified', seed=seed, scenario=scenario)
+    raise ValueError('sample must be first, random or stratified')
+
 @app.route('/test-training', methods=['GET'])
 def test_training():
     """Test training on sample data"""
     try:
-        conversations = load_conversations('conversations.json')
-        sequences = extract_sequences(conversations)
-        
-        if len(sequences) == 0:
+        if len(training_dataset) == 0:
             return jsonify({'error': 'No sequences found'}), 400
         
+        try:
+            indices = select_training_sequences(request.args, default_n=3)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Predict every reply first, then score the whole batch against the consultants' replies
+        # in one pass; only sequences the chatbot got wrong go to the editor
+        sequences = training_dataset.get_many(indices)
+        predictions = {}
+        for seq in sequences:
+            try:
+                predictions[seq['index']] = ai_service.generate_reply(
+                    seq['client_sequence'], seq['chat_history'], include_analytics=False, priority='batch'
+                )['reply']
+            except Exception as e:
+                predictions[seq['index']] = e
+        predicted = [seq for seq in sequences if not isinstance(predictions[seq['index']], Exception)]
+        scores = dict(zip(
+            [seq['index'] for seq in predicted],
+            reply_scorer.score_batch(
+                [predictions[seq['index']] for seq in predicted],
+                [ai_service.format_client_sequence(seq['consultant_reply']) for seq in predicted]
+            )
+        ))
+        
         results = []
-        for i, seq in enumerate(sequences[:3]):
+        for i, seq in enumerate(sequences):
+            index = seq['index']
             try:
-                result = ai_service.improve_prompt_auto(
+                if isinstance(predictions[index], Exception):
+                    raise predictions[index]
+                # Applied between queued /improve-ai edits so neither overwrites the other
+                result = improvement_queue.apply_exclusive(lambda: ai_service.improve_prompt_auto(
                     seq['client_sequence'],
                     seq['chat_history'],
-                    seq['consultant_reply']
-                )
+                    seq['consultant_reply'],
+                    priority='batch',
+                    predicted_reply=predictions[index],
+                    similarity=scores[index]
+                ))
                 
                 results.append({
                     'sequence_num': i + 1,
+                    'sequence_index': index,
                     'contact_id': seq['contact_id'],
                     'scenario': seq['scenario'],
                     'predicted_reply': result['predicted_reply'],
                     'actual_reply': result['actual_reply'],
-                    'analysis': result['analysis']
+                    'analysis': result['analysis'],
+                    'similarity': result['similarity']['similarity'],
+                    'editor_skipped': result['editor_skipped']
                 })
             except Exception as e:
-                results.append({'sequence_num': i + 1, 'error': str(e)})
+                results.append({'sequence_num': i + 1, 'sequence_index': index, 'error': str(e)})
         
         return jsonify({
-            'message': 'Training completed on 3 sequences',
-            'total_sequences_available': len(sequences),
+            'message': f'Training completed on {len(indices)} sequences',
+            'total_sequences_available': len(training_dataset),
+            'editor_skipped': sum(1 for r in results if r.get('editor_skipped')),
             'results': results
         })
     except Exception as e:
@@ -208,18 +498,85 @@ def test_training():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/training-data', methods=['GET'])
+def training_data():
+    """Training sequences by index or sample; without either, the dataset summary"""
+    try:
+        if not any(key in request.args for key in ('indices', 'n', 'sample')):
+            return jsonify(training_dataset.get_stats())
+        
+        try:
+            indices = select_training_sequences(request.args, default_n=10)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        sequences = training_dataset.get_many(indices)
+        return jsonify({
+            'count': len(sequences),
+            'total_sequences_available': len(training_dataset),
+            'sequences': sequences
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/analytics', methods=['GET'])
 def analytics():
     """Get improvement analytics"""
     try:
+        # fields= projects the history entries, e.g. fields=version,timestamp,metadata
+        # leaves out the prompt bodies
+        fields = parse_fields(request.args.get('fields'))
         history = db_service.get_improvement_history()
         current_version = db_service.storage['version']
+        # Reply latency for the live version keeps moving between prompt updates
+        editor_gate = reply_scorer.get_stats()
+        etag = version_etag(
+            'analytics', current_version, fields, db_service.get_reply_count(current_version), editor_gate['scored']
+        )
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
         
-        return jsonify({
+        summary = {
             'current_version': current_version,
             'total_improvements': len(history),
-            'improvement_history': history[-10:]
-        })
+            'prompt_versions': db_service.get_prompt_sizes(),
+            'editor_gate': editor_gate
+        }
+        if fields is None:
+            body = encode_object(summary, {'improvement_history': db_service.get_improvement_history_encoded(10)})
+        else:
+            body = dumps({**summary, 'improvement_history': [project(entry, fields) for entry in history[-10:]]})
+        return with_etag(json_bytes_response(body), etag)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/analytics/quality', methods=['GET'])
+def analytics_quality():
+    """Reply quality from the incrementally maintained views (no conversation scan)"""
+    try:
+        since = request.args.get('since')
+        hours = request.args.get('hours')
+        if since:
+            since = datetime.fromisoformat(since).timestamp()
+        elif hours:
+            since = time.time() - float(hours) * 3600
+        version = request.args.get('version')
+        args = (
+            since,
+            request.args.get('provider'),
+            int(version) if version else None,
+            request.args.get('by'),
+            int(request.args.get('review', 20))
+        )
+        # Changes with every saved conversation (and the hours window with the clock)
+        etag = version_etag('quality', db_service.quality.updates, args)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        return with_etag(json_bytes_response(dumps(db_service.get_quality(*args))), etag)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -230,16 +587,23 @@ def get_conversations():
     try:
         limit = int(request.args.get('limit', 50))
         offset = int(request.args.get('offset', 0))
+        user_id = request.args.get('userId')
+        contact_id = request.args.get('contactId')
         
-        conversations = db_service.get_conversations(limit, offset)
-        total = len(db_service.storage['conversations'])
+        change_seq, (conversations, total) = db_service.read_consistent(lambda: (
+            db_service.get_conversations_encoded(limit, offset, user_id, contact_id),
+            db_service.count_conversations(user_id, contact_id)
+        ))
         
-        return jsonify({
-            'conversations': conversations,
-            'total': total,
-            'limit': limit,
-            'offset': offset
-        })
+        return json_bytes_response(encode_object(
+            {
+                'total': total,
+                'limit': limit,
+                'offset': offset,
+                'cursor': event_bus.cursor(change_seq)
+            },
+            {'conversations': conversations}
+        ))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -249,13 +613,24 @@ def search_conversations():
     try:
         data = request.get_json()
         query = data.get('query', '')
-        
-        results = db_service.search_conversations(query)
+        # mode=semantic ranks by meaning (top k) instead of substring matching
+        mode = request.args.get('mode') or data.get('mode', 'text')
+        user_id = data.get('userId')
+        contact_id = data.get('contactId')
+        
+        if mode == 'semantic':
+            k = int(request.args.get('k') or data.get('k', 20))
+            results = db_service.search_conversations_semantic(query, k, user_id, contact_id)
+        elif mode == 'text':
+            results = db_service.search_conversations(query, user_id, contact_id)
+        else:
+            return jsonify({'error': 'mode must be text or semantic'}), 400
         
         return jsonify({
             'results': results,
             'count': len(results),
-            'query': query
+            'query': query,
+            'mode': mode
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -267,7 +642,9 @@ def export_conversations():
         import csv
         from io import StringIO
         
-        conversations = db_service.get_conversations(limit=1000)
+        conversations = db_service.get_conversations(
+            limit=1000, user_id=request.args.get('userId'), contact_id=request.args.get('contactId')
+        )
         
         output = StringIO()
         writer = csv.DictWriter(output, fieldnames=['id', 'timestamp', 'client_message', 'ai_reply', 'sentiment', 'confidence'])
@@ -297,26 +674,67 @@ def performance_metrics():
     try:
         limit = int(request.args.get('limit', 100))
         
-        metrics = db_service.get_performance_metrics(limit)
-        summary = db_service.get_performance_summary()
+        change_seq, (metrics, summary) = db_service.read_consistent(lambda: (
+            db_service.get_performance_metrics(limit),
+            db_service.get_performance_summary()
+        ))
         
         return jsonify({
+            'cursor': event_bus.cursor(change_seq),
             'summary': summary,
             'recent_metrics': metrics[-20:],
-            'total_data_points': len(metrics)
+            'total_data_points': len(metrics),
+            'llm': llm_service.get_metrics(),
+            'storage': db_service.get_persistence_stats(),
+            'shadow': shadow_service.get_stats(),
+            'improvement_queue': improvement_queue.get_stats(),
+            'sessions': session_store.get_stats(),
+            'events': event_bus.get_stats()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/events', methods=['GET'])
+def events():
+    """Server-sent events for dashboards, resuming after Last-Event-ID or ?since="""
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('since')
+    kinds = None
+    if request.args.get('types'):
+        kinds = set(request.args['types'].split(','))
+        unknown = kinds - set(KINDS)
+        if unknown:
+            return jsonify({'error': f"unknown event types: {', '.join(sorted(unknown))}"}), 400
+    
+    body = event_bus.stream(cursor, kinds)
+    gzip = COMPRESSION_ENABLED and 'gzip' in request.accept_encodings
+    if gzip:
+        body = event_bus.gzip(body)
+    
+    response = Response(stream_with_context(body), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    # Tell nginx-style proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # NEW: Diff Viewer Endpoint
 @app.route('/prompt-diff', methods=['GET'])
 def prompt_diff():
     """Get diff between prompt versions"""
     try:
         version = request.args.get('version', type=int)
+        # fields=diff,version skips the two full prompt texts
+        fields = parse_fields(request.args.get('fields'))
+        
+        current_prompt, current_version = db_service.get_prompt_version()
+        etag = version_etag('prompt-diff', current_version, version, fields)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
         
         history = db_service.get_improvement_history()
-        current_prompt = db_service.get_prompt()
         
         if version is None:
             # Get diff between latest two versions
@@ -346,15 +764,179 @@ def prompt_diff():
             tofile='new_prompt'
         ))
         
-        return jsonify({
+        return with_etag(jsonify(project({
             'old_prompt': old_prompt,
             'new_prompt': new_prompt,
             'diff': ''.join(diff),
             'version': version or len(history) + 1
+        }, fields)), etag)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Shadow evaluation of candidate prompts
+@app.route('/prompt-candidates', methods=['GET'])
+def list_prompt_candidates():
+    """Candidate prompts with live-vs-candidate comparisons"""
+    try:
+        return jsonify({'candidates': shadow_service.list_candidates(), 'stats': shadow_service.get_stats()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/prompt-candidates', methods=['POST'])
+@admin_required
+def add_prompt_candidate():
+    """Add a candidate prompt to run in shadow"""
+    try:
+        data = request.get_json()
+        if not data or not data.get('prompt'):
+            return jsonify({'error': 'prompt required'}), 400
+        
+        return jsonify(shadow_service.add_candidate(data['prompt'], data.get('metadata'))), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/prompt-candidates/<candidate_id>/promote', methods=['POST'])
+@admin_required
+def promote_prompt_candidate(candidate_id):
+    """Make a candidate live if its shadow results meet the budgets"""
+    try:
+        data = request.get_json(silent=True) or {}
+        result, report = improvement_queue.apply_exclusive(
+            lambda: shadow_service.promote(candidate_id, force=bool(data.get('force')))
+        )
+        if report is None:
+            return jsonify({'error': 'Unknown candidate'}), 404
+        if result is None:
+            return jsonify({'error': 'Candidate does not meet its budgets', 'candidate': report}), 409
+        
+        return jsonify({
+            'version': result['version'],
+            'previousVersion': result['previous_version'],
+            'oldPrompt': result['old_prompt'],
+            'newPrompt': result['new_prompt'],
+            'candidate': report
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/prompt-candidates/<candidate_id>', methods=['DELETE'])
+@admin_required
+def reject_prompt_candidate(candidate_id):
+    """Discard a candidate"""
+    try:
+        if not shadow_service.reject(candidate_id):
+            return jsonify({'error': 'Unknown candidate'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/model-routing', methods=['GET'])
+def get_model_routing():
+    """Routing table and per-task latency, tokens and estimated cost"""
+    try:
+        return jsonify({**llm_service.routing.get_config(), 'stats': llm_service.routing.get_stats()['tasks']})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/model-routing', methods=['PUT'])
+@admin_required
+def update_model_routing():
+    """Replace the routing table (validated, written to LLM_ROUTING_PATH, applied at once)"""
+    try:
+        data = request.get_json()
+        if data is None:
+            return jsonify({'error': 'Routing table required'}), 400
+        
+        try:
+            return jsonify(llm_service.routing.update(data))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/model-routing/reload', methods=['POST'])
+@admin_required
+def reload_model_routing():
+    """Re-read the routing file now instead of waiting for the mtime check"""
+    try:
+        try:
+            return jsonify(llm_service.routing.reload())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/profile', methods=['POST'])
+@admin_required
+def start_profile():
+    """Sample the next `requests` requests, or every request for `seconds`"""
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            session = profiler.start(
+                requests=data.get('requests'),
+                seconds=data.get('seconds'),
+                interval_ms=data.get('intervalMs'),
+                memory=bool(data.get('memory')),
+                all_threads=bool(data.get('allThreads')),
+                path_prefix=data.get('path')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 409
+        
+        response = jsonify(session)
+        response.headers['Location'] = f"/admin/profile?id={session['id']}"
+        return response, 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/profile', methods=['GET'])
+@admin_required
+def get_profile():
+    """Running or last profile: summary, or ?format=collapsed stacks for flamegraph tools"""
+    try:
+        session = profiler.result(request.args.get('id'))
+        if session is None:
+            return jsonify({'error': 'No profile'}), 404
+        if request.args.get('format') == 'collapsed':
+            return Response(session.collapsed(), mimetype='text/plain')
+        return jsonify(session.summary(top=int(request.args.get('top', 20))))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/profile', methods=['DELETE'])
+@admin_required
+def stop_profile():
+    """Stop the running profile and return what it collected"""
+    try:
+        summary = profiler.stop()
+        if summary is None:
+            return jsonify({'error': 'No profile running'}), 404
+        return jsonify(summary)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/memory/snapshot', methods=['POST'])
+@admin_required
+def memory_snapshot():
+    """tracemalloc snapshot: top allocation sites and the diff against the previous snapshot"""
+    try:
+        data = request.get_json(silent=True) or {}
+        return jsonify(profiler.take_snapshot(limit=int(data.get('limit', 20))))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/memory', methods=['DELETE'])
+@admin_required
+def stop_memory_tracing():
+    """Stop tracemalloc (it slows allocations while on) and drop kept snapshots"""
+    try:
+        return jsonify({'stopped': profiler.stop_tracing()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # NEW: Document Upload Endpoint
 @app.route('/upload-document', methods=['POST'])
 def upload_document():
@@ -382,6 +964,10 @@ def upload_document():
             'size': len(file_content),
             'analysis': analysis
         }
+        # Consultant and client the document belongs to, as form fields
+        for field, key in (('userId', 'user_id'), ('contactId', 'contact_id')):
+            if request.form.get(field):
+                doc_metadata[key] = request.form[field]
         
         saved_doc = db_service.save_document(doc_metadata)
         
@@ -400,11 +986,11 @@ def upload_document():
 def get_documents():
     """Get uploaded documents"""
     try:
-        documents = db_service.get_documents()
-        return jsonify({
-            'documents': documents,
-            'count': len(documents)
-        })
+        documents = db_service.get_documents_encoded(request.args.get('userId'), request.args.get('contactId'))
+        return json_bytes_response(encode_object(
+            {'count': len(documents)},
+            {'documents': documents}
+        ))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
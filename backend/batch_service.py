@@ -0,0 +1,306 @@
+"""
+Bulk reply generation: concurrent fan-out and deferred provider batches
+"""
+import os
+import json
+import uuid
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ai_service import ai_service
+from admission_control import AdmissionRejected
+
+
+class BatchBackend(ABC):
+    """
+    Interface to a provider batch API used by deferred mode.
+
+    Each request is {'custom_id', 'prompt', 'user_message', 'provider'};
+    poll() returns {'status': 'in_progress' | 'completed' | 'failed',
+    'results': {custom_id: parsed response dict or {'error': ...}}}.
+    """
+
+    name = 'base'
+    # Providers the backend can run batches on; None serves any provider
+    providers: Optional[Tuple[str, ...]] = None
+
+    def supports(self, provider: str) -> bool:
+        return self.providers is None or provider in self.providers
+
+    @abstractmethod
+    def submit(self, requests: List[Dict]) -> str:
+        """Start a batch; returns the backend's batch id"""
+
+    @abstractmethod
+    def poll(self, batch_id: str) -> Dict:
+        """Status and (once completed) results of a batch"""
+
+
+class LocalBatchBackend(BatchBackend):
+    """Stand-in for a provider batch API: works through the batch in a background thread"""
+
+    name = 'local'
+
+    def __init__(self, llm, result_ttl: float = 86400):
+        self.llm = llm
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._batches: Dict[str, Dict] = {}
+
+    def _prune(self):
+        # Finished batches are kept for result_ttl seconds after they complete
+        cutoff = time.monotonic() - self.result_ttl
+        for batch_id in [b for b, batch in self._batches.items() if batch.get('finished', cutoff) < cutoff]:
+            del self._batches[batch_id]
+
+    def submit(self, requests: List[Dict]) -> str:
+        batch_id = f'local-{uuid.uuid4().hex[:12]}'
+        with self._lock:
+            self._prune()
+            self._batches[batch_id] = {'status': 'in_progress', 'results': {}}
+        threading.Thread(target=self._run, args=(batch_id, requests), daemon=True).start()
+        return batch_id
+
+    def _run(self, batch_id: str, requests: List[Dict]):
+        results = {}
+        for req in requests:
+            try:
+                results[req['custom_id']] = self.llm.generate_response(
+                    prompt=req['prompt'],
+                    user_message=req['user_message'],
+                    provider=req['provider'],
+                    priority='batch'
+                )
+            except Exception as e:
+                results[req['custom_id']] = {'error': str(e)}
+        with self._lock:
+            self._batches[batch_id] = {'status': 'completed', 'results': results, 'finished': time.monotonic()}
+
+    def poll(self, batch_id: str) -> Dict:
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return {'status': 'failed', 'results': {}, 'error': 'Unknown batch'}
+            return {'status': batch['status'], 'results': dict(batch['results'])}
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI Batch API (/v1/batches): half price, results within the completion window"""
+
+    name = 'openai'
+    providers = ('openai',)
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    def submit(self, requests: List[Dict]) -> str:
+        settings = self.llm.routing.settings('chat_reply', 'openai')
+        body = {
+            'model': settings['model'],
+            'temperature': 0.7 if settings['temperature'] is None else settings['temperature'],
+            'response_format': {'type': 'json_object'}
+        }
+        if settings['max_tokens']:
+            body['max_tokens'] = settings['max_tokens']
+        lines = []
+        for req in requests:
+            lines.append(json.dumps({
+                'custom_id': req['custom_id'],
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': {
+                    **body,
+                    'messages': [
+                        {'role': 'system', 'content': req['prompt']},
+                        {'role': 'user', 'content': req['user_message']}
+                    ]
+                }
+            }))
+
+        client = self.llm.openai_client
+        batch_file = client.files.create(
+            file=('batch.jsonl', '\n'.join(lines).encode('utf-8')),
+            purpose='batch'
+        )
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h'
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> Dict:
+        client = self.llm.openai_client
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in ('failed', 'expired', 'cancelled'):
+            return {'status': 'failed', 'results': {}, 'error': batch.status}
+        if batch.status != 'completed':
+            return {'status': 'in_progress', 'results': {}}
+
+        results = {}
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            entry = json.loads(line)
+            try:
+                content = entry['response']['body']['choices'][0]['message']['content']
+                results[entry['custom_id']] = json.loads(content)
+            except (KeyError, IndexError, TypeError, ValueError):
+                results[entry['custom_id']] = {'error': str(entry.get('error') or 'Unreadable response')}
+        return {'status': 'completed', 'results': results}
+
+
+class BatchService:
+    def __init__(self):
+        self.ai = ai_service
+        self.max_items = int(os.getenv('BATCH_MAX_ITEMS', 500))
+        # One bounded pool shared by all batch requests, so concurrent batches can't multiply it
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv('BATCH_MAX_WORKERS', 8)),
+            thread_name_prefix='reply-batch'
+        )
+
+        # Deferred batches (and their results) are forgotten this long after submission
+        self.result_ttl = float(os.getenv('BATCH_RESULT_TTL', 3 * 86400))
+
+        backend = os.getenv('LLM_BATCH_BACKEND', 'local')
+        if backend == 'openai':
+            self.backend: BatchBackend = OpenAIBatchBackend(ai_service.llm)
+        elif backend == 'local':
+            self.backend = LocalBatchBackend(ai_service.llm, self.result_ttl)
+        else:
+            raise ValueError(f"Unknown LLM_BATCH_BACKEND {backend}")
+
+        self._lock = threading.Lock()
+        self._deferred: Dict[str, Dict] = {}
+
+    def validate(self, items: Any) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        """Check a batch payload; returns (normalized items, None) or (None, error message)"""
+        if not isinstance(items, list) or not items:
+            return None, 'items must be a non-empty list'
+        if len(items) > self.max_items:
+            return None, f'At most {self.max_items} items per batch'
+
+        normalized = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get('clientSequence'):
+                return None, f'items[{index}].clientSequence required'
+            client_sequence = item['clientSequence']
+            if isinstance(client_sequence, str):
+                client_sequence = [client_sequence]
+            normalized.append({**item, 'clientSequence': client_sequence})
+        return normalized, None
+
+    def _run_item(self, index: int, item: Dict, chatbot_prompt: str, prompt_version: int,
+                  provider: Optional[str], include_analytics: bool) -> Dict:
+        base = {'index': index, 'id': item.get('id'), 'promptVersion': prompt_version}
+        try:
+            result = self.ai.generate_reply(
+                client_sequence=item['clientSequence'],
+                chat_history=item.get('chatHistory', []),
+                provider=provider,
+                include_analytics=include_analytics,
+                priority='batch',
+                chatbot_prompt=chatbot_prompt,
+                prompt_version=prompt_version,
+                user_id=item.get('userId'),
+                contact_id=item.get('contactId')
+            )
+        except AdmissionRejected as e:
+            return {**base, 'error': str(e), 'retryAfter': e.retry_after}
+        except Exception as e:
+            return {**base, 'error': str(e)}
+
+        return {
+            **base,
+            'aiReply': result['reply'],
+            'responseTime': result.get('response_time'),
+            'queueWait': result.get('queue_wait'),
+            'sentiment': result.get('sentiment'),
+            'confidence': result.get('confidence'),
+            'provider': result.get('provider')
+        }
+
+    def run(self, items: List[Dict], provider: Optional[str] = None,
+            include_analytics: bool = True) -> Iterator[Dict]:
+        """Generate replies concurrently, yielding each item's result as it completes"""
+        # Every item uses the prompt version that was live when the batch started
+        chatbot_prompt, prompt_version = self.ai.db.get_prompt_version()
+        futures = [
+            self._pool.submit(self._run_item, index, item, chatbot_prompt, prompt_version, provider, include_analytics)
+            for index, item in enumerate(items)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+    def submit_deferred(self, items: List[Dict], provider: Optional[str] = None) -> Dict:
+        """Hand the batch to the provider batch backend; poll with get_deferred()"""
+        chatbot_prompt, prompt_version = self.ai.db.get_prompt_version()
+        provider_used = self.ai._provider_used(provider)
+        if not self.backend.supports(provider_used):
+            raise ValueError(f"The {self.backend.name} batch backend can't run {provider_used} batches")
+
+        requests = []
+        for index, item in enumerate(items):
+            user_message, _ = self.ai.build_reply_message(item['clientSequence'], item.get('chatHistory', []))
+            requests.append({
+                'custom_id': str(index),
+                'prompt': chatbot_prompt,
+                'user_message': user_message,
+                'provider': provider_used
+            })
+
+        backend_id = self.backend.submit(requests)
+        batch_id = uuid.uuid4().hex
+        with self._lock:
+            cutoff = time.monotonic() - self.result_ttl
+            for expired in [b for b, batch in self._deferred.items() if batch['submitted'] < cutoff]:
+                del self._deferred[expired]
+            self._deferred[batch_id] = {
+                'backend_id': backend_id,
+                'item_ids': [item.get('id') for item in items],
+                'prompt_version': prompt_version,
+                'provider': provider_used,
+                'submitted_at': datetime.now().isoformat(),
+                'submitted': time.monotonic()
+            }
+        return {'batchId': batch_id, 'backend': self.backend.name, 'count': len(items), 'promptVersion': prompt_version}
+
+    def get_deferred(self, batch_id: str) -> Optional[Dict]:
+        """Status of a deferred batch, with per-item replies once it has completed"""
+        with self._lock:
+            batch = self._deferred.get(batch_id)
+        if batch is None:
+            return None
+
+        polled = self.backend.poll(batch['backend_id'])
+        status = {
+            'batchId': batch_id,
+            'status': polled['status'],
+            'backend': self.backend.name,
+            'promptVersion': batch['prompt_version'],
+            'submittedAt': batch['submitted_at']
+        }
+        if polled.get('error'):
+            status['error'] = polled['error']
+        if polled['status'] == 'completed':
+            status['results'] = [
+                self._deferred_result(index, item_id, polled['results'].get(str(index)), batch)
+                for index, item_id in enumerate(batch['item_ids'])
+            ]
+        return status
+
+    def _deferred_result(self, index: int, item_id: Any, response: Optional[Dict], batch: Dict) -> Dict:
+        result = {'index': index, 'id': item_id, 'promptVersion': batch['prompt_version'], 'provider': batch['provider']}
+        if response is None:
+            return {**result, 'error': 'Missing from batch output'}
+        if 'error' in response and 'reply' not in response:
+            return {**result, 'error': response['error']}
+        return {**result, 'aiReply': response.get('reply', '')}
+
+
+# Singleton
+batch_service = BatchService()
+
@@ -0,0 +1,3 @@
+"""
+Offline benchmarks for the backend (run from backend/: python -m benchmarks.<name>)
+"""
@@ -0,0 +1,123 @@
+"""
+Shared timing, reporting and baseline helpers for the benchmarks
+"""
+import json
+import os
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterable, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'baselines')
+
+# Metrics where a bigger number is better; everything else should not grow
+HIGHER_IS_BETTER = {'throughput_rps', 'not_modified', 'saved_pct'}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_case(fn: Callable, items: Iterable, alloc_sample: int = 50) -> Dict:
+    """Time fn over items, then re-run a sample under tracemalloc for allocations"""
+    items = list(items)
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    # Allocation pass is separate so tracing overhead doesn't skew latency
+    sample = items[:alloc_sample]
+    tracemalloc.start()
+    peaks = []
+    for item in sample:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        fn(item)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {
+        'requests': len(items),
+        'throughput_rps': round(len(items) / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'alloc_kib_per_request': round(sum(peaks) / len(peaks) / 1024, 2) if peaks else 0
+    }
+
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """List metrics that regressed by more than tolerance (a fraction) vs the baseline"""
+    regressions = []
+    for case, metrics in results.items():
+        base = baseline.get(case, {})
+        for name, value in metrics.items():
+            old = base.get(name)
+            if name == 'requests' or not isinstance(old, (int, float)) or old == 0:
+                continue
+            if name in HIGHER_IS_BETTER:
+                regressed = value < old * (1 - tolerance)
+            else:
+                regressed = value > old * (1 + tolerance)
+            if regressed:
+                regressions.append(f"{case}.{name}: {old} -> {value}")
+    return regressions
+
+
+def load_baseline(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_json(path: str, data: Dict):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def finish(name: str, results: Dict[str, Dict], args) -> int:
+    """Print results, save or check the baseline, and return the exit code"""
+    print(json.dumps(results, indent=2, sort_keys=True))
+    if args.output:
+        save_json(args.output, results)
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f'{name}.json')
+    if args.save_baseline:
+        save_json(baseline_path, results)
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+
+    baseline = load_baseline(baseline_path)
+    if not baseline:
+        print(f"No baseline at {baseline_path} (run with --save-baseline to create one)")
+        # A check with nothing to compare against must not pass silently
+        return 0 if args.allow_missing_baseline else 2
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("Regressions vs baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("No regressions vs baseline")
+    return 0
+
+
+def add_baseline_args(parser):
+    parser.add_argument('--baseline', help='Baseline JSON path (default: benchmarks/baselines/<name>.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='Write results as the new baseline')
+    parser.add_argument('--allow-missing-baseline', action='store_true',
+                        help='Exit 0 when there is no baseline to compare against (default: exit 2)')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='Allowed regression as a fraction')
+    parser.add_argument('--output', help='Also write results to this JSON file')
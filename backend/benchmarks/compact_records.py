@@ -0,0 +1,146 @@
+"""
+Memory per stored record and aggregation speed: dicts vs compact records
+
+    cd backend
+    python -m benchmarks.compact_records
+    python -m benchmarks.compact_records --records 50000   # quicker run
+
+Conversations carry sentiment and confidence as ai_service produces them
+(the confidence heuristic's shape, with varying scores); message texts are
+built up front and shared by both layouts, so the bytes reported are the
+record overhead around them. `summary_*` times get_performance_summary's
+aggregation, `window_avg_*` a mean response time over the last 10k metrics,
+`page_*` producing a 50-record API page.
+"""
+import argparse
+import gc
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.common import add_baseline_args, finish, run_case
+
+MESSAGES = [
+    'Hi, I want to apply for the DTV visa. Do I need 500,000 THB in my bank?',
+    'Thanks! How long does processing take at the embassy?',
+    'I am frustrated, my application failed twice',
+    'Can I do muay thai training on this visa?'
+]
+REPLY = 'Yes - the DTV requires proof of 500,000 THB in savings held for at least 3 months.'
+
+
+def conversation(i: int, rng: random.Random, start: datetime) -> dict:
+    from ai_service import ai_service
+    message = MESSAGES[i % len(MESSAGES)]
+    score = round(rng.choice([0.65, 0.75, 0.8, 0.85, 0.9, 0.95]), 2)
+    return {
+        'id': i + 1,
+        'timestamp': (start + timedelta(milliseconds=i)).isoformat(),
+        'client_message': message,
+        'ai_reply': REPLY,
+        'sentiment': ai_service.analyze_sentiment(message),
+        'confidence': {
+            'score': score,
+            'level': 'high' if score >= 0.9 else 'medium' if score >= 0.7 else 'low',
+            'color': 'green' if score >= 0.9 else 'yellow' if score >= 0.7 else 'red',
+            'reasoning': 'Heuristic estimate (LLM confidence failed)',
+            'flags': ['confidence_fallback'],
+            'should_review': score < 0.7
+        },
+        'response_time': rng.random() * 2,
+        'provider': 'claude',
+        'session_id': f'{i // 10:032x}'
+    }
+
+
+def metric(i: int, rng: random.Random, start: datetime) -> dict:
+    words = rng.randint(20, 200)
+    return {
+        'timestamp': (start + timedelta(milliseconds=i)).isoformat(),
+        'endpoint': 'generate_reply',
+        'response_time': rng.random() * 2,
+        'queue_wait': rng.random() * 0.1,
+        'tokens_used': words * 1.3,
+        'estimated_cost': words * 0.000002,
+        'provider': rng.choice(['claude', 'openai', 'gemini']),
+        'prompt_version': rng.randint(1, 20)
+    }
+
+
+def retained_bytes(build) -> tuple:
+    """(object, bytes still allocated after building it)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return built, after - before
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=200000)
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    from records import ConversationRecord, MetricColumns
+
+    start = datetime(2026, 1, 1)
+    n = args.records
+
+    dicts, dict_bytes = retained_bytes(
+        lambda: [conversation(i, random.Random(i), start) for i in range(n)]
+    )
+    records, record_bytes = retained_bytes(
+        lambda: [ConversationRecord.from_dict(conversation(i, random.Random(i), start)) for i in range(n)]
+    )
+    metric_dicts, metric_dict_bytes = retained_bytes(lambda: [metric(i, random.Random(i), start) for i in range(n)])
+    columns, column_bytes = retained_bytes(
+        lambda: MetricColumns.from_dicts(metric(i, random.Random(i), start) for i in range(n))
+    )
+    assert records[123].to_dict() == dicts[123] and columns.row(123) == metric_dicts[123]
+
+    def summary_dicts(_):
+        total = len(metric_dicts)
+        return (sum(m.get('response_time', 0) for m in metric_dicts) / total,
+                sum(m.get('queue_wait', 0) for m in metric_dicts) / total,
+                sum(m.get('tokens_used', 0) for m in metric_dicts),
+                sum(m.get('estimated_cost', 0) for m in metric_dicts))
+
+    def summary_columns(_):
+        total = len(columns)
+        totals = dict(columns.totals)
+        return (totals['response_time'] / total, totals['queue_wait'] / total,
+                totals['tokens_used'], totals['estimated_cost'])
+
+    window = min(10000, n)
+    results = {
+        'conversation_memory': {
+            'dict_bytes': round(dict_bytes / n),
+            'record_bytes': round(record_bytes / n),
+            'saved_pct': round(100 * (1 - record_bytes / dict_bytes), 1)
+        },
+        'metric_memory': {
+            'dict_bytes': round(metric_dict_bytes / n),
+            'column_bytes': round(column_bytes / n),
+            'saved_pct': round(100 * (1 - column_bytes / metric_dict_bytes), 1)
+        },
+        'summary_dicts': run_case(summary_dicts, range(10), alloc_sample=2),
+        'summary_columns': run_case(summary_columns, range(1000), alloc_sample=10),
+        'window_avg_dicts': run_case(
+            lambda _: sum(m['response_time'] for m in metric_dicts[-window:]) / window, range(100), alloc_sample=5
+        ),
+        'window_avg_columns': run_case(
+            lambda _: sum(columns.numbers['response_time'][-window:]) / window, range(100), alloc_sample=5
+        ),
+        'page_dicts': run_case(lambda i: dicts[i:i + 50], range(0, 50000, 50)),
+        'page_records': run_case(lambda i: [r.to_dict() for r in records[i:i + 50]], range(0, 50000, 50))
+    }
+    return finish('compact_records', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
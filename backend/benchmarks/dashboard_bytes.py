@@ -0,0 +1,107 @@
+"""
+Measure response bytes for one dashboard session against /get-prompt, /analytics and /prompt-diff
+
+    cd backend
+    python -m benchmarks.dashboard_bytes
+
+A session polls each endpoint --polls times while the prompt is improved
+--improvements times. Each case replays the same session with one more of
+the transfer savings switched on; bytes are response bodies as sent.
+"""
+import argparse
+import os
+import sys
+from typing import Dict, Optional
+
+from benchmarks.common import add_baseline_args, finish
+
+ANALYTICS_FIELDS = 'version,timestamp,metadata'
+
+# (etag, fields, accept-encoding)
+CASES = {
+    'legacy': (False, False, None),
+    'etag': (True, False, None),
+    'etag_fields': (True, True, None),
+    'etag_fields_gzip': (True, True, 'gzip'),
+    'etag_fields_br': (True, True, 'br, gzip')
+}
+
+
+def improve(db, n: int):
+    prompt = db.get_prompt()
+    db.set_prompt(
+        prompt + f"\n- Rule {n}: confirm the visa type and the applicant's nationality before quoting fees.",
+        {'analysis': f'Improvement {n}: answer fee questions with the exact THB amounts', 'changes': f'Added rule {n}'}
+    )
+
+
+def run_session(client, db, polls: int, improvements: int, etag: bool, fields: bool,
+                accept_encoding: Optional[str]) -> Dict:
+    urls = {
+        'get_prompt': '/get-prompt',
+        'analytics': f'/analytics?fields={ANALYTICS_FIELDS}' if fields else '/analytics',
+        'prompt_diff': '/prompt-diff'
+    }
+    improve_every = max(1, polls // (improvements + 1))
+    etags: Dict[str, str] = {}
+    sent = not_modified = requests = 0
+    improved = 0
+
+    for poll in range(polls):
+        if poll and poll % improve_every == 0 and improved < improvements:
+            improved += 1
+            improve(db, 1000 + improved)
+        for name, url in urls.items():
+            headers = {}
+            if accept_encoding:
+                headers['Accept-Encoding'] = accept_encoding
+            if etag and name in etags:
+                headers['If-None-Match'] = etags[name]
+            response = client.get(url, headers=headers)
+            if response.status_code not in (200, 304):
+                raise RuntimeError(f"{url} returned {response.status_code}")
+            requests += 1
+            sent += len(response.get_data())
+            not_modified += response.status_code == 304
+            if response.headers.get('ETag'):
+                etags[name] = response.headers['ETag']
+
+    return {'bytes': sent, 'not_modified': not_modified, 'requests': requests}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--polls', type=int, default=60, help='Polls of each endpoint per session')
+    parser.add_argument('--improvements', type=int, default=3, help='Prompt updates during the session')
+    parser.add_argument('--history', type=int, default=10, help='Improvements made before the session starts')
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DEFAULT_LLM_PROVIDER', 'stub')
+    from app import app
+    from database_service import db_service
+
+    for n in range(args.history):
+        improve(db_service, n + 1)
+    start_prompt, _ = db_service.get_prompt_version()
+    client = app.test_client()
+
+    results = {}
+    for case, (etag, fields, accept_encoding) in CASES.items():
+        # Every case starts from the same history
+        with db_service._lock:
+            del db_service.storage['improvement_history'][args.history:]
+            del db_service._encoded['improvement_history'][args.history:]
+            db_service.storage['chatbot_prompt'] = start_prompt
+            db_service.storage['version'] = args.history + 1
+        results[case] = run_session(client, db_service, args.polls, args.improvements, etag, fields, accept_encoding)
+
+    legacy = results['legacy']['bytes']
+    for case, result in results.items():
+        result['saved_pct'] = round(100 * (1 - result['bytes'] / legacy), 1) if legacy else 0
+
+    return finish('dashboard_bytes', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Backend CPU and bytes per connected dashboard: polling vs server-sent events
+
+    cd backend
+    python -m benchmarks.dashboard_push
+    python -m benchmarks.dashboard_push --dashboards 50 --duration 120
+
+Each case starts a fresh backend (stub provider) and drives the same chat
+workload through /generate-reply. `baseline` has no dashboards; `polling`
+adds dashboards that re-fetch /performance and /conversations every
+--poll-interval seconds, as PerformanceDashboard and ConversationHistory did;
+`polling_live` does the same every --live-poll-interval seconds, about as
+fresh as push; `push` adds dashboards that fetch once and then follow
+GET /events. The server's CPU time (from /proc) above the baseline and the
+bytes on the wire are reported per dashboard per minute.
+"""
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict
+
+import requests
+
+from benchmarks.common import BACKEND_DIR, add_baseline_args, finish
+
+CLIENT_MESSAGES = [
+    'Hi, how much money do I need in my bank for the DTV?',
+    'How long does processing take?',
+    'Can I apply from the embassy in Kuala Lumpur?',
+    'I work remotely for a company in Germany, is that enough?'
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def cpu_seconds(pid: int) -> float:
+    """utime + stime of a process"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def start_server(workdir: str):
+    port = free_port()
+    env = dict(
+        os.environ,
+        DEFAULT_LLM_PROVIDER='stub',
+        STUB_LLM_LATENCY_MS='0',
+        MEMORY_DB_DIR=os.path.join(workdir, 'db'),
+        IMPROVE_QUEUE_PATH=os.path.join(workdir, 'queue.db')
+    )
+    proc = subprocess.Popen(
+        [sys.executable, '-c', f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(300):
+        try:
+            requests.get(f'{url}/health', timeout=1)
+            return proc, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('backend did not start')
+
+
+def wire_get(session: requests.Session, url: str, **params) -> int:
+    """GET and return the (possibly compressed) body size as sent"""
+    with session.get(url, params=params, stream=True) as response:
+        return len(response.raw.read(decode_content=False))
+
+
+def run_case(mode: str, args, interval: float = None) -> Dict:
+    workdir = tempfile.mkdtemp(prefix='issa-push-')
+    proc, url = start_server(workdir)
+    stop = threading.Event()
+    received = [0]
+    counter_lock = threading.Lock()
+    dashboards = args.dashboards if mode != 'baseline' else 0
+    interval = interval or args.poll_interval
+
+    def count(n: int):
+        with counter_lock:
+            received[0] += n
+
+    def chat_workload():
+        session = requests.Session()
+        i = 0
+        while not stop.is_set():
+            session.post(f'{url}/generate-reply', json={
+                'clientSequence': CLIENT_MESSAGES[i % len(CLIENT_MESSAGES)],
+                'chatHistory': []
+            })
+            i += 1
+            stop.wait(1 / args.rate)
+
+    def polling_dashboard(offset: float):
+        session = requests.Session()
+        stop.wait(offset)
+        while not stop.is_set():
+            count(wire_get(session, f'{url}/performance', limit=100))
+            count(wire_get(session, f'{url}/conversations', limit=50, offset=0))
+            stop.wait(interval)
+
+    streams = []
+
+    def push_dashboard(offset: float):
+        session = requests.Session()
+        stop.wait(offset)
+        count(wire_get(session, f'{url}/performance', limit=100))
+        count(wire_get(session, f'{url}/conversations', limit=50, offset=0))
+        response = session.get(f'{url}/events', params={'types': 'conversation,metric'}, stream=True)
+        streams.append(response)
+        try:
+            while not stop.is_set():
+                chunk = response.raw.read1(65536, decode_content=False)
+                if not chunk:
+                    break
+                count(len(chunk))
+        except Exception:
+            pass  # connection closed at the end of the case
+
+    # Warm up (imports, first requests), then measure
+    requests.post(f'{url}/generate-reply', json={'clientSequence': 'warm up', 'chatHistory': []})
+    target = {'polling': polling_dashboard, 'push': push_dashboard}.get(mode)
+    threads = [threading.Thread(target=chat_workload, daemon=True)]
+    threads += [
+        threading.Thread(target=target, args=(interval * i / dashboards,), daemon=True)
+        for i in range(dashboards)
+    ]
+    cpu_before = cpu_seconds(proc.pid)
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    elapsed = time.perf_counter() - start
+    cpu = cpu_seconds(proc.pid) - cpu_before
+
+    for response in streams:
+        response.close()
+    proc.terminate()
+    proc.wait(timeout=10)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    minutes = elapsed / 60
+    return {
+        'dashboards': dashboards,
+        'server_cpu_ms_per_min': round(cpu * 1000 / minutes, 1),
+        'bytes_per_min': round(received[0] / minutes)
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dashboards', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=60, help='Seconds per case')
+    parser.add_argument('--rate', type=float, default=2, help='Chat replies per second')
+    parser.add_argument('--poll-interval', type=float, default=30, help='Seconds between dashboard polls')
+    parser.add_argument('--live-poll-interval', type=float, default=2,
+                        help='Poll interval of the polling_live case, for freshness close to push')
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    results = {mode: run_case(mode, args) for mode in ('baseline', 'polling', 'push')}
+    results['polling_live'] = run_case('polling', args, interval=args.live_poll_interval)
+    base_cpu = results['baseline']['server_cpu_ms_per_min']
+    for mode in ('polling', 'polling_live', 'push'):
+        case = results[mode]
+        case['cpu_ms_per_dashboard_min'] = round(
+            max(0.0, case['server_cpu_ms_per_min'] - base_cpu) / case['dashboards'], 2
+        )
+        case['bytes_per_dashboard_min'] = round(case['bytes_per_min'] / case['dashboards'])
+    return finish('dashboard_push', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
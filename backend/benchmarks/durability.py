@@ -0,0 +1,123 @@
+"""
+Measure the request-path cost of the storage journal and recovery time
+
+    cd backend
+    python -m benchmarks.durability                      # 1M records for recovery
+    python -m benchmarks.durability --records 100000     # quicker run
+
+`write_*` cases time save_conversation from concurrent threads with the journal
+off and on (group commit + fsync); `recovery` times DatabaseService start-up
+from a snapshot plus log tail holding --records conversations.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import add_baseline_args, finish, percentile
+
+CONVERSATION = {
+    'client_message': 'Hi, I want to apply for the DTV visa. Do I need 500,000 THB in my bank?',
+    'ai_reply': 'Yes - the DTV requires proof of 500,000 THB in savings held for at least 3 months.',
+    'sentiment': {'sentiment': 'neutral', 'score': 0.0, 'emoji': '😐', 'description': 'Neutral'},
+    'confidence': {'score': 0.82, 'level': 'medium', 'color': 'yellow', 'should_review': False},
+    'response_time': 0.91,
+    'provider': 'openai'
+}
+
+
+def make_db(directory=None, **env):
+    """Build a DatabaseService with the given persistence settings"""
+    from database_service import DatabaseService
+
+    saved = {key: os.environ.get(key) for key in ('MEMORY_DB_DIR', *env)}
+    os.environ.pop('MEMORY_DB_DIR', None)
+    if directory:
+        os.environ['MEMORY_DB_DIR'] = directory
+    os.environ.update(env)
+    try:
+        return DatabaseService()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def write_case(db, writes: int, threads: int) -> dict:
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(count):
+        local = []
+        for _ in range(count):
+            t0 = time.perf_counter()
+            db.save_conversation(CONVERSATION)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(writes // threads,)) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3)
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writes', type=int, default=20000, help='save_conversation calls per write case')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent writers')
+    parser.add_argument('--records', type=int, default=1_000_000, help='Conversations in the recovery case')
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='issa-journal-')
+    results = {}
+    try:
+        results['write_memory_only'] = write_case(make_db(), args.writes, args.threads)
+
+        db = make_db(os.path.join(workdir, 'fsync'))
+        results['write_journal_fsync'] = write_case(db, args.writes, args.threads)
+        results['write_journal_fsync']['avg_entries_per_commit'] = db.get_persistence_stats()['avg_entries_per_commit']
+        db.journal.close()
+
+        # Recovery: most records in a snapshot, the last 10% replayed from the log
+        recovery_dir = os.path.join(workdir, 'recovery')
+        snapshot_every = max(1, int(args.records * 0.9))
+        db = make_db(recovery_dir, MEMORY_DB_FSYNC='false', MEMORY_DB_SNAPSHOT_EVERY=str(snapshot_every))
+        for _ in range(args.records):
+            db.save_conversation(CONVERSATION)
+        db.journal.close()
+        del db
+
+        db = make_db(recovery_dir, MEMORY_DB_SNAPSHOT_EVERY=str(args.records * 10))
+        stats = db.get_persistence_stats()
+        assert len(db.storage['conversations']) == args.records
+        results['recovery'] = {
+            'records': args.records,
+            'replayed_from_log': stats['recovered_entries'],
+            'recovery_seconds': stats['recovery_seconds']
+        }
+        db.journal.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return finish('durability', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
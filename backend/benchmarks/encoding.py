@@ -0,0 +1,57 @@
+"""
+Benchmark /conversations response encoding at 10k records
+
+    cd backend
+    python -m benchmarks.encoding
+
+Compares Flask's stock json provider, orjson over the record dicts, and
+joining per-record bytes encoded from the compact records (what the
+endpoint does).
+"""
+import argparse
+import sys
+
+from benchmarks.common import add_baseline_args, finish, run_case
+from benchmarks.durability import CONVERSATION
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=50)
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+    import fast_json
+    from database_service import DatabaseService
+
+    db = DatabaseService()
+    for _ in range(args.records):
+        db.save_conversation(CONVERSATION)
+
+    stock = DefaultJSONProvider(Flask(__name__))
+    page = {'total': args.records, 'limit': args.records, 'offset': 0}
+    iterations = range(args.iterations)
+
+    results = {
+        'flask_default_json': run_case(
+            lambda _: stock.dumps({**page, 'conversations': db.get_conversations(args.records)}),
+            iterations, alloc_sample=5
+        ),
+        'orjson_full_encode': run_case(
+            lambda _: fast_json.dumps({**page, 'conversations': db.get_conversations(args.records)}),
+            iterations, alloc_sample=5
+        ),
+        'cached_fragments': run_case(
+            lambda _: fast_json.encode_object(page, {'conversations': db.get_conversations_encoded(args.records)}),
+            iterations, alloc_sample=5
+        )
+    }
+
+    return finish('encoding', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
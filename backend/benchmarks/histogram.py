@@ -0,0 +1,66 @@
+"""
+HDR-style log-linear latency histogram
+"""
+from typing import Dict, List
+
+
+class LatencyHistogram:
+    """
+    Records latencies in microseconds with ~1% relative precision.
+
+    Values below 128us are exact; above that each power of two is split into
+    128 linear sub-buckets (the HdrHistogram layout with 2 significant
+    digits), so memory stays small however many samples are recorded.
+    """
+
+    SUB_BUCKET_BITS = 7
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.max_us = 0
+
+    def _bucket(self, value_us: int) -> int:
+        shift = value_us.bit_length() - 1 - self.SUB_BUCKET_BITS
+        if shift <= 0:
+            return value_us
+        return (value_us >> shift) << shift
+
+    def record(self, seconds: float):
+        value_us = max(1, int(seconds * 1_000_000))
+        bucket = self._bucket(value_us)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.total += 1
+        self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other: 'LatencyHistogram'):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, pct: float) -> float:
+        """Latency at pct in milliseconds"""
+        if not self.total:
+            return 0.0
+        target = max(1, round(pct / 100 * self.total))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return bucket / 1000
+        return self.max_us / 1000
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.total,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'p999_ms': self.percentile(99.9),
+            'max_ms': self.max_us / 1000
+        }
+
+    def buckets(self) -> List[List[int]]:
+        """Non-empty [bucket_start_us, count] pairs, for machine-readable reports"""
+        return [[bucket, self.counts[bucket]] for bucket in sorted(self.counts)]
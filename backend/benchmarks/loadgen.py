@@ -0,0 +1,219 @@
+"""
+HTTP load generator: sweep concurrency against a running backend and report latency
+
+Start the backend with the stub provider first, e.g.
+
+    cd backend
+    DEFAULT_LLM_PROVIDER=stub STUB_LLM_LATENCY_MS=300 python app.py
+
+then in another shell
+
+    python -m benchmarks.loadgen --url http://localhost:5000 --concurrency 1,4,16,64 --duration 20
+"""
+import argparse
+import base64
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+import requests
+
+from benchmarks.common import BACKEND_DIR, save_json
+from benchmarks.histogram import LatencyHistogram
+
+# 1x1 PNG so uploads exercise the image path without shipping fixtures
+TINY_PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+SEARCH_QUERIES = ['visa', 'bank statement', 'THB', 'passport', 'muay thai', 'remote work']
+
+# (name, weight) - roughly what a few chat widgets plus open dashboards produce
+DEFAULT_MIX = {
+    'generate_reply': 50,
+    'conversations': 15,
+    'search': 10,
+    'performance': 10,
+    'prompt_diff': 10,
+    'upload_document': 5
+}
+
+
+def build_requests(sequences: List[Dict]) -> Dict[str, Callable]:
+    """Request functions: (session, base_url, rng) -> response"""
+
+    def generate_reply(session, url, rng):
+        seq = rng.choice(sequences)
+        return session.post(f'{url}/generate-reply', json={
+            'clientSequence': seq['client_sequence'],
+            'chatHistory': seq['chat_history']
+        })
+
+    def conversations(session, url, rng):
+        return session.get(f'{url}/conversations', params={'limit': 50, 'offset': rng.randint(0, 5) * 50})
+
+    def search(session, url, rng):
+        return session.post(f'{url}/conversations/search', json={'query': rng.choice(SEARCH_QUERIES)})
+
+    def performance(session, url, rng):
+        return session.get(f'{url}/performance')
+
+    def prompt_diff(session, url, rng):
+        return session.get(f'{url}/prompt-diff')
+
+    def upload_document(session, url, rng):
+        return session.post(f'{url}/upload-document', files={
+            'file': ('statement.png', TINY_PNG, 'image/png')
+        })
+
+    return {
+        'generate_reply': generate_reply,
+        'conversations': conversations,
+        'search': search,
+        'performance': performance,
+        'prompt_diff': prompt_diff,
+        'upload_document': upload_document
+    }
+
+
+class _LevelResult:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, name: str, histogram: LatencyHistogram, errors: int):
+        with self.lock:
+            self.histograms.setdefault(name, LatencyHistogram()).merge(histogram)
+            self.errors[name] = self.errors.get(name, 0) + errors
+
+
+def _worker(worker_id: int, url: str, plan: List[Tuple[str, Callable]], weights: List[int],
+            stop_at: float, record_after: float, timeout: float, result: _LevelResult):
+    rng = random.Random(worker_id)
+    session = requests.Session()
+    session.request = functools.partial(session.request, timeout=timeout)
+    histograms: Dict[str, LatencyHistogram] = {}
+    errors: Dict[str, int] = {}
+
+    while True:
+        now = time.time()
+        if now >= stop_at:
+            break
+        name, send = rng.choices(plan, weights=weights)[0]
+        start = time.perf_counter()
+        try:
+            ok = send(session, url, rng).status_code < 400
+        except requests.RequestException:
+            ok = False
+        latency = time.perf_counter() - start
+
+        if now < record_after:
+            continue
+        histograms.setdefault(name, LatencyHistogram()).record(latency)
+        if not ok:
+            errors[name] = errors.get(name, 0) + 1
+
+    for name, histogram in histograms.items():
+        result.add(name, histogram, errors.get(name, 0))
+
+
+def run_level(url: str, concurrency: int, duration: float, warmup: float, timeout: float,
+              requests_by_name: Dict[str, Callable], mix: Dict[str, int]) -> Dict:
+    plan = [(name, requests_by_name[name]) for name in mix]
+    weights = [mix[name] for name in mix]
+    result = _LevelResult()
+
+    start = time.time()
+    record_after = start + warmup
+    stop_at = record_after + duration
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(i, url, plan, weights, stop_at, record_after, timeout, result),
+            daemon=True
+        )
+        for i in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    overall = LatencyHistogram()
+    endpoints = {}
+    for name, histogram in sorted(result.histograms.items()):
+        overall.merge(histogram)
+        errors = result.errors.get(name, 0)
+        endpoints[name] = {
+            **histogram.summary(),
+            'errors': errors,
+            'error_rate': round(errors / histogram.total, 4) if histogram.total else 0,
+            'histogram_us': histogram.buckets()
+        }
+
+    total_errors = sum(result.errors.values())
+    return {
+        'concurrency': concurrency,
+        'duration_s': duration,
+        'throughput_rps': round(overall.total / duration, 2),
+        'error_rate': round(total_errors / overall.total, 4) if overall.total else 0,
+        'latency': overall.summary(),
+        'endpoints': endpoints
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', default='1,2,4,8,16,32', help='Comma-separated concurrency levels')
+    parser.add_argument('--duration', type=float, default=15.0, help='Measured seconds per level')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Unrecorded seconds before each level')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout in seconds')
+    parser.add_argument('--mix', help='JSON object of endpoint weights, e.g. \'{"generate_reply": 1}\'')
+    parser.add_argument('--output', default='loadgen_report.json', help='Report path')
+    args = parser.parse_args(argv)
+
+    from data_processor import load_conversations, extract_sequences
+    sequences = extract_sequences(load_conversations(os.path.join(BACKEND_DIR, 'conversations.json')))
+
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    requests_by_name = build_requests(sequences)
+    unknown = set(mix) - set(requests_by_name)
+    if unknown:
+        parser.error(f"Unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+
+    requests.get(f'{args.url}/health', timeout=args.timeout).raise_for_status()
+
+    levels = []
+    for concurrency in (int(c) for c in args.concurrency.split(',')):
+        level = run_level(args.url, concurrency, args.duration, args.warmup, args.timeout, requests_by_name, mix)
+        levels.append(level)
+        print(
+            f"concurrency={concurrency:<4} rps={level['throughput_rps']:<9} "
+            f"p50={level['latency']['p50_ms']}ms p99={level['latency']['p99_ms']}ms "
+            f"errors={level['error_rate']:.2%}"
+        )
+
+    report = {
+        'url': args.url,
+        'mix': mix,
+        'curve': [
+            {'concurrency': l['concurrency'], 'throughput_rps': l['throughput_rps'],
+             'p99_ms': l['latency']['p99_ms'], 'error_rate': l['error_rate']}
+            for l in levels
+        ],
+        'levels': levels
+    }
+    save_json(args.output, report)
+    print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
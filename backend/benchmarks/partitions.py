@@ -0,0 +1,99 @@
+"""
+Per-user lookups with secondary indexes vs scanning every record, at 10k users
+
+    cd backend
+    python -m benchmarks.partitions
+    python -m benchmarks.partitions --users 2000   # quicker run
+
+Storage is filled with --conversations-per-user conversations and
+--documents-per-user documents for each of --users consultants (each with a
+few contacts). `scan_*` cases filter the whole collection the way
+get_documents did before the indexes; `indexed_*` cases use the
+user_id/contact_id partitions.
+"""
+import argparse
+import os
+import random
+import sys
+
+from benchmarks.common import BACKEND_DIR, add_baseline_args, finish, run_case
+
+CONTACTS_PER_USER = 5
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--conversations-per-user', type=int, default=20)
+    parser.add_argument('--documents-per-user', type=int, default=5)
+    parser.add_argument('--lookups', type=int, default=500)
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    os.environ.pop('MEMORY_DB_DIR', None)
+    from data_processor import load_conversations, extract_sequences
+    from database_service import DatabaseService
+
+    sequences = extract_sequences(load_conversations(os.path.join(BACKEND_DIR, 'conversations.json')))
+    rng = random.Random(7)
+    db = DatabaseService()
+
+    # Interleaved like real traffic, so no user's records are contiguous
+    total = args.users * args.conversations_per_user
+    for i in range(total):
+        user = i % args.users
+        seq = rng.choice(sequences)
+        db._apply_save_conversation({
+            'id': i + 1,
+            'client_message': ' '.join(seq['client_sequence']),
+            'ai_reply': ' '.join(seq['consultant_reply']),
+            'user_id': f'u{user}',
+            'contact_id': f'u{user}-c{rng.randrange(CONTACTS_PER_USER)}'
+        })
+    for i in range(args.users * args.documents_per_user):
+        user = i % args.users
+        db._apply_save_document({
+            'id': i + 1,
+            'filename': f'passport-{i}.pdf',
+            'user_id': f'u{user}',
+            'contact_id': f'u{user}-c{rng.randrange(CONTACTS_PER_USER)}'
+        })
+
+    users = [f'u{rng.randrange(args.users)}' for _ in range(args.lookups)]
+    contacts = [f'{user}-c{rng.randrange(CONTACTS_PER_USER)}' for user in users]
+    conversations = db.storage['conversations']
+    documents = db.storage['documents']
+
+    def scan_page(user):
+        return [c for c in conversations if c.get('user_id') == user][:50]
+
+    def scan_search(user):
+        return [
+            c for c in conversations
+            if c.get('user_id') == user
+            and ('bank' in c.get('client_message').lower() or 'bank' in c.get('ai_reply').lower())
+        ]
+
+    results = {
+        'scan_documents': run_case(lambda user: [d for d in documents if d.get('user_id') == user], users[:50], 5),
+        'indexed_documents': run_case(db.get_documents, users),
+        'scan_conversations_page': run_case(scan_page, users[:50], 5),
+        'indexed_conversations_page': run_case(lambda user: db.get_conversations_encoded(50, 0, user), users),
+        'indexed_contact_page': run_case(lambda contact: db.get_conversations(50, 0, contact_id=contact), contacts),
+        'scan_search': run_case(scan_search, users[:50], 5),
+        'indexed_search': run_case(lambda user: db.search_conversations('bank', user), users),
+        'semantic_search_all': run_case(lambda _: db.search_conversations_semantic('money in my bank', 20), users[:50], 5),
+        'semantic_search_user': run_case(
+            lambda user: db.search_conversations_semantic('money in my bank', 20, user), users
+        )
+    }
+    results['records'] = {
+        'users': args.users,
+        'conversations': len(conversations),
+        'documents': len(documents)
+    }
+    return finish('partitions', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
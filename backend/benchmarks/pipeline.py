@@ -0,0 +1,69 @@
+"""
+Benchmark the AI pipeline offline by replaying conversations.json through the stub provider
+
+    cd backend
+    python -m benchmarks.pipeline                  # compare against the saved baseline
+    python -m benchmarks.pipeline --save-baseline  # record a new baseline
+"""
+import argparse
+import os
+import sys
+
+from benchmarks.common import BACKEND_DIR, add_baseline_args, finish, run_case
+
+SEARCH_QUERIES = ['visa', 'bank', 'THB', 'passport', 'muay thai', 'remote', 'no-such-phrase']
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Stub provider latency per call')
+    parser.add_argument('--reply-words', type=int, default=40, help='Stub reply size in words')
+    parser.add_argument('--repeat', type=int, default=5, help='Passes over the extracted sequences')
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    # The services are singletons configured from the environment at import time
+    os.environ['DEFAULT_LLM_PROVIDER'] = 'stub'
+    os.environ['STUB_LLM_LATENCY_MS'] = str(args.latency_ms)
+    os.environ['STUB_LLM_REPLY_WORDS'] = str(args.reply_words)
+
+    from ai_service import ai_service
+    from database_service import db_service
+    from data_processor import load_conversations, extract_sequences
+    from app import app
+
+    db_service._init_memory_db()
+    sequences = extract_sequences(load_conversations(os.path.join(BACKEND_DIR, 'conversations.json')))
+    replay = sequences * args.repeat
+    client = app.test_client()
+
+    results = {
+        'generate_reply': run_case(
+            lambda seq: ai_service.generate_reply(seq['client_sequence'], seq['chat_history']),
+            replay
+        ),
+        'improve_prompt_auto': run_case(
+            lambda seq: ai_service.improve_prompt_auto(
+                seq['client_sequence'], seq['chat_history'], seq['consultant_reply']
+            ),
+            sequences
+        ),
+        'sentiment': run_case(
+            lambda seq: ai_service.analyze_sentiment('\n'.join(seq['client_sequence'])),
+            replay
+        ),
+        'search': run_case(
+            db_service.search_conversations,
+            SEARCH_QUERIES * args.repeat
+        ),
+        'export': run_case(
+            lambda _: client.get('/conversations/export').get_data(),
+            range(args.repeat * 4)
+        )
+    }
+
+    return finish('pipeline', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
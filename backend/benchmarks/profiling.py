@@ -0,0 +1,87 @@
+"""
+Request overhead of the profiling hooks: removed, idle, sampling, sampling with tracemalloc
+
+    cd backend
+    python -m benchmarks.profiling
+    python -m benchmarks.profiling --requests 2000   # quicker run
+
+Requests go through Flask's test client (stub provider). `no_hooks` takes the
+profiler's before/teardown hooks off the app; `idle` is the normal state with
+no profile running; `sampling` runs a requests-mode profile at the default
+interval for the whole case; `sampling_memory` adds tracemalloc (timed
+without the allocation pass, which would stop tracemalloc). `health_*` is
+GET /health (hook overhead dominates), `reply_*` POST /generate-reply.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.common import add_baseline_args, finish, percentile, run_case
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=10000)
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='issa-profile-')
+    os.environ.update(
+        DEFAULT_LLM_PROVIDER='stub',
+        STUB_LLM_LATENCY_MS='0',
+        LLM_COALESCE='false',
+        MEMORY_DB_DIR=os.path.join(workdir, 'db'),
+        IMPROVE_QUEUE_PATH=os.path.join(workdir, 'queue.db')
+    )
+    from app import app, profile_request_end, profile_request_start
+    from profiler import profiler
+
+    client = app.test_client()
+    hooks = (app.before_request_funcs.setdefault(None, []), app.teardown_request_funcs.setdefault(None, []))
+
+    def timed(fn, items):
+        latencies = []
+        for item in items:
+            t0 = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - t0)
+        return {
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / sum(latencies), 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3)
+        }
+
+    def cases(label: str, measure=run_case):
+        n = args.requests
+        reply = lambda i: client.post('/generate-reply', json={'clientSequence': f'hi {i}', 'chatHistory': []})
+        return {
+            f'health_{label}': measure(lambda _: client.get('/health'), range(n)),
+            f'reply_{label}': measure(reply, range(n // 10))
+        }
+
+    hooks[0].remove(profile_request_start)
+    hooks[1].remove(profile_request_end)
+    results = cases('no_hooks')
+    hooks[0].append(profile_request_start)
+    hooks[1].append(profile_request_end)
+    results.update(cases('idle'))
+
+    profiler.start(requests=10 ** 9, seconds=profiler.max_seconds)
+    results.update(cases('sampling'))
+    sampled = profiler.stop()
+    profiler.start(requests=10 ** 9, seconds=profiler.max_seconds, memory=True)
+    results.update(cases('sampling_memory', measure=timed))
+    profiler.stop()
+
+    results['sampler'] = {
+        'samples': sampled['samples'],
+        'cpu_ms_per_second': round(sampled['sampler_cpu_seconds'] * 1000 / sampled['elapsed_seconds'], 2)
+    }
+    return finish('profiling', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Provider client cost against a local stand-in: pooled vs per-call clients, retries, timeouts
+
+    cd backend
+    python -m benchmarks.provider_clients
+    python -m benchmarks.provider_clients --requests 200 --latency-ms 5   # quicker run
+
+The OpenAI and Gemini (REST) clients talk to benchmarks.provider_standin on
+loopback. `openai_pooled` / `google_pooled` go through LLMService's long-lived
+clients; `openai_client_per_call` builds a new OpenAI client for every call
+(what a per-request client costs: a connection and the client setup each
+time). Loopback has no TLS handshake or network round trip, so the gap
+against a real provider is larger than shown. `openai_retry_503` fails the
+first attempt of every call with a 503 and reports the added latency of one
+jittered backoff. `connections` is what the stand-in accepted per case.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks.common import add_baseline_args, finish, run_case
+from benchmarks.provider_standin import start_standin
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Stand-in response time')
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    server, state, url = start_standin(latency_ms=args.latency_ms)
+    workdir = tempfile.mkdtemp(prefix='issa-clients-')
+    os.environ.update(
+        OPENAI_API_KEY='standin',
+        OPENAI_BASE_URL=f'{url}/v1',
+        GOOGLE_API_KEY='standin',
+        GOOGLE_API_TRANSPORT='rest',
+        GOOGLE_API_ENDPOINT=url,
+        LLM_PREWARM='false',
+        LLM_RETRY_BASE_DELAY='0.05',
+        MEMORY_DB_DIR=os.path.join(workdir, 'db'),
+        IMPROVE_QUEUE_PATH=os.path.join(workdir, 'queue.db')
+    )
+    from openai import OpenAI
+    from llm_service import llm_service
+
+    def per_call(_):
+        client = OpenAI(api_key='standin', base_url=f'{url}/v1', max_retries=0)
+        try:
+            client.chat.completions.create(model='gpt-4o-mini', messages=[{'role': 'user', 'content': 'hi'}])
+        finally:
+            client.close()
+
+    def with_503(_):
+        state.inject([503])
+        llm_service._call_openai('prompt', 'hi')
+
+    cases = {
+        'openai_pooled': lambda _: llm_service._call_openai('prompt', 'hi'),
+        'openai_client_per_call': per_call,
+        'google_pooled': lambda _: llm_service._call_google('prompt', 'hi'),
+        'openai_retry_503': with_503
+    }
+    results = {}
+    for name, fn in cases.items():
+        fn(None)  # SDK import and client construction stay out of the timings
+        state.reset()
+        n = args.requests if name != 'openai_retry_503' else max(1, args.requests // 10)
+        results[name] = run_case(fn, range(n), alloc_sample=20)
+        seen = state.get_stats()
+        results[name]['connections'] = seen['connections']
+
+    results['client_stats'] = {
+        'openai_reuse_rate': llm_service.get_client_stats()['openai']['reuse_rate'],
+        'openai_retries': llm_service.get_client_stats()['retries']['openai']['retries']
+    }
+    server.shutdown()
+    return finish('provider_clients', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Local HTTP stand-in for the OpenAI and Gemini REST APIs, with failure injection
+
+    cd backend
+    python -m benchmarks.provider_standin --port 8099 --latency-ms 50
+
+then point the backend at it:
+
+    OPENAI_API_KEY=dummy OPENAI_BASE_URL=http://127.0.0.1:8099/v1 python app.py
+    GOOGLE_API_KEY=dummy GOOGLE_API_TRANSPORT=rest GOOGLE_API_ENDPOINT=http://127.0.0.1:8099 python app.py
+
+It speaks HTTP/1.1 with keepalive and serves POST /v1/chat/completions,
+GET /v1/models and POST /v1beta/models/<model>:generateContent / :countTokens.
+POST /_standin/fail {"statuses": [503, 429], "retryAfter": 1} makes the next
+calls fail with those statuses; GET /_standin/stats reports the connections
+accepted and requests served, so client-side connection reuse can be checked
+against what the server saw.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+class StandinState:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.lock = threading.Lock()
+        self.failures: List[int] = []
+        self.retry_after: Optional[float] = None
+        self.stats = {'connections': 0, 'requests': 0, 'failures_sent': 0}
+
+    def inject(self, statuses: List[int], retry_after: Optional[float] = None):
+        with self.lock:
+            self.failures.extend(statuses)
+            self.retry_after = retry_after
+
+    def next_failure(self) -> Optional[int]:
+        with self.lock:
+            if not self.failures:
+                return None
+            self.stats['failures_sent'] += 1
+            return self.failures.pop(0)
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {**self.stats, 'failures_pending': len(self.failures)}
+
+    def reset(self):
+        with self.lock:
+            self.failures = []
+            self.retry_after = None
+            self.stats = {'connections': 0, 'requests': 0, 'failures_sent': 0}
+
+
+def chat_completion(model: str) -> Dict:
+    return {
+        'id': 'chatcmpl-standin',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': json.dumps({'reply': 'Stand-in reply'})},
+            'finish_reason': 'stop'
+        }],
+        'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15}
+    }
+
+
+def gemini_content() -> Dict:
+    return {
+        'candidates': [{
+            'content': {'role': 'model', 'parts': [{'text': json.dumps({'reply': 'Stand-in reply'})}]},
+            'finishReason': 'STOP',
+            'index': 0
+        }],
+        'usageMetadata': {'promptTokenCount': 10, 'candidatesTokenCount': 5, 'totalTokenCount': 15}
+    }
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    state: StandinState = None
+
+    def setup(self):
+        super().setup()
+        self.state.count('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Dict, headers: Optional[Dict] = None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw) if raw else {}
+
+    def _serve(self, method: str):
+        body = self._body() if method == 'POST' else {}
+        path = self.path.split('?')[0]
+
+        if path == '/_standin/stats':
+            return self._send(200, self.state.get_stats())
+        if path == '/_standin/fail':
+            self.state.inject([int(s) for s in body.get('statuses', [])], body.get('retryAfter'))
+            return self._send(200, self.state.get_stats())
+        if path == '/_standin/reset':
+            self.state.reset()
+            return self._send(200, self.state.get_stats())
+
+        self.state.count('requests')
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        failure = self.state.next_failure()
+        if failure:
+            headers = {}
+            if failure in (429, 503) and self.state.retry_after is not None:
+                headers['Retry-After'] = str(self.state.retry_after)
+            return self._send(failure, {'error': {'code': failure, 'message': f'Injected {failure}',
+                                                  'status': 'UNAVAILABLE'}}, headers)
+
+        if method == 'GET' and path.rstrip('/').endswith('/models'):
+            return self._send(200, {'object': 'list', 'data': [
+                {'id': 'gpt-4o-mini', 'object': 'model', 'created': 0, 'owned_by': 'standin'}
+            ]})
+        if path.endswith('/chat/completions'):
+            return self._send(200, chat_completion(body.get('model', 'standin')))
+        if path.endswith(':generateContent'):
+            return self._send(200, gemini_content())
+        if path.endswith(':countTokens'):
+            return self._send(200, {'totalTokens': 1})
+        return self._send(404, {'error': {'code': 404, 'message': f'No stand-in for {method} {path}'}})
+
+    def do_GET(self):
+        self._serve('GET')
+
+    def do_POST(self):
+        self._serve('POST')
+
+
+def start_standin(port: int = 0, latency_ms: float = 0.0):
+    """Start the stand-in on a background thread; returns (server, state, base_url)"""
+    state = StandinState(latency_ms)
+    handler = type('Handler', (StandinHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='provider-standin', daemon=True).start()
+    return server, state, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    server, _, url = start_standin(args.port, args.latency_ms)
+    print(f"Provider stand-in on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Quality analytics from the materialized views vs scanning every stored conversation
+
+    cd backend
+    python -m benchmarks.quality_views
+    python -m benchmarks.quality_views --conversations 20000   # quicker run
+
+Storage is filled with --conversations spread over 30 days, three providers
+and five prompt versions, with sentiment and confidence like the analysis
+produces. `scan_*` cases compute the same numbers by walking
+storage['conversations'] (what answering "low-confidence or negative chats
+today, by provider" took before the views); `view_*` cases read
+db.get_quality. `view_add` is what maintaining the views adds to each
+save_conversation.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.common import add_baseline_args, finish, run_case
+
+PROVIDERS = ('openai', 'google', 'stub')
+SENTIMENTS = ('positive', 'neutral', 'negative')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conversations', type=int, default=200000)
+    parser.add_argument('--reads', type=int, default=500)
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    os.environ.pop('MEMORY_DB_DIR', None)
+    from database_service import DatabaseService
+    from quality_views import QualityViews
+
+    rng = random.Random(7)
+    now = time.time()
+    span = 30 * 86400
+
+    def conversation(i: int) -> dict:
+        score = round(min(1.0, max(0.0, rng.gauss(0.78, 0.12))), 2)
+        return {
+            'id': i + 1,
+            'timestamp': datetime.fromtimestamp(now - span + span * i / args.conversations).isoformat(),
+            'client_message': 'Which visa fits a remote worker?',
+            'ai_reply': 'The DTV covers remote work; you need 500,000 THB in savings.',
+            'sentiment': {'sentiment': rng.choice(SENTIMENTS), 'score': 0.0},
+            'confidence': {'score': score, 'should_review': score < 0.7, 'flags': []},
+            'provider': rng.choice(PROVIDERS),
+            'prompt_version': rng.randrange(1, 6)
+        }
+
+    db = DatabaseService()
+    items = [conversation(i) for i in range(args.conversations)]
+    for item in items:
+        db._apply_save_conversation(item)
+    conversations = db.storage['conversations']
+    today = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def scan_today_by_provider(_):
+        cutoff = today.isoformat()
+        groups = {}
+        for c in conversations:
+            if c.get('timestamp') < cutoff:
+                continue
+            group = groups.setdefault(c.get('provider'), {'conversations': 0, 'low': 0, 'negative': 0})
+            group['conversations'] += 1
+            group['low'] += c.get('confidence', {}).get('score', 1) < 0.7
+            group['negative'] += c.get('sentiment', {}).get('sentiment') == 'negative'
+        return groups
+
+    def scan_all_by_version(_):
+        groups = {}
+        for c in conversations:
+            group = groups.setdefault(c.get('prompt_version'), {})
+            label = c.get('sentiment', {}).get('sentiment')
+            group[label] = group.get(label, 0) + 1
+        return groups
+
+    views = QualityViews()
+    results = {
+        'scan_today_by_provider': run_case(scan_today_by_provider, range(3), alloc_sample=1),
+        'view_today_by_provider': run_case(
+            lambda _: db.get_quality(since=today.timestamp(), by='provider'), range(args.reads)
+        ),
+        'scan_all_by_version': run_case(scan_all_by_version, range(3), alloc_sample=1),
+        'view_all_by_version': run_case(lambda _: db.get_quality(by='version'), range(args.reads)),
+        'view_30_days_by_bucket': run_case(
+            lambda _: db.get_quality(since=now - span, by='bucket'), range(max(1, args.reads // 10)), alloc_sample=5
+        ),
+        'view_add': run_case(lambda i: views.add(items[i]), range(min(args.conversations, 20000)))
+    }
+    results['views'] = db.quality.get_stats()
+    return finish('quality_views', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Reply similarity scoring: one pair at a time vs whole evaluation batches
+
+    cd backend
+    python -m benchmarks.reply_scorer
+    python -m benchmarks.reply_scorer --pairs 2000   # quicker run
+
+Pairs come from the consultant replies in conversations.json: a third are a
+reply against itself (a prediction that already matches), a third a reply
+stating a fee, amount or duration against the same reply with its sentences
+shuffled and its numbers changed (close, but a fact is wrong), a third a
+reply against a randomly drawn one (occasionally itself). `per_pair` scores
+them one call each, `batch_<n>` in batches of n. `gate` reports how many
+editor calls the threshold skips on this mix.
+"""
+import argparse
+import random
+import re
+import sys
+
+from benchmarks.common import add_baseline_args, finish, run_case
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, default=10000)
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    from reply_scorer import ReplyScorer, extract_facts
+    from training_dataset import training_dataset
+
+    replies = [' '.join(seq['consultant_reply']) for seq in training_dataset.get_many(range(len(training_dataset)))]
+    with_facts = [reply for reply in replies if extract_facts(reply)]
+    rng = random.Random(7)
+
+    def altered(reply: str) -> str:
+        sentences = re.split(r'(?<=[.!?])\s+', reply)
+        rng.shuffle(sentences)
+        return re.sub(r'\d[\d,]*', lambda m: str(int(m.group().replace(',', '') or 0) + 1), ' '.join(sentences))
+
+    predicted, actual = [], []
+    for i in range(args.pairs):
+        kind = i % 3
+        reply = rng.choice(with_facts if kind == 1 else replies)
+        predicted.append(reply if kind == 0 else altered(reply) if kind == 1 else rng.choice(replies))
+        actual.append(reply)
+
+    scorer = ReplyScorer()
+    scorer.idf()  # fitted once, outside the timings
+
+    results = {
+        'per_pair': run_case(lambda i: scorer.score(predicted[i], actual[i]), range(min(args.pairs, 2000)))
+    }
+    for size in (32, 256):
+        starts = range(0, args.pairs - size + 1, size)
+        case = run_case(lambda start: scorer.score_batch(predicted[start:start + size], actual[start:start + size]),
+                        starts, alloc_sample=5)
+        case['us_per_pair'] = round(case['p50_ms'] * 1000 / size, 1)
+        results[f'batch_{size}'] = case
+    results['per_pair']['us_per_pair'] = round(results['per_pair']['p50_ms'] * 1000, 1)
+
+    scores = scorer.score_batch(predicted, actual)
+    skipped = [s['skip_editor'] for s in scores]
+    results['gate'] = {
+        'threshold': scorer.threshold,
+        'skip_rate': round(sum(skipped) / len(skipped), 4),
+        'exact_skipped': round(sum(skipped[0::3]) / len(skipped[0::3]), 4),
+        'altered_skipped': round(sum(skipped[1::3]) / max(1, len(skipped[1::3])), 4),
+        'unrelated_skipped': round(sum(skipped[2::3]) / max(1, len(skipped[2::3])), 4)
+    }
+    return finish('reply_scorer', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
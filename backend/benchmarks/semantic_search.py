@@ -0,0 +1,105 @@
+"""
+Benchmark semantic conversation search at 1M conversations
+
+    cd backend
+    python -m benchmarks.semantic_search
+    python -m benchmarks.semantic_search --records 200000   # quicker run
+
+`encode` times vectorizing one conversation (what save_conversation adds).
+The 1M-row index is built from real conversation text - client messages and
+consultant replies from conversations.json, recombined into distinct pairs -
+and searched both from the heap and through a memory-mapped file. The
+substring scan that `mode=text` does is timed over the same texts.
+"""
+import argparse
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks.common import BACKEND_DIR, add_baseline_args, finish, run_case
+
+QUERIES = [
+    'money in my bank', 'how long does processing take', 'how much does it cost',
+    'which documents do I need', 'I work remotely for a company', 'muay thai course',
+    'can I extend my visa', 'embassy appointment', 'proof of funds', 'passport copy'
+]
+
+
+def rss_mb() -> float:
+    """Current resident set size in MiB"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def build_texts(unique: int, seed: int = 7):
+    from data_processor import load_conversations, extract_sequences
+    sequences = extract_sequences(load_conversations(os.path.join(BACKEND_DIR, 'conversations.json')))
+    clients = [' '.join(s['client_sequence']) for s in sequences]
+    replies = [' '.join(s['consultant_reply']) for s in sequences]
+    rng = random.Random(seed)
+    return [f'{rng.choice(clients)}\n{rng.choice(replies)}' for _ in range(unique)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=1_000_000)
+    parser.add_argument('--unique', type=int, default=20000, help='Distinct texts tiled to --records rows')
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--searches', type=int, default=50)
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    from semantic_index import SemanticIndex
+
+    texts = build_texts(args.unique)
+    queries = [QUERIES[i % len(QUERIES)] for i in range(args.searches)]
+    results = {}
+
+    index = SemanticIndex(dim=args.dim)
+    results['encode'] = run_case(index.encode, texts[:5000])
+    unique_rows = np.stack([index.encode(text) for text in texts])
+    reps = -(-args.records // len(unique_rows))
+
+    # Heap index
+    before = rss_mb()
+    index._vectors = np.tile(unique_rows, (reps, 1))[:args.records]
+    index._count = args.records
+    heap_rss = rss_mb() - before
+    results['search_heap'] = run_case(lambda q: index.search(q, args.k), queries, alloc_sample=5)
+
+    # Memory-mapped index over the same rows
+    workdir = tempfile.mkdtemp(prefix='issa-semantic-')
+    try:
+        with open(os.path.join(workdir, f'vectors-{args.dim}.i8'), 'wb') as f:
+            f.write(index._vectors.tobytes())
+        index = None  # Free the heap rows before mapping them from disk
+        mapped = SemanticIndex(dim=args.dim, directory=workdir)
+        assert len(mapped) == args.records
+        results['search_mmap'] = run_case(lambda q: mapped.search(q, args.k), queries, alloc_sample=5)
+        mapped.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # What mode=text does today, over the same number of conversations
+    corpus = [texts[i % len(texts)] for i in range(args.records)]
+    results['substring_scan'] = run_case(
+        lambda q: [t for t in corpus if q in t.lower()], queries[:max(1, args.searches // 10)], alloc_sample=1
+    )
+
+    results['memory'] = {
+        'records': args.records,
+        'int8_index_mb': round(args.records * args.dim / 2 ** 20, 1),
+        'float32_equivalent_mb': round(args.records * args.dim * 4 / 2 ** 20, 1),
+        'heap_rss_delta_mb': round(heap_rss, 1)
+    }
+    return finish('semantic_search', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Compare stateless chat turns (full chatHistory every request) with server-side sessions
+
+    cd backend
+    python -m benchmarks.sessions
+
+For conversations of growing length, reports the request body size of one
+more turn and the time to produce the CHAT HISTORY text for it: re-formatting
+the whole history versus appending the new turn to a session.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.common import add_baseline_args, finish, run_case
+
+CLIENT = 'Hi, I want to apply for the DTV visa. Do I need 500,000 THB in my bank?'
+REPLY = 'Yes - the DTV requires proof of 500,000 THB in savings held for at least 3 months.'
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', default='10,100,1000', help='Comma-separated conversation lengths')
+    parser.add_argument('--iterations', type=int, default=200)
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    from ai_service import ai_service
+    from session_store import ChatSession
+
+    results = {}
+    for turns in (int(t) for t in args.turns.split(',')):
+        history = []
+        session = ChatSession('bench')
+        for _ in range(turns):
+            history += [{'role': 'client', 'message': CLIENT}, {'role': 'consultant', 'message': REPLY}]
+            session.append_turn([CLIENT], REPLY)
+        session.history_text()
+
+        stateless = run_case(lambda _: ai_service.format_chat_history(history), range(args.iterations), alloc_sample=5)
+        stateless['request_bytes'] = len(json.dumps({'clientSequence': CLIENT, 'chatHistory': history}))
+        results[f'stateless_{turns}'] = stateless
+
+        def session_turn(_):
+            session.append_turn([CLIENT], REPLY)
+            session.history_text()
+
+        with_session = run_case(session_turn, range(args.iterations), alloc_sample=5)
+        with_session['request_bytes'] = len(json.dumps({'clientSequence': CLIENT, 'sessionId': session.id.ljust(32, '0')}))
+        results[f'session_{turns}'] = with_session
+
+    return finish('sessions', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
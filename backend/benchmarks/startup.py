@@ -0,0 +1,83 @@
+"""
+Measure backend cold start with `python -X importtime`
+
+    cd backend
+    python -m benchmarks.startup                  # compare against the saved baseline
+    python -m benchmarks.startup --save-baseline  # record a new baseline
+
+`import_app` is what a worker pays at boot; `import_app_with_sdks` additionally
+imports every provider SDK and document library, i.e. the cost lazy loading avoids.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.common import BACKEND_DIR, add_baseline_args, finish
+
+CASES = {
+    'import_app': 'import app',
+    'import_app_with_sdks': 'import app, openai, google.generativeai, PyPDF2, PIL.Image'
+}
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int]]:
+    """Top-level (module, cumulative microseconds) pairs from -X importtime output"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two extra spaces per level
+        if len(name) - len(name.lstrip()) == 1:
+            modules.append((name.strip(), int(cumulative)))
+    return modules
+
+
+def measure(code: str, runs: int) -> Tuple[Dict, List[Tuple[str, int]]]:
+    env = dict(os.environ)
+    env.pop('PYTHONPROFILEIMPORTTIME', None)
+    import_times, wall_times = [], []
+    modules = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+        )
+        wall_times.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"`{code}` failed:\n{proc.stderr[-2000:]}")
+        modules = parse_importtime(proc.stderr)
+        import_times.append(sum(us for _, us in modules) / 1e6)
+
+    return {
+        'import_ms': round(statistics.median(import_times) * 1000, 1),
+        'wall_ms': round(statistics.median(wall_times) * 1000, 1)
+    }, modules
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts per case (median is reported)')
+    parser.add_argument('--top', type=int, default=10, help='Slowest top-level imports to list')
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for case, code in CASES.items():
+        results[case], modules = measure(code, args.runs)
+        slowest = sorted(modules, key=lambda item: item[1], reverse=True)[:args.top]
+        print(f"{case}: slowest top-level imports")
+        for name, us in slowest:
+            print(f"  {us / 1000:8.1f} ms  {name}")
+
+    return finish('startup', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
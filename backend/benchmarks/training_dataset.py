@@ -0,0 +1,91 @@
+"""
+Training data load time: parsing conversations.json + extract_sequences vs the compiled dataset
+
+    cd backend
+    python -m benchmarks.training_dataset
+    python -m benchmarks.training_dataset --scale 10   # quicker run
+
+The corpus is conversations.json repeated --scale times (contact ids made
+unique per copy). `extract_*` is what /test-training did on every request;
+`compile` builds the .seq file once; `open_*` is a fresh TrainingDataset up
+to its first len() - with the file current, and after the source was only
+touched (content hash re-checked); `random_access`, `stratified_sample_100`
+and `materialize_all` read sequences back out of the memory map.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from benchmarks.common import BACKEND_DIR, add_baseline_args, finish, run_case
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of the slow (whole-corpus) cases')
+    add_baseline_args(parser)
+    args = parser.parse_args(argv)
+
+    from data_processor import load_conversations, extract_sequences
+    from training_dataset import TrainingDataset, compile_dataset
+
+    with open(os.path.join(BACKEND_DIR, 'conversations.json'), encoding='utf-8') as f:
+        corpus = json.load(f)
+    enlarged = [
+        {**convo, 'contact_id': f"{convo.get('contact_id')}-{copy}"}
+        for copy in range(args.scale) for convo in corpus
+    ]
+
+    workdir = tempfile.mkdtemp(prefix='issa-dataset-')
+    try:
+        source = os.path.join(workdir, 'conversations.json')
+        with open(source, 'w', encoding='utf-8') as f:
+            json.dump(enlarged, f, ensure_ascii=False, indent=2)
+        target = f'{source}.seq'
+
+        def extract(_):
+            return extract_sequences(load_conversations(source))
+
+        def open_dataset(_):
+            return len(TrainingDataset(source, target))
+
+        def open_touched(_):
+            os.utime(source)
+            return len(TrainingDataset(source, target))
+
+        results = {
+            'extract_json': run_case(extract, range(args.repeat), alloc_sample=1),
+            'compile': run_case(lambda _: compile_dataset(source, target), range(args.repeat), alloc_sample=1),
+            'open_current': run_case(open_dataset, range(200), alloc_sample=20),
+            'open_touched': run_case(open_touched, range(args.repeat), alloc_sample=1)
+        }
+
+        dataset = TrainingDataset(source, target)
+        count = len(dataset)
+        rng = random.Random(7)
+        results['random_access'] = run_case(dataset.__getitem__, [rng.randrange(count) for _ in range(5000)])
+        results['stratified_sample_100'] = run_case(
+            lambda seed: dataset.get_many(dataset.sample(100, seed=seed)), range(100), alloc_sample=10
+        )
+        results['materialize_all'] = run_case(
+            lambda _: dataset.get_many(range(count)), range(args.repeat), alloc_sample=1
+        )
+        assert {k: v for k, v in dataset[count - 1].items() if k != 'index'} == extract(None)[-1]
+
+        results['corpus'] = {
+            'conversations': len(enlarged),
+            'sequences': count,
+            'json_bytes': os.path.getsize(source),
+            'compiled_bytes': os.path.getsize(target)
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return finish('training_dataset', results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+On-disk cassette store for recording and replaying LLM calls
+"""
+import hashlib
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, Optional, Tuple
+
+# Data file record: payload length, key digest, zlib-compressed JSON payload
+_RECORD_HEADER = struct.Struct('<I16s')
+# Index entry: key digest, data offset, record length
+_INDEX_ENTRY = struct.Struct('<16sQI')
+
+
+class CassetteStore:
+    """
+    Append-only store of (provider, model, prompt, user message) -> response.
+
+    Records live in cassette.data; cassette.idx holds fixed-size entries
+    pointing into it, so opening the store loads the index into a dict and
+    every lookup is a single seek + read regardless of cassette size. The
+    index can be rebuilt from the data file if it is missing or truncated.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, 'cassette.data')
+        self.index_path = os.path.join(directory, 'cassette.idx')
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, Tuple[int, int]] = {}
+        self._load_index()
+        self._data = open(self.data_path, 'ab+')
+        self._idx = open(self.index_path, 'ab')
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, user_message: str) -> bytes:
+        h = hashlib.blake2b(digest_size=16)
+        for part in (provider, model, prompt, user_message):
+            h.update(part.encode('utf-8'))
+            h.update(b'\x00')
+        return h.digest()
+
+    def _load_index(self):
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        indexed_to = 0
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                raw = f.read()
+            usable = len(raw) - len(raw) % _INDEX_ENTRY.size
+            for key, offset, length in _INDEX_ENTRY.iter_unpack(raw[:usable]):
+                if offset + length > data_size:
+                    break
+                self._index[key] = (offset, length)
+                indexed_to = max(indexed_to, offset + length)
+
+        if indexed_to < data_size:
+            self._rebuild_index_from(indexed_to, data_size)
+
+    def _rebuild_index_from(self, offset: int, data_size: int):
+        """Index records written after the last index entry (e.g. after a crash)"""
+        with open(self.data_path, 'rb') as f:
+            f.seek(offset)
+            while offset + _RECORD_HEADER.size <= data_size:
+                payload_length, key = _RECORD_HEADER.unpack(f.read(_RECORD_HEADER.size))
+                length = _RECORD_HEADER.size + payload_length
+                if offset + length > data_size:
+                    break
+                f.seek(payload_length, os.SEEK_CUR)
+                self._index[key] = (offset, length)
+                offset += length
+
+        # Drop any torn record at the tail, then rewrite the full index
+        if offset < data_size:
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(offset)
+        with open(self.index_path, 'wb') as f:
+            for key, (entry_offset, length) in self._index.items():
+                f.write(_INDEX_ENTRY.pack(key, entry_offset, length))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def record(self, key: bytes, response: Dict, latency: float):
+        """Append a recorded response (a later recording of the same key wins)"""
+        payload = zlib.compress(json.dumps(
+            {'response': response, 'latency': round(latency, 4)},
+            separators=(',', ':'),
+            ensure_ascii=False
+        ).encode('utf-8'))
+
+        with self._lock:
+            self._data.seek(0, os.SEEK_END)
+            offset = self._data.tell()
+            self._data.write(_RECORD_HEADER.pack(len(payload), key) + payload)
+            self._data.flush()
+            length = _RECORD_HEADER.size + len(payload)
+            self._idx.write(_INDEX_ENTRY.pack(key, offset, length))
+            self._idx.flush()
+            self._index[key] = (offset, length)
+
+    def lookup(self, key: bytes) -> Optional[Tuple[Dict, float]]:
+        """Get (response, recorded latency) for a key, or None"""
+        with self._lock:
+            location = self._index.get(key)
+            if location is None:
+                return None
+            offset, length = location
+            self._data.seek(offset)
+            raw = self._data.read(length)
+
+        entry = json.loads(zlib.decompress(raw[_RECORD_HEADER.size:]))
+        return entry['response'], entry['latency']
+
+    def close(self):
+        with self._lock:
+            self._data.close()
+            self._idx.close()
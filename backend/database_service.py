@@ -3,17 +3,60 @@ Enhanced Database Service with conversation history and metrics
 """
 import os
 import json
-from typing import Optional, List, Dict
+import time
+import threading
+from typing import Any, Callable, Optional, List, Dict, Tuple
 from datetime import datetime
+from storage_journal import StorageJournal
+from semantic_index import SemanticIndex
+from admission_control import estimate_tokens
+from records import ConversationRecord, MetricColumns
+from quality_views import QualityViews
+import fast_json
 
 class DatabaseService:
+    # Stored records never change after they are written, so each one is
+    # serialized once at write time and list endpoints join the cached bytes
+    # Conversations are not cached: the compact records are the only copy, encoded per page on read
+    ENCODED_COLLECTIONS = ('improvement_history', 'documents')
+    # Secondary indexes (field value -> row numbers) partition these collections by
+    # consultant and by client, so scoped reads touch only the matching records
+    INDEXED_FIELDS = {
+        'conversations': ('user_id', 'contact_id'),
+        'documents': ('user_id', 'contact_id')
+    }
+    
     def __init__(self):
         self.db_type = os.getenv('DATABASE_TYPE', 'memory')
+        self._lock = threading.RLock()
+        self.journal = None
+        self.recovery_seconds = 0
+        # Change feed: every live mutation gets the next change_seq and is passed to the listeners
+        self.change_seq = 0
+        self._listeners: List[Callable[[int, str, dict], None]] = []
+        # Sentiment / confidence / review aggregates, updated on every saved conversation
+        self.quality = QualityViews(
+            bucket_seconds=int(os.getenv('QUALITY_BUCKET_SECONDS', 3600)),
+            buckets_kept=int(os.getenv('QUALITY_BUCKETS_KEPT', 24 * 30)),
+            queue_size=int(os.getenv('QUALITY_REVIEW_QUEUE', 100))
+        )
         
         if self.db_type == 'memory':
             self._init_memory_db()
         else:
             raise ValueError(f"Only memory database supported")
+        
+        # Vector index for semantic search; memory-mapped from SEMANTIC_INDEX_DIR when set.
+        # A durable store keeps its index next to the journal so recovery doesn't re-vectorize
+        index_dir = os.getenv('SEMANTIC_INDEX_DIR')
+        if not index_dir and os.getenv('MEMORY_DB_DIR'):
+            index_dir = os.path.join(os.getenv('MEMORY_DB_DIR'), 'semantic')
+        self.semantic_index = SemanticIndex(dim=int(os.getenv('SEMANTIC_INDEX_DIM', 256)), directory=index_dir)
+        
+        # Optional durability: write-ahead log + snapshots under MEMORY_DB_DIR
+        if os.getenv('MEMORY_DB_DIR'):
+            self._init_journal(os.getenv('MEMORY_DB_DIR'))
+        self._sync_semantic_index()
     
     def _init_memory_db(self):
         """Initialize enhanced in-memory storage"""
@@ -22,9 +65,138 @@ class DatabaseService:
             'version': 1,
             'last_updated': datetime.now().isoformat(),
             'improvement_history': [],
-            'conversations': [],  # NEW: Conversation history
-            'performance_metrics': [],  # NEW: Performance tracking
-            'documents': []  # NEW: Uploaded documents
+            'conversations': [],  # NEW: Conversation history (ConversationRecord)
+            'performance_metrics': MetricColumns(),  # NEW: Performance tracking
+            'documents': [],  # NEW: Uploaded documents
+            'version_stats': {}  # Prompt size and reply latency per prompt version
+        }
+        self._init_encoded()
+    
+    def _init_encoded(self):
+        """(Re)build the serialized-record caches and secondary indexes from storage"""
+        self._encoded = {
+            name: [fast_json.dumps(self._as_dict(record)) for record in self.storage[name]]
+            for name in self.ENCODED_COLLECTIONS
+        }
+        self._indexes = {
+            (collection, field): {}
+            for collection, fields in self.INDEXED_FIELDS.items() for field in fields
+        }
+        for collection in self.INDEXED_FIELDS:
+            for row, record in enumerate(self.storage[collection]):
+                self._index_record(collection, row, record)
+        self.quality.rebuild(self.storage['conversations'])
+    
+    def _index_record(self, collection: str, row: int, record: dict):
+        for field in self.INDEXED_FIELDS.get(collection, ()):
+            value = record.get(field)
+            if value is not None:
+                self._indexes[(collection, field)].setdefault(value, []).append(row)
+    
+    def _append_record(self, collection: str, record: dict, stored: Any = None):
+        """Append record (stored as `stored` when a compact form is kept instead of the dict)"""
+        self.storage[collection].append(record if stored is None else stored)
+        if collection in self._encoded:
+            self._encoded[collection].append(fast_json.dumps(record))
+        self._index_record(collection, len(self.storage[collection]) - 1, record)
+    
+    @staticmethod
+    def _as_dict(record: Any) -> dict:
+        return record.to_dict() if isinstance(record, ConversationRecord) else record
+    
+    def _partition(self, collection: str, user_id: str = None, contact_id: str = None) -> Optional[List[int]]:
+        """Row numbers of a collection for a user and/or contact, oldest first; None when unscoped"""
+        scopes = [(field, value) for field, value in (('user_id', user_id), ('contact_id', contact_id)) if value]
+        if not scopes:
+            return None
+        rows = [(self._indexes[(collection, field)].get(value, []), field, value) for field, value in scopes]
+        # Walk the smaller partition and check the other key on each record
+        rows.sort(key=lambda entry: len(entry[0]))
+        smallest, *others = rows
+        records = self.storage[collection]
+        return [
+            row for row in smallest[0]
+            if all(records[row].get(field) == value for _, field, value in others)
+        ]
+    
+    def _init_journal(self, directory: str):
+        """Recover storage from the latest snapshot + log tail, then start logging"""
+        start = time.time()
+        self.journal = StorageJournal(
+            directory,
+            snapshot_every=int(os.getenv('MEMORY_DB_SNAPSHOT_EVERY', 50000)),
+            fsync=os.getenv('MEMORY_DB_FSYNC', 'true').lower() != 'false'
+        )
+        
+        state, entries = self.journal.recover()
+        if state is not None:
+            self.storage.update(state)
+            self.storage.setdefault('version_stats', {})
+            # Snapshots written before the compact record types hold plain dicts
+            self.storage['conversations'] = [
+                c if isinstance(c, ConversationRecord) else ConversationRecord.from_dict(c)
+                for c in self.storage['conversations']
+            ]
+            if isinstance(self.storage['performance_metrics'], list):
+                self.storage['performance_metrics'] = MetricColumns.from_dicts(self.storage['performance_metrics'])
+            self._init_encoded()
+            self._sync_semantic_index()
+        for op, record in entries:
+            self._apply(op, record)
+        
+        self.journal.start()
+        self.recovery_seconds = round(time.time() - start, 3)
+    
+    def _apply(self, op: str, record: Any):
+        """Apply a mutation to in-memory storage (also used for log replay)"""
+        getattr(self, f'_apply_{op}')(record)
+    
+    def _log(self, op: str, record: Any) -> Optional[int]:
+        """Append a mutation to the journal; call with self._lock held"""
+        if self.journal is None:
+            return None
+        
+        seq = self.journal.append(op, record)
+        if self.journal.snapshot_due():
+            # Lists are copied so later appends don't leak into the snapshot
+            state = {
+                key: list(value) if isinstance(value, list) else value
+                for key, value in self.storage.items()
+            }
+            # Version stats and metric columns are updated in place
+            state['version_stats'] = {version: dict(stats) for version, stats in self.storage['version_stats'].items()}
+            state['performance_metrics'] = self.storage['performance_metrics'].copy()
+            self.journal.start_snapshot(state)
+        return seq
+    
+    def _wait_durable(self, seq: Optional[int]):
+        """Block until a logged mutation is committed (outside self._lock, so commits are grouped)"""
+        if seq is not None:
+            self.journal.wait_durable(seq)
+    
+    def add_listener(self, listener: Callable[[int, str, dict], None]):
+        """Call listener(change_seq, kind, data) for every change from now on (with self._lock held, so keep it quick)"""
+        self._listeners.append(listener)
+    
+    def _changed(self, kind: str, data: dict):
+        """Number a mutation and notify listeners; call with self._lock held"""
+        self.change_seq += 1
+        for listener in self._listeners:
+            listener(self.change_seq, kind, data)
+    
+    def read_consistent(self, read: Callable[[], Any]) -> Tuple[int, Any]:
+        """(change_seq, read()) taken together, so a change feed can resume exactly after the read"""
+        with self._lock:
+            return self.change_seq, read()
+    
+    def get_persistence_stats(self) -> dict:
+        """Journal stats, or just enabled=False when running purely in memory"""
+        if self.journal is None:
+            return {'enabled': False}
+        return {
+            'enabled': True,
+            'recovery_seconds': self.recovery_seconds,
+            **self.journal.get_stats()
         }
     
     def _load_base_prompt(self) -> str:
@@ -37,61 +209,170 @@ class DatabaseService:
         """Retrieve the current AI chatbot prompt"""
         return self.storage['chatbot_prompt']
     
+    def get_prompt_version(self) -> tuple:
+        """Current (prompt, version), read together"""
+        with self._lock:
+            return self.storage['chatbot_prompt'], self.storage['version']
+    
     def set_prompt(self, prompt: str, metadata: dict = None) -> dict:
         """Update the AI chatbot prompt"""
         timestamp = datetime.now().isoformat()
+        record = {'prompt': prompt, 'metadata': metadata or {}, 'timestamp': timestamp}
+        prompt_tokens = estimate_tokens(prompt)
         
-        # Save old prompt to history
-        self.storage['improvement_history'].append({
-            'version': self.storage['version'],
-            'prompt': self.storage['chatbot_prompt'],
-            'timestamp': self.storage['last_updated'],
-            'metadata': metadata or {}
-        })
-        
-        old_version = self.storage['version']
-        old_prompt = self.storage['chatbot_prompt']
-        
-        self.storage['chatbot_prompt'] = prompt
-        self.storage['version'] += 1
-        self.storage['last_updated'] = timestamp
+        with self._lock:
+            old_version = self.storage['version']
+            old_prompt = self.storage['chatbot_prompt']
+            self._apply_set_prompt(record)
+            version = self.storage['version']
+            seq = self._log('set_prompt', record)
+            self._changed('prompt_version', {
+                'version': version,
+                'previous_version': old_version,
+                'updated_at': timestamp,
+                'prompt_tokens': prompt_tokens
+            })
+        self._wait_durable(seq)
         
         return {
             'success': True,
-            'version': self.storage['version'],
+            'version': version,
             'previous_version': old_version,
             'updated_at': timestamp,
             'old_prompt': old_prompt,  # NEW: Return old prompt for diff
-            'new_prompt': prompt
+            'new_prompt': prompt,
+            'prompt_tokens': prompt_tokens
         }
     
+    def _apply_set_prompt(self, record: dict):
+        # Save old prompt to history
+        self._append_record('improvement_history', {
+            'version': self.storage['version'],
+            'prompt': self.storage['chatbot_prompt'],
+            'prompt_tokens': self._version_stats(self.storage['version'])['prompt_tokens'],
+            'timestamp': self.storage['last_updated'],
+            'metadata': record['metadata']
+        })
+        
+        self.storage['chatbot_prompt'] = record['prompt']
+        self.storage['version'] += 1
+        self.storage['last_updated'] = record['timestamp']
+        self._version_stats(self.storage['version'])
+    
+    def _version_stats(self, version: int) -> dict:
+        """Stats entry for a prompt version, created when first needed; call with self._lock held"""
+        stats = self.storage['version_stats'].get(version)
+        if stats is None:
+            # Only the live prompt can be missing an entry (fresh storage or an older snapshot)
+            stats = {'prompt_tokens': estimate_tokens(self.storage['chatbot_prompt']), 'replies': 0, 'total_response_time': 0.0}
+            self.storage['version_stats'][version] = stats
+        return stats
+    
+    def get_prompt_sizes(self) -> List[dict]:
+        """Prompt tokens and measured reply latency for every prompt version"""
+        with self._lock:
+            self._version_stats(self.storage['version'])
+            return [
+                {
+                    'version': version,
+                    'prompt_tokens': stats['prompt_tokens'],
+                    'replies': stats['replies'],
+                    'avg_response_time': round(stats['total_response_time'] / stats['replies'], 3) if stats['replies'] else None
+                }
+                for version, stats in sorted(self.storage['version_stats'].items())
+            ]
+    
+    def get_reply_count(self, version: int) -> int:
+        """Replies logged against a prompt version so far"""
+        stats = self.storage['version_stats'].get(version)
+        return stats['replies'] if stats else 0
+    
     def get_improvement_history(self) -> list:
         """Get prompt improvement history"""
         return self.storage['improvement_history']
     
+    def get_improvement_history_encoded(self, last: int) -> List[bytes]:
+        """Last N history entries as pre-encoded JSON records"""
+        return self._encoded['improvement_history'][-last:] if last > 0 else []
+    
     # NEW: Conversation History Methods
     def save_conversation(self, conversation_data: dict) -> dict:
         """Save a conversation"""
-        conversation = {
-            'id': len(self.storage['conversations']) + 1,
-            'timestamp': datetime.now().isoformat(),
-            **conversation_data
-        }
-        self.storage['conversations'].append(conversation)
+        # Vectorized before taking the lock so concurrent writers don't queue behind it
+        vector = self.semantic_index.encode(self._conversation_text(conversation_data))
+        with self._lock:
+            conversation = {
+                'id': len(self.storage['conversations']) + 1,
+                'timestamp': datetime.now().isoformat(),
+                **conversation_data
+            }
+            self._apply_save_conversation(conversation, vector)
+            seq = self._log('save_conversation', conversation)
+            self._changed('conversation', conversation)
+        self._wait_durable(seq)
         return conversation
     
-    def get_conversations(self, limit: int = 50, offset: int = 0) -> List[dict]:
-        """Get conversations with pagination"""
+    def _apply_save_conversation(self, conversation: dict, vector=None):
+        self._append_record('conversations', conversation, ConversationRecord.from_dict(conversation))
+        self.quality.add(conversation)
+        self.semantic_index.add(len(self.storage['conversations']) - 1, self._conversation_text(conversation), vector)
+    
+    @staticmethod
+    def _conversation_text(conversation: dict) -> str:
+        return f"{conversation.get('client_message', '')}\n{conversation.get('ai_reply', '')}"
+    
+    def get_quality(self, since: float = None, provider: str = None, version: int = None,
+                    by: str = None, review_limit: int = 20) -> dict:
+        """Sentiment, confidence and review-queue view (see QualityViews.query)"""
+        with self._lock:
+            return self.quality.query(since, provider, version, by, review_limit)
+    
+    def _sync_semantic_index(self):
+        """Bring the semantic index in line with the loaded conversations"""
+        self.semantic_index.sync([self._conversation_text(c) for c in self.storage['conversations']])
+    
+    def get_conversations(self, limit: int = 50, offset: int = 0,
+                          user_id: str = None, contact_id: str = None) -> List[dict]:
+        """Get conversations with pagination, optionally only a user's and/or contact's"""
         conversations = self.storage['conversations']
-        return conversations[offset:offset + limit]
+        rows = self._partition('conversations', user_id, contact_id)
+        if rows is None:
+            page = conversations[offset:offset + limit]
+        else:
+            page = [conversations[row] for row in rows[offset:offset + limit]]
+        return [record.to_dict() for record in page]
+    
+    def get_conversations_encoded(self, limit: int = 50, offset: int = 0,
+                                  user_id: str = None, contact_id: str = None) -> List[bytes]:
+        """Same page as get_conversations, as encoded JSON records (the same to_dict() shape)"""
+        return [fast_json.dumps(conversation) for conversation in self.get_conversations(limit, offset, user_id, contact_id)]
+    
+    def count_conversations(self, user_id: str = None, contact_id: str = None) -> int:
+        rows = self._partition('conversations', user_id, contact_id)
+        return len(self.storage['conversations']) if rows is None else len(rows)
     
-    def search_conversations(self, query: str) -> List[dict]:
+    def search_conversations(self, query: str, user_id: str = None, contact_id: str = None) -> List[dict]:
         """Search conversations by text"""
         query_lower = query.lower()
+        conversations = self.storage['conversations']
+        rows = self._partition('conversations', user_id, contact_id)
+        candidates = conversations if rows is None else (conversations[row] for row in rows)
         return [
-            conv for conv in self.storage['conversations']
-            if query_lower in conv.get('client_message', '').lower()
-            or query_lower in conv.get('ai_reply', '').lower()
+            conv.to_dict() for conv in candidates
+            if query_lower in conv.client_message.lower()
+            or query_lower in conv.ai_reply.lower()
+        ]
+    
+    def search_conversations_semantic(self, query: str, k: int = 20,
+                                      user_id: str = None, contact_id: str = None) -> List[dict]:
+        """Top-k conversations by cosine similarity to the query, best first, with a score"""
+        conversations = self.storage['conversations']
+        rows = self._partition('conversations', user_id, contact_id)
+        if rows == []:
+            return []
+        return [
+            {**conversations[row].to_dict(), 'score': score}
+            for row, score in self.semantic_index.search(query, k, rows=rows)
         ]
     
     # NEW: Performance Metrics Methods
@@ -101,34 +382,56 @@ class DatabaseService:
             'timestamp': datetime.now().isoformat(),
             **metric_data
         }
+        with self._lock:
+            self._apply_log_performance(metric)
+            seq = self._log('log_performance', metric)
+            self._changed('metric', metric)
+        self._wait_durable(seq)
+    
+    def _apply_log_performance(self, metric: dict):
         self.storage['performance_metrics'].append(metric)
+        version = metric.get('prompt_version')
+        if version == self.storage['version']:
+            stats = self._version_stats(version)
+        else:
+            stats = self.storage['version_stats'].get(version)
+        if stats is not None:
+            stats['replies'] += 1
+            stats['total_response_time'] += metric.get('response_time', 0)
     
     def get_performance_metrics(self, limit: int = 100) -> List[dict]:
         """Get recent performance metrics"""
-        return self.storage['performance_metrics'][-limit:]
+        with self._lock:
+            return self.storage['performance_metrics'].tail(limit)
     
     def get_performance_summary(self) -> dict:
         """Get performance summary statistics"""
         metrics = self.storage['performance_metrics']
         
-        if not metrics:
+        if not len(metrics):
             return {
                 'total_requests': 0,
                 'avg_response_time': 0,
+                'avg_queue_wait': 0,
                 'total_tokens': 0,
                 'avg_tokens_per_request': 0,
                 'total_cost': 0
             }
         
-        total_requests = len(metrics)
-        avg_response_time = sum(m.get('response_time', 0) for m in metrics) / total_requests
-        total_tokens = sum(m.get('tokens_used', 0) for m in metrics)
-        total_cost = sum(m.get('estimated_cost', 0) for m in metrics)
+        # Running column totals, so this doesn't walk every metric
+        with self._lock:
+            total_requests = len(metrics)
+            totals = dict(metrics.totals)
+        avg_response_time = totals['response_time'] / total_requests
+        avg_queue_wait = totals['queue_wait'] / total_requests
+        total_tokens = totals['tokens_used']
+        total_cost = totals['estimated_cost']
         
         return {
             'total_requests': total_requests,
             'avg_response_time': round(avg_response_time, 3),
-            'total_tokens': total_tokens,
+            'avg_queue_wait': round(avg_queue_wait, 3),
+            'total_tokens': round(total_tokens, 1),
             'avg_tokens_per_request': round(total_tokens / total_requests, 0),
             'total_cost': round(total_cost, 4)
         }
@@ -136,19 +439,33 @@ class DatabaseService:
     # NEW: Document Storage Methods
     def save_document(self, document_data: dict) -> dict:
         """Save uploaded document metadata"""
-        doc = {
-            'id': len(self.storage['documents']) + 1,
-            'timestamp': datetime.now().isoformat(),
-            **document_data
-        }
-        self.storage['documents'].append(doc)
+        with self._lock:
+            doc = {
+                'id': len(self.storage['documents']) + 1,
+                'timestamp': datetime.now().isoformat(),
+                **document_data
+            }
+            self._apply_save_document(doc)
+            seq = self._log('save_document', doc)
+        self._wait_durable(seq)
         return doc
     
-    def get_documents(self, user_id: str = None) -> List[dict]:
-        """Get documents, optionally filtered by user"""
-        if user_id:
-            return [d for d in self.storage['documents'] if d.get('user_id') == user_id]
-        return self.storage['documents']
+    def _apply_save_document(self, doc: dict):
+        self._append_record('documents', doc)
+    
+    def get_documents(self, user_id: str = None, contact_id: str = None) -> List[dict]:
+        """Get documents, optionally filtered by user and/or contact"""
+        rows = self._partition('documents', user_id, contact_id)
+        if rows is None:
+            return self.storage['documents']
+        return [self.storage['documents'][row] for row in rows]
+    
+    def get_documents_encoded(self, user_id: str = None, contact_id: str = None) -> List[bytes]:
+        """Same as get_documents, as pre-encoded JSON records"""
+        rows = self._partition('documents', user_id, contact_id)
+        if rows is None:
+            return self._encoded['documents']
+        return [self._encoded['documents'][row] for row in rows]
 
 # Singleton instance
 db_service = DatabaseService()
\ No newline at end of file
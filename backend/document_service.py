@@ -3,13 +3,19 @@ Document Upload and Analysis Service
 """
 import os
 import io
+import sys
 import base64
 from typing import Dict
-from PIL import Image
-import PyPDF2
 
 class DocumentService:
     
+    def get_component_status(self) -> Dict:
+        """Which document libraries have been loaded (they are imported on first use)"""
+        return {
+            'pypdf2': {'loaded': 'PyPDF2' in sys.modules},
+            'pillow': {'loaded': 'PIL.Image' in sys.modules}
+        }
+    
     def analyze_document(self, file_content: bytes, filename: str, file_type: str) -> Dict:
         """Analyze uploaded document"""
         
@@ -26,6 +32,8 @@ class DocumentService:
     def _analyze_pdf(self, file_content: bytes) -> Dict:
         """Extract and analyze PDF content"""
         try:
+            import PyPDF2
+            
             pdf_file = io.BytesIO(file_content)
             pdf_reader = PyPDF2.PdfReader(pdf_file)
             
@@ -54,6 +62,8 @@ class DocumentService:
     def _analyze_image(self, file_content: bytes) -> Dict:
         """Analyze image"""
         try:
+            from PIL import Image
+            
             image = Image.open(io.BytesIO(file_content))
             
             return {
@@ -0,0 +1,157 @@
+"""
+Server-sent events: pushes new conversations, metrics and prompt versions to dashboards
+"""
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from typing import Dict, Iterator, Optional, Set
+
+from database_service import db_service
+from fast_json import dumps
+
+KINDS = ('conversation', 'metric', 'prompt_version')
+
+
+class EventBus:
+    """
+    Recent database changes as ready-to-send SSE frames.
+
+    Each frame is encoded once when the change happens, however many
+    dashboards are connected. Event ids are ``<epoch>-<change_seq>``; a client
+    resuming from an id of another process (a restart) or older than the
+    buffer gets a ``reset`` event and should refetch its snapshot.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.heartbeat = float(os.getenv('EVENT_HEARTBEAT_SECONDS', 15))
+        self.retry_ms = int(os.getenv('EVENT_RETRY_MS', 3000))
+        self.coalesce = float(os.getenv('EVENT_COALESCE_MS', 50)) / 1000
+        self._cond = threading.Condition()
+        # (seq, kind, frame) oldest first
+        self._frames: deque = deque(maxlen=int(os.getenv('EVENT_BUFFER', 1000)))
+        self._last_seq = db_service.change_seq
+        self._stats = {'connections': 0, 'active': 0, 'events_published': 0,
+                       'events_sent': 0, 'bytes_sent': 0, 'compressed_bytes_sent': 0, 'resets': 0}
+
+    def cursor(self, seq: int) -> str:
+        return f'{self.epoch}-{seq}'
+
+    def parse_cursor(self, cursor: Optional[str]) -> Optional[int]:
+        """change_seq a client has seen, or None when it can't resume from here"""
+        if not cursor:
+            return None
+        epoch, _, seq = cursor.rpartition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, seq: int, kind: str, data: Dict):
+        """db_service listener; runs with the database lock held"""
+        frame = b'id: %s\nevent: %s\ndata: %s\n\n' % (self.cursor(seq).encode(), kind.encode(), dumps(data))
+        with self._cond:
+            self._frames.append((seq, kind, frame))
+            self._last_seq = seq
+            self._stats['events_published'] += 1
+            self._cond.notify_all()
+
+    def _after(self, seq: int):
+        """Buffered frames newer than seq, or None if some of them were already dropped"""
+        if seq >= self._last_seq:
+            return []
+        if not self._frames or self._frames[0][0] > seq + 1:
+            return None
+        return [entry for entry in self._frames if entry[0] > seq]
+
+    def _reset_frame(self) -> bytes:
+        self._stats['resets'] += 1
+        return b'id: %s\nevent: reset\ndata: {}\n\n' % self.cursor(self._last_seq).encode()
+
+    def stream(self, cursor: Optional[str] = None, kinds: Optional[Set[str]] = None) -> Iterator[bytes]:
+        """
+        SSE body for one client: events after cursor, then live ones as they happen.
+
+        With no cursor the stream starts at the present; pair it with a
+        snapshot read through db_service.read_consistent to miss nothing.
+        """
+        with self._cond:
+            seq = self.parse_cursor(cursor)
+            self._stats['connections'] += 1
+            self._stats['active'] += 1
+            head = [b'retry: %d\n\n' % self.retry_ms]
+            if seq is None or seq > self._last_seq:
+                if cursor:
+                    head.append(self._reset_frame())
+                seq = self._last_seq
+
+        try:
+            for chunk in head:
+                yield self._sent(chunk, events=int(chunk.startswith(b'id:')))
+            while True:
+                with self._cond:
+                    pending = self._after(seq)
+                    if pending == []:
+                        self._cond.wait(self.heartbeat)
+                        pending = self._after(seq)
+                        woken = bool(pending)
+                    else:
+                        woken = False
+                if woken and self.coalesce:
+                    # One reply logs a metric and a conversation back to back; send them together
+                    time.sleep(self.coalesce)
+                with self._cond:
+                    if woken:
+                        pending = self._after(seq)
+                    if pending is None:
+                        frames = [self._reset_frame()]
+                        seq = self._last_seq
+                    elif pending:
+                        frames = [frame for _, kind, frame in pending if not kinds or kind in kinds]
+                        seq = pending[-1][0]
+                    else:
+                        frames = None
+
+                if frames is None:
+                    # Heartbeat keeps proxies from closing an idle connection
+                    yield self._sent(b': ping\n\n')
+                elif frames:
+                    # Everything that piled up goes out in one write
+                    yield self._sent(b''.join(frames), events=len(frames))
+        finally:
+            with self._cond:
+                self._stats['active'] -= 1
+
+    def _sent(self, chunk: bytes, events: int = 0) -> bytes:
+        with self._cond:
+            self._stats['bytes_sent'] += len(chunk)
+            self._stats['events_sent'] += events
+        return chunk
+
+    def gzip(self, chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+        """
+        One gzip stream per connection, flushed after every chunk.
+
+        Events repeat the same keys and phrasing, so later ones compress
+        against earlier ones far better than each would alone.
+        """
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        try:
+            for chunk in chunks:
+                out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                with self._cond:
+                    self._stats['compressed_bytes_sent'] += len(out)
+                yield out
+        finally:
+            chunks.close()
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            return {**self._stats, 'epoch': self.epoch, 'buffered': len(self._frames), 'last_seq': self._last_seq}
+
+
+# Singleton
+event_bus = EventBus()
+db_service.add_listener(event_bus.publish)
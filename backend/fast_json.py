@@ -0,0 +1,63 @@
+"""
+Fast JSON encoding for API responses (orjson when installed, stdlib json otherwise)
+"""
+import json
+from typing import Any, Dict, List
+
+from flask import Response
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is in requirements.txt; fall back if it is missing
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode obj as compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by dumps()/loads() above"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return json_bytes_response(dumps(obj))
+
+
+def encode_object(fields: Dict[str, Any], fragments: Dict[str, List[bytes]]) -> bytes:
+    """
+    Encode a JSON object whose list members are already-encoded records.
+
+    fields are encoded normally; each fragments entry becomes an array built
+    by joining the pre-encoded bytes, so cached records are never re-serialized.
+    """
+    pieces = []
+    for key, value in fields.items():
+        pieces += [b',', dumps(key), b':', dumps(value)]
+    for key, items in fragments.items():
+        # The big arrays get copied by this join and the final one, but never re-encoded
+        pieces += [b',', dumps(key), b':[', b','.join(items), b']']
+    # Swap the leading comma for the opening brace
+    pieces[:1] = [b'{']
+    pieces.append(b'}')
+    return b''.join(pieces)
+
+
+def json_bytes_response(body: bytes, status: int = 200) -> Response:
+    return Response(body, status=status, mimetype='application/json')
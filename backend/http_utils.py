@@ -0,0 +1,91 @@
+"""
+Conditional GET, field projections and compression for API responses
+"""
+import gzip
+import uuid
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # Brotli is in requirements.txt; gzip is used if it is missing
+    brotli = None
+
+# Versions restart at 1 when an unjournaled process restarts, so tags from
+# an earlier process must never match
+_EPOCH = uuid.uuid4().hex[:8]
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """`fields=a,b` query parameter as a list of names, or None for everything"""
+    if not value:
+        return None
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    return fields or None
+
+
+def project(record: Dict, fields: Optional[Iterable[str]]) -> Dict:
+    """Keep only the requested keys of record"""
+    if fields is None:
+        return record
+    return {key: record[key] for key in fields if key in record}
+
+
+def version_etag(resource: str, version: int, *variant: Any) -> str:
+    """
+    Entity tag for a response that only changes when the prompt version does.
+
+    variant holds whatever else shapes the body (projection, query arguments).
+    """
+    tag = f'{resource}-{_EPOCH}-{version}'
+    if variant:
+        tag += '-' + format(zlib.crc32(repr(variant).encode('utf-8')), '08x')
+    return tag
+
+
+def not_modified(request, etag: str) -> Optional[Response]:
+    """304 response if the client already holds etag, else None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    return with_etag(response, etag)
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    # Weak, since compression changes the bytes but not the meaning; no-cache
+    # makes browsers revalidate every poll instead of reusing stale bodies
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def compress_response(response: Response, request, min_bytes: int = 1024,
+                      gzip_level: int = 6, brotli_quality: int = 5) -> Response:
+    """Brotli or gzip encode a large text response when the client accepts it"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    encoding = request.accept_encodings.best_match(offered)
+    if encoding == 'br':
+        body = brotli.compress(data, quality=brotli_quality)
+    elif encoding == 'gzip':
+        body = gzip.compress(data, compresslevel=gzip_level, mtime=0)
+    else:
+        return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,342 @@
+"""
+Durable background queue for /improve-ai jobs
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from ai_service import ai_service
+from admission_control import AdmissionRejected
+from shadow_service import shadow_service
+
+TERMINAL = ('completed', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE NOT NULL,
+    dedup_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    predicted_reply TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    predicted_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, created_at);
+"""
+
+
+def _percentiles(values) -> Dict:
+    if not values:
+        return {'p50': 0, 'p95': 0}
+    ordered = sorted(values)
+    return {
+        'p50': round(ordered[len(ordered) // 2], 3),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3)
+    }
+
+
+class ImprovementQueue:
+    """
+    Improvement jobs are stored in SQLite and worked in two stages.
+
+    Predicting the chatbot's reply runs ahead on a pool of workers, against
+    the prompt version live at the time. The editor call and the prompt
+    update depend on earlier jobs: each edit starts from the current prompt,
+    so one applier thread runs them strictly in submission order and no edit
+    is lost to a concurrent one. A prediction made from an older version than
+    the one live when its job is applied is redone inside the apply stage, so
+    the editor always compares against the prompt it edits. Other prompt
+    writers (/test-training, /improve-ai-manual, candidate promotion) go
+    through apply_exclusive, which holds the applier's lock. Jobs left
+    unfinished by a restart are picked up again (an edit interrupted mid-apply
+    may be applied twice). Identical examples submitted within the dedup
+    window return the existing job instead of queueing another.
+    """
+
+    def __init__(self):
+        self.ai = ai_service
+        self.path = os.getenv('IMPROVE_QUEUE_PATH', os.path.join(os.path.dirname(__file__), 'improve_queue.db'))
+        self.dedup_window = float(os.getenv('IMPROVE_DEDUP_WINDOW', 86400))
+        self.max_attempts = int(os.getenv('IMPROVE_MAX_ATTEMPTS', 3))
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+        self._cond = threading.Condition()
+        # Held for every read-edit-write of the live prompt, by the applier and by apply_exclusive callers
+        self._apply_lock = threading.Lock()
+        # Unfinished jobs by seq: {'id', 'status', 'payload', 'predicted_reply', 'predicted_at', 'predicted_version'}
+        self._active: Dict[int, Dict] = {}
+        self._stats = {'submitted': 0, 'deduplicated': 0, 'completed': 0, 'failed': 0, 'repredicted': 0}
+        self._queue_waits: deque = deque(maxlen=500)
+        self._apply_waits: deque = deque(maxlen=500)
+        self._totals: deque = deque(maxlen=500)
+
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv('IMPROVE_WORKERS', 2)),
+            thread_name_prefix='improve-predict'
+        )
+        self._recover()
+        threading.Thread(target=self._apply_loop, name='improve-apply', daemon=True).start()
+
+    # -------------------------
+    # Storage
+    # -------------------------
+    def _update(self, job_id: str, **columns):
+        assignments = ', '.join(f'{name} = ?' for name in columns)
+        with self._cond:
+            self._conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*columns.values(), job_id))
+            self._conn.commit()
+
+    def _recover(self):
+        rows = self._conn.execute(
+            "SELECT seq, id, status, payload, predicted_reply, predicted_at FROM jobs "
+            "WHERE status NOT IN ('completed', 'failed') ORDER BY seq"
+        ).fetchall()
+        for seq, job_id, status, payload, predicted_reply, predicted_at in rows:
+            # Work that was in flight is redone from the last finished stage (the
+            # prediction's prompt version isn't stored, so the applier re-checks it)
+            status = 'predicted' if predicted_reply is not None else 'queued'
+            self._active[seq] = {
+                'id': job_id, 'status': status, 'payload': json.loads(payload),
+                'predicted_reply': predicted_reply, 'predicted_at': predicted_at, 'predicted_version': None
+            }
+            self._update(job_id, status=status)
+            if status == 'queued':
+                self._pool.submit(self._predict, seq)
+
+    @staticmethod
+    def dedup_key(client_sequence, chat_history: List[Dict], consultant_reply,
+                  provider: Optional[str] = None, shadow: bool = False) -> str:
+        # Provider and shadow are part of the key: a shadow run must not collapse into a live edit
+        canonical = json.dumps(
+            [client_sequence, chat_history, consultant_reply, provider, bool(shadow)],
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+    # -------------------------
+    # Submission
+    # -------------------------
+    def submit(self, client_sequence, chat_history: List[Dict], consultant_reply,
+               provider: Optional[str] = None, shadow: bool = False) -> Tuple[Dict, bool]:
+        """Queue an improvement example; returns (job status, deduplicated)"""
+        key = self.dedup_key(client_sequence, chat_history, consultant_reply, provider, shadow)
+        payload = {
+            'client_sequence': client_sequence,
+            'chat_history': chat_history,
+            'consultant_reply': consultant_reply,
+            'provider': provider,
+            'shadow': shadow
+        }
+        now = time.time()
+
+        with self._cond:
+            existing = self._conn.execute(
+                "SELECT id FROM jobs WHERE dedup_key = ? AND status != 'failed' AND created_at >= ? "
+                "ORDER BY seq DESC LIMIT 1",
+                (key, now - self.dedup_window)
+            ).fetchone()
+            if existing:
+                self._stats['deduplicated'] += 1
+                job_id = existing[0]
+            else:
+                job_id = uuid.uuid4().hex
+                seq = self._conn.execute(
+                    'INSERT INTO jobs (id, dedup_key, status, payload, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (job_id, key, 'queued', json.dumps(payload, ensure_ascii=False), now)
+                ).lastrowid
+                self._conn.commit()
+                self._active[seq] = {
+                    'id': job_id, 'status': 'queued', 'payload': payload,
+                    'predicted_reply': None, 'predicted_at': None, 'predicted_version': None
+                }
+                self._stats['submitted'] += 1
+
+        if not existing:
+            self._pool.submit(self._predict, seq)
+        return self.get(job_id), bool(existing)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._cond:
+            row = self._conn.execute(
+                'SELECT seq, id, status, predicted_reply, result, error, created_at, started_at, finished_at '
+                'FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            seq, job_id, status, predicted_reply, result, error, created_at, started_at, finished_at = row
+            ahead = sum(1 for other in self._active if other < seq)
+
+        job = {
+            'jobId': job_id,
+            'status': status,
+            'createdAt': created_at,
+            'startedAt': started_at,
+            'finishedAt': finished_at
+        }
+        if status not in TERMINAL:
+            job['position'] = ahead
+        if predicted_reply is not None:
+            job['predictedReply'] = predicted_reply
+        if result:
+            job['result'] = json.loads(result)
+        if error:
+            job['error'] = error
+        return job
+
+    def apply_exclusive(self, fn):
+        """Run fn (something that reads and rewrites the live prompt) between queued edits, never during one"""
+        with self._apply_lock:
+            return fn()
+
+    # -------------------------
+    # Workers
+    # -------------------------
+    def _with_retries(self, fn):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return fn()
+            except AdmissionRejected as e:
+                if attempt == self.max_attempts:
+                    raise
+                time.sleep(e.retry_after)
+
+    def _predict(self, seq: int):
+        with self._cond:
+            job = self._active[seq]
+            job['status'] = 'predicting'
+        payload = job['payload']
+        started = time.time()
+        self._update(job['id'], status='predicting', started_at=started)
+
+        try:
+            reply, version = self._with_retries(lambda: self._predict_reply(payload))
+        except Exception as e:
+            self._finish(seq, 'failed', error=str(e))
+            return
+
+        predicted_at = time.time()
+        self._update(job['id'], status='predicted', predicted_reply=reply, predicted_at=predicted_at)
+        with self._cond:
+            job.update(status='predicted', predicted_reply=reply, predicted_at=predicted_at, predicted_version=version)
+            self._queue_waits.append(started - self._created_at(job['id']))
+            self._cond.notify_all()
+
+    def _predict_reply(self, payload: Dict) -> Tuple[str, int]:
+        """The chatbot's reply to the example under the live prompt; returns (reply, prompt version)"""
+        chatbot_prompt, version = self.ai.db.get_prompt_version()
+        result = self.ai.generate_reply(
+            payload['client_sequence'], payload['chat_history'], payload['provider'],
+            include_analytics=False, priority='improvement',
+            chatbot_prompt=chatbot_prompt, prompt_version=version
+        )
+        return result['reply'], version
+
+    def _apply(self, job: Dict) -> Dict:
+        """Editor call and prompt update for one job; run with the apply lock held"""
+        payload = job['payload']
+        predicted_reply = job['predicted_reply']
+        _, version = self.ai.db.get_prompt_version()
+        if job['predicted_version'] != version:
+            # Earlier jobs changed the prompt since this prediction: predict again from the live one
+            predicted_reply, _ = self._predict_reply(payload)
+            self._update(job['id'], predicted_reply=predicted_reply)
+            with self._cond:
+                job.update(predicted_reply=predicted_reply, predicted_version=version)
+                self._stats['repredicted'] += 1
+        return self.ai.improve_prompt_auto(
+            payload['client_sequence'], payload['chat_history'], payload['consultant_reply'],
+            payload['provider'], apply=not payload['shadow'], predicted_reply=predicted_reply
+        )
+
+    def _created_at(self, job_id: str) -> float:
+        return self._conn.execute('SELECT created_at FROM jobs WHERE id = ?', (job_id,)).fetchone()[0]
+
+    def _apply_loop(self):
+        while True:
+            with self._cond:
+                # Only the oldest unfinished job may touch the prompt
+                while not self._active or self._active[min(self._active)]['status'] != 'predicted':
+                    self._cond.wait()
+                seq = min(self._active)
+                job = self._active[seq]
+                job['status'] = 'applying'
+                self._apply_waits.append(time.time() - job['predicted_at'])
+            self._update(job['id'], status='applying')
+
+            # Anything that goes wrong fails this job; the applier must keep running for the rest
+            try:
+                result = self._with_retries(lambda: self.apply_exclusive(lambda: self._apply(job)))
+                summary = {
+                    'predictedReply': result['predicted_reply'],
+                    'actualReply': result['actual_reply'],
+                    'analysis': result['analysis'],
+                    'changesMade': result['changes_made'],
+                    'updatedPrompt': result['updated_prompt'],
+                    'oldPrompt': result['old_prompt'],
+                    'newPrompt': result['new_prompt'],
+                    'similarity': result['similarity']['similarity'],
+                    'editorSkipped': result['editor_skipped']
+                }
+                if job['payload']['shadow'] and not result['editor_skipped']:
+                    summary['candidate'] = shadow_service.add_candidate(result['updated_prompt'], result['metadata'])
+                self._finish(seq, 'completed', result=summary)
+            except Exception as e:
+                self._fail(seq, e)
+
+    def _fail(self, seq: int, error: Exception):
+        try:
+            self._finish(seq, 'failed', error=str(error))
+        except Exception as e:
+            # Couldn't even record the failure: drop the job so later ones aren't blocked behind it
+            print(f"Improvement job {seq} dropped: {e}")
+            with self._cond:
+                self._active.pop(seq, None)
+                self._cond.notify_all()
+
+    def _finish(self, seq: int, status: str, result: Dict = None, error: str = None):
+        finished = time.time()
+        with self._cond:
+            job = self._active[seq]
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?',
+                (status, json.dumps(result, ensure_ascii=False) if result else None, error, finished, job['id'])
+            )
+            self._conn.commit()
+            del self._active[seq]
+            self._stats[status] += 1
+            self._totals.append(finished - self._created_at(job['id']))
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            by_status: Dict[str, int] = {}
+            for job in self._active.values():
+                by_status[job['status']] = by_status.get(job['status'], 0) + 1
+            return {
+                **self._stats,
+                'depth': len(self._active),
+                'by_status': by_status,
+                'queue_wait_seconds': _percentiles(self._queue_waits),
+                'apply_wait_seconds': _percentiles(self._apply_waits),
+                'total_seconds': _percentiles(self._totals)
+            }
+
+
+# Singleton
+improvement_queue = ImprovementQueue()
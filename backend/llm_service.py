@@ -1,53 +1,414 @@
 import os
+import sys
 import json
-from typing import Dict, Optional
-from anthropic import Anthropic
-from openai import OpenAI
-import google.generativeai as genai
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from request_coalescer import RequestCoalescer
+from provider_router import AllProvidersFailed, ProviderRouter
+from stub_provider import StubProvider
+from cassette_store import CassetteStore
+from admission_control import AdmissionController, AdmissionRejected, estimate_tokens
+from model_routing import ModelRouting
+from provider_clients import (
+    RETRY_STATUSES, ConnectionStats, ProviderCallError, RetryPolicy, parse_retry_after, pooled_http_client
+)
 
 class LLMService:
+    # Default model for each provider (tasks can route elsewhere, see model_routing)
+    MODELS = {
+        'openai': 'gpt-4o-mini',
+        'google': 'gemini-1.5-flash'
+    }
+    
+    # Reserved for the completion when charging the token bucket
+    OUTPUT_TOKEN_ESTIMATE = 300
+    
     def __init__(self):
-        self.anthropic_client = None
-        self.openai_client = None
-        self.google_configured = False
+        # Provider SDKs are imported on first use so workers start fast and
+        # only load the SDK of the provider they actually talk to
+        self._openai_client = None
+        self._genai = None
+        self._client_lock = threading.Lock()
+        self._google_models: Dict[tuple, object] = {}
         
-        # Initialize available clients
-        if os.getenv('ANTHROPIC_API_KEY'):
-            self.anthropic_client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+        # One long-lived keepalive pool per provider; explicit timeouts; retries here, not in the SDKs
+        self.connect_timeout = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))
+        self.read_timeout = float(os.getenv('LLM_READ_TIMEOUT', 60))
+        self.pool_max_connections = int(os.getenv('LLM_POOL_MAX_CONNECTIONS', 20))
+        self.pool_keepalive = int(os.getenv('LLM_POOL_KEEPALIVE', 10))
+        self.keepalive_seconds = float(os.getenv('LLM_KEEPALIVE_SECONDS', 60))
+        self.openai_connections = ConnectionStats()
+        self.retry = RetryPolicy(
+            max_retries=int(os.getenv('LLM_MAX_RETRIES', 2)),
+            base_delay=float(os.getenv('LLM_RETRY_BASE_DELAY', 0.5)),
+            max_delay=float(os.getenv('LLM_RETRY_MAX_DELAY', 8)),
+            max_retry_after=float(os.getenv('LLM_RETRY_AFTER_MAX', 30))
+        )
+        self._prewarm = {}
         
+        # Registered provider calls: name -> fn(prompt, user_message, model=, temperature=, max_tokens=)
+        self.models = dict(self.MODELS)
+        self.providers: Dict[str, Callable[..., Dict]] = {}
         if os.getenv('OPENAI_API_KEY'):
-            self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        
+            self.providers['openai'] = self._call_openai
         if os.getenv('GOOGLE_API_KEY'):
-            genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-            self.google_configured = True
+            self.providers['google'] = self._call_google
+        if os.getenv('LLM_STUB', 'false').lower() == 'true' or os.getenv('DEFAULT_LLM_PROVIDER') == 'stub':
+            self.register_provider('stub', StubProvider(
+                latency_ms=float(os.getenv('STUB_LLM_LATENCY_MS', 0)),
+                reply_words=int(os.getenv('STUB_LLM_REPLY_WORDS', 40))
+            ), model='stub')
+        
+        self.router = ProviderRouter(
+            window=int(os.getenv('LLM_ROUTER_WINDOW', 200)),
+            failover=os.getenv('LLM_FAILOVER', 'true').lower() != 'false',
+            hedging=os.getenv('LLM_HEDGING', 'true').lower() != 'false',
+            hedge_min_samples=int(os.getenv('LLM_HEDGE_MIN_SAMPLES', 20))
+        )
+        
+        # Concurrent identical requests share a single provider call
+        self.coalescing_enabled = os.getenv('LLM_COALESCE', 'true').lower() != 'false'
+        self.coalescer = RequestCoalescer(timeout=float(os.getenv('LLM_COALESCE_TIMEOUT', 60)))
+        
+        # Record/replay: 'record' saves every response, 'replay' serves them offline
+        self.cassette_mode = os.getenv('LLM_CASSETTE_MODE') or None
+        self.cassette = None
+        self.replay_speed = float(os.getenv('LLM_REPLAY_SPEED', 1.0))
+        if self.cassette_mode not in (None, 'record', 'replay'):
+            raise ValueError(f"Unknown LLM_CASSETTE_MODE {self.cassette_mode}")
+        if self.cassette_mode:
+            self.cassette = CassetteStore(os.getenv(
+                'LLM_CASSETTE_PATH', os.path.join(os.path.dirname(__file__), 'cassettes')
+            ))
+        
+        # Provider, model, temperature and max_tokens per task, reloadable at runtime
+        self.routing = ModelRouting(
+            os.getenv('LLM_ROUTING_PATH', os.path.join(os.path.dirname(__file__), 'model_routing.json')),
+            self.models,
+            check_interval=float(os.getenv('LLM_ROUTING_CHECK_SECONDS', 5))
+        )
+        
+        # Priority scheduling and per-provider rate limits
+        self.admission = AdmissionController()
+        self._local = threading.local()
+        
+        # Open provider connections before the first request needs them (not when replaying cassettes)
+        if os.getenv('LLM_PREWARM', 'true').lower() != 'false' and self.cassette_mode != 'replay':
+            self.prewarm(int(os.getenv('LLM_PREWARM_CONNECTIONS', 2)))
     
-    def generate_response(self, prompt: str, user_message: str, provider: Optional[str] = None) -> Dict:
-        """Generate a response using specified LLM provider"""
+    def generate_response(
+        self,
+        prompt: str,
+        user_message: str,
+        provider: Optional[str] = None,
+        priority: str = 'interactive',
+        task: str = 'chat_reply'
+    ) -> Dict:
+        """
+        Generate a response using specified LLM provider.
+        task picks the routing entry (model, temperature, max_tokens, and the provider when none is given).
+        """
         if provider is None:
-            provider = os.getenv('DEFAULT_LLM_PROVIDER', 'openai')
+            provider = self.default_provider(task)
+        
+        self._local.queue_wait = 0.0
+        self._local.provider = provider
+        call = lambda: self._admit_and_dispatch(provider, priority, prompt, user_message, task)
         
+        if not self.coalescing_enabled:
+            response, served = call()
+        else:
+            model = self.routing.settings(task, provider)['model']
+            key = RequestCoalescer.make_key(provider, model, prompt, user_message)
+            # Coalesced callers share the leader's (response, provider that served it)
+            response, served = self.coalescer.run(key, call)
+        self._local.provider = served
+        return response
+    
+    def default_provider(self, task: str = 'chat_reply') -> str:
+        """Provider for a task when the caller doesn't name one"""
+        return self.routing.provider_for(task) or os.getenv('DEFAULT_LLM_PROVIDER', 'openai')
+    
+    def last_queue_wait(self) -> float:
+        """Queue wait of the calling thread's most recent request (seconds)"""
+        return getattr(self._local, 'queue_wait', 0.0)
+    
+    def last_provider(self) -> Optional[str]:
+        """Provider that answered the calling thread's most recent request (failover and hedging may differ)"""
+        return getattr(self._local, 'provider', None)
+    
+    def _admit_and_dispatch(self, provider: str, priority: str, prompt: str, user_message: str,
+                            task: str) -> Tuple[Dict, str]:
+        """
+        Send the request (accounted to its task); each provider call waits for that provider's admission.
+        Returns (response, provider that served it).
+        """
+        admission = {
+            'priority': priority,
+            'tokens': estimate_tokens(prompt, user_message) + self.OUTPUT_TOKEN_ESTIMATE,
+            'queue_wait': 0.0,
+            'attempts': 0,
+            'rejected': None,
+            # id(response) -> provider that produced it (failover and hedging may answer from another)
+            'served_by': {}
+        }
+        start = time.time()
         try:
-            if provider == 'openai' and self.openai_client:
-                return self._call_openai(prompt, user_message)
-            elif provider == 'google' and self.google_configured:
-                return self._call_google(prompt, user_message)
-            else:
-                raise ValueError(f"Provider {provider} not available")
+            response = self._dispatch(provider, prompt, user_message, task, admission)
         except Exception as e:
-            raise Exception(f"LLM API call failed: {str(e)}")
+            self.routing.record(task, self.routing.settings(task, provider)['model'], time.time() - start, False,
+                                prompt, user_message)
+            # Shed by every provider tried: report the rejection (429), not a provider failure
+            rejected = admission['rejected']
+            if rejected is not None and rejected[0] == admission['attempts'] and not isinstance(e, AdmissionRejected):
+                raise rejected[1] from e
+            raise
+        finally:
+            self._local.queue_wait = admission['queue_wait']
+        served = admission['served_by'].get(id(response), provider)
+        self.routing.record(task, self.routing.settings(task, served)['model'], time.time() - start, True,
+                            prompt, user_message, response)
+        return response, served
     
-    def _call_openai(self, prompt: str, user_message: str) -> Dict:
-        """Call OpenAI API"""
-        response = self.openai_client.chat.completions.create(
-            model="gpt-4o-mini",
+    def register_provider(self, name: str, call: Callable[..., Dict], model: str = ''):
+        """
+        Register a provider call (also used to plug in local fake providers).
+        It is called as call(prompt, user_message, model=..., temperature=..., max_tokens=...).
+        """
+        self.providers[name] = call
+        self.models[name] = model
+    
+    def _dispatch(self, provider: str, prompt: str, user_message: str, task: str = 'chat_reply',
+                  admission: Optional[Dict] = None) -> Dict:
+        """Send the request, recording or replaying it when a cassette is active (replays skip admission)"""
+        if self.cassette_mode is None:
+            return self._route(provider, prompt, user_message, task, admission)
+        
+        key = CassetteStore.make_key(provider, self.routing.settings(task, provider)['model'], prompt, user_message)
+        
+        if self.cassette_mode == 'replay':
+            recorded = self.cassette.lookup(key)
+            if recorded is None:
+                raise ValueError(f"No recorded response for this {provider} request in {self.cassette.directory}")
+            response, latency = recorded
+            if self.replay_speed > 0:
+                time.sleep(latency / self.replay_speed)
+            return response
+        
+        start = time.time()
+        response = self._route(provider, prompt, user_message, task, admission)
+        self.cassette.record(key, response, time.time() - start)
+        return response
+    
+    def _route(self, provider: str, prompt: str, user_message: str, task: str = 'chat_reply',
+               admission: Optional[Dict] = None) -> Dict:
+        """
+        Send the request through the router (failover and hedging), with the task's settings per provider.
+        Every provider call is admitted against that provider's own queue and rate limits first.
+        """
+        def admitted(name: str, call: Callable[..., Dict], settings: Dict) -> Dict:
+            if admission is not None:
+                admission['attempts'] += 1
+                try:
+                    admission['queue_wait'] += self.admission.acquire(name, admission['priority'], admission['tokens'])
+                except AdmissionRejected as e:
+                    rejected = admission['rejected']
+                    admission['rejected'] = ((rejected[0] if rejected else 0) + 1, e)
+                    raise
+            try:
+                response = call(prompt, user_message, **settings)
+            except ProviderCallError:
+                raise
+            except Exception as e:
+                # Registered providers (stub, fakes) may raise anything; it is still a provider failure
+                raise ProviderCallError(name, str(e)) from e
+            if admission is not None:
+                admission['served_by'][id(response)] = name
+            return response
+        
+        calls = {
+            name: (lambda name=name, call=call, settings=self.routing.settings(task, name): admitted(name, call, settings))
+            for name, call in self.providers.items()
+        }
+        try:
+            return self.router.execute(provider, calls)
+        except AllProvidersFailed as e:
+            if all(isinstance(error, AdmissionRejected) for _, error in e.errors):
+                raise
+            raise ProviderCallError(provider, str(e), attempts=len(e.errors)) from e
+    
+    def get_metrics(self) -> Dict:
+        """Get LLM request metrics"""
+        return {
+            'coalescing': self.coalescer.get_stats(),
+            'routing': self.router.get_stats(),
+            'admission': self.admission.get_stats(),
+            'tasks': self.routing.get_stats(),
+            'clients': self.get_client_stats()
+        }
+    
+    def get_client_stats(self) -> Dict:
+        """Connection reuse, timeouts, retries and prewarming of the provider clients"""
+        return {
+            'timeouts': {'connect': self.connect_timeout, 'read': self.read_timeout},
+            'pool': {
+                'max_connections': self.pool_max_connections,
+                'max_keepalive': self.pool_keepalive,
+                'keepalive_seconds': self.keepalive_seconds
+            },
+            'openai': self.openai_connections.get_stats(),
+            'google': {'models_cached': len(self._google_models)},
+            'retries': self.retry.get_stats(),
+            'prewarm': dict(self._prewarm)
+        }
+    
+    @property
+    def openai_client(self):
+        """OpenAI client on a long-lived keepalive pool, created (and the SDK imported) on first use"""
+        if self._openai_client is None:
+            with self._client_lock:
+                if self._openai_client is None:
+                    from openai import OpenAI
+                    self._openai_client = OpenAI(
+                        api_key=os.getenv('OPENAI_API_KEY'),
+                        base_url=os.getenv('OPENAI_BASE_URL') or None,
+                        max_retries=0,
+                        http_client=pooled_http_client(
+                            self.openai_connections,
+                            connect_timeout=self.connect_timeout,
+                            read_timeout=self.read_timeout,
+                            max_connections=self.pool_max_connections,
+                            max_keepalive=self.pool_keepalive,
+                            keepalive_expiry=self.keepalive_seconds
+                        )
+                    )
+        return self._openai_client
+    
+    @property
+    def genai(self):
+        """Configured google.generativeai module, imported on first use"""
+        if self._genai is None:
+            with self._client_lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+                    options = {}
+                    if os.getenv('GOOGLE_API_ENDPOINT'):
+                        options['client_options'] = {'api_endpoint': os.getenv('GOOGLE_API_ENDPOINT')}
+                    genai.configure(
+                        api_key=os.getenv('GOOGLE_API_KEY'),
+                        transport=os.getenv('GOOGLE_API_TRANSPORT') or None,
+                        **options
+                    )
+                    self._genai = genai
+        return self._genai
+    
+    def google_model(self, model: str, temperature: Optional[float], max_tokens: Optional[int]):
+        """GenerativeModel per (model, temperature, max_tokens), built once; they share the SDK's client"""
+        key = (model, temperature, max_tokens)
+        cached = self._google_models.get(key)
+        if cached is None:
+            generation_config = {}
+            if temperature is not None:
+                generation_config['temperature'] = temperature
+            if max_tokens:
+                generation_config['max_output_tokens'] = max_tokens
+            cached = self._google_models.setdefault(
+                key, self.genai.GenerativeModel(model, generation_config=generation_config or None)
+            )
+        return cached
+    
+    def prewarm(self, connections: int = 2):
+        """
+        Open connections to the configured providers in the background: a few
+        concurrent cheap calls (OpenAI model list, Gemini token count) leave
+        TLS-established sockets in the keepalive pools.
+        """
+        warmers = {
+            'openai': lambda: self.openai_client.models.list(),
+            'google': lambda: self.google_model(self.MODELS['google'], None, None).count_tokens(
+                'ping', request_options={'timeout': self.read_timeout}
+            )
+        }
+        
+        def warm(name: str):
+            start = time.time()
+            threads = [threading.Thread(target=warmers[name]) for _ in range(max(1, connections))]
+            try:
+                warmers[name]()  # the first call also imports the SDK and builds the client
+                for thread in threads[1:]:
+                    thread.start()
+                for thread in threads[1:]:
+                    thread.join()
+                self._prewarm[name] = {'ok': True, 'seconds': round(time.time() - start, 3)}
+            except Exception as e:
+                self._prewarm[name] = {'ok': False, 'error': str(e)}
+                print(f"Prewarming {name} failed: {e}")
+        
+        for name in warmers:
+            if name in self.providers:
+                self._prewarm[name] = {'ok': None}
+                threading.Thread(target=warm, args=(name,), name=f'prewarm-{name}', daemon=True).start()
+    
+    @staticmethod
+    def _classify_openai(error: Exception):
+        """(retryable, status, retry_after) for an OpenAI SDK error"""
+        import openai
+        if isinstance(error, openai.APIStatusError):
+            status = error.status_code
+            return status in RETRY_STATUSES, status, parse_retry_after(error.response.headers)
+        return isinstance(error, openai.APIConnectionError), None, None
+    
+    @staticmethod
+    def _classify_google(error: Exception):
+        """(retryable, status, retry_after) for a Gemini SDK error (gRPC or REST transport)"""
+        from google.api_core import exceptions
+        import requests
+        if isinstance(error, exceptions.GoogleAPICallError):
+            status = error.code if isinstance(error.code, int) else None
+            response = getattr(error, 'response', None)
+            return status in RETRY_STATUSES, status, parse_retry_after(getattr(response, 'headers', None))
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return True, None, None
+        return isinstance(error, (ConnectionError, TimeoutError)), None, None
+    
+    def get_component_status(self) -> Dict:
+        """Which provider SDKs are configured and which have been loaded"""
+        return {
+            'openai': {
+                'configured': 'openai' in self.providers,
+                'loaded': self._openai_client is not None
+            },
+            'google': {
+                'configured': 'google' in self.providers,
+                'loaded': self._genai is not None
+            },
+            'anthropic': {
+                'configured': False,
+                'loaded': 'anthropic' in sys.modules
+            }
+        }
+    
+    def _call_openai(
+        self,
+        prompt: str,
+        user_message: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> Dict:
+        """Call OpenAI API (transient failures retried with backoff)"""
+        options = {'max_tokens': max_tokens} if max_tokens else {}
+        response = self.retry.run('openai', lambda: self.openai_client.chat.completions.create(
+            model=model or self.MODELS['openai'],
             messages=[
                 {"role": "system", "content": prompt},
                 {"role": "user", "content": user_message}
             ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
+            temperature=0.7 if temperature is None else temperature,
+            response_format={"type": "json_object"},
+            **options
+        ), self._classify_openai)
         
         reply_text = response.choices[0].message.content
         
@@ -56,12 +417,22 @@ class LLMService:
         except json.JSONDecodeError:
             return {"reply": reply_text}
     
-    def _call_google(self, prompt: str, user_message: str) -> Dict:
-        """Call Google Gemini API"""
-        model = genai.GenerativeModel('gemini-1.5-flash')
+    def _call_google(
+        self,
+        prompt: str,
+        user_message: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> Dict:
+        """Call Google Gemini API (transient failures retried with backoff)"""
+        model = self.google_model(model or self.MODELS['google'], temperature, max_tokens)
         full_prompt = f"{prompt}\n\nUser message:\n{user_message}\n\nRespond in JSON format."
         
-        response = model.generate_content(full_prompt)
+        # The SDK's own retry is off so every retry goes through (and is counted by) self.retry
+        response = self.retry.run('google', lambda: model.generate_content(
+            full_prompt, request_options={'timeout': self.read_timeout, 'retry': None}
+        ), self._classify_google)
         reply_text = response.text
         
         # Clean up markdown
@@ -0,0 +1,256 @@
+"""
+Per-task model routing: provider, model, temperature and token cap for each kind of LLM call
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from admission_control import estimate_tokens
+from provider_router import ProviderStats
+
+# Kinds of LLM call AIService makes
+TASKS = ('chat_reply', 'confidence', 'editor', 'manual_edit', 'compaction')
+
+ROUTE_FIELDS = ('provider', 'model', 'models', 'temperature', 'max_tokens')
+
+# USD per million (input, output) tokens; extend or override with "prices" in the routing file
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gemini-1.5-flash-8b': (0.0375, 0.15),
+    'gemini-1.5-flash': (0.075, 0.30),
+    'gemini-1.5-pro': (1.25, 5.00),
+    'stub': (0.0, 0.0)
+}
+
+
+def validate_config(config: Dict, providers: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Check a routing table; returns it normalized to {'tasks': ..., 'prices': ...}.
+    With providers given, routes may only name those providers.
+    """
+    if not isinstance(config, dict):
+        raise ValueError('Routing config must be an object')
+    unknown = set(config) - {'tasks', 'prices'}
+    if unknown:
+        raise ValueError(f"Unknown routing keys: {sorted(unknown)}")
+
+    tasks = {}
+    for task, route in (config.get('tasks') or {}).items():
+        if task not in TASKS:
+            raise ValueError(f"Unknown task {task} (expected one of {', '.join(TASKS)})")
+        if not isinstance(route, dict):
+            raise ValueError(f"Route for {task} must be an object")
+        unknown = set(route) - set(ROUTE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields for {task}: {sorted(unknown)}")
+        for name in ('provider', 'model'):
+            if route.get(name) is not None and not isinstance(route[name], str):
+                raise ValueError(f"{task}.{name} must be a string")
+        if route.get('model') and not route.get('provider'):
+            raise ValueError(f"{task}.model needs a provider (or use models: {{provider: model}})")
+        models = route.get('models') or {}
+        if not isinstance(models, dict) or not all(isinstance(m, str) for m in models.values()):
+            raise ValueError(f"{task}.models must map providers to model names")
+        if providers is not None:
+            known = set(providers)
+            for name in ([route['provider']] if route.get('provider') else []) + list(models):
+                if name not in known:
+                    raise ValueError(f"Unknown provider {name} for {task} (expected one of {', '.join(sorted(known))})")
+        temperature = route.get('temperature')
+        if temperature is not None and not (isinstance(temperature, (int, float)) and 0 <= temperature <= 2):
+            raise ValueError(f"{task}.temperature must be between 0 and 2")
+        max_tokens = route.get('max_tokens')
+        if max_tokens is not None and not (isinstance(max_tokens, int) and max_tokens > 0):
+            raise ValueError(f"{task}.max_tokens must be a positive integer")
+        tasks[task] = {name: route.get(name) for name in ROUTE_FIELDS if route.get(name) is not None}
+
+    prices = {}
+    for model, price in (config.get('prices') or {}).items():
+        if not (isinstance(price, (list, tuple)) and len(price) == 2
+                and all(isinstance(p, (int, float)) and p >= 0 for p in price)):
+            raise ValueError(f"Price for {model} must be [input, output] USD per million tokens")
+        prices[model] = [float(p) for p in price]
+
+    return {'tasks': tasks, 'prices': prices}
+
+
+class TaskStats(ProviderStats):
+    """Rolling latency/errors for one task plus token and cost totals"""
+
+    def __init__(self, window: int):
+        super().__init__(window)
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.unpriced_calls = 0
+        self.models: Dict[str, int] = {}
+
+
+class ModelRouting:
+    """
+    Routing table read from a JSON file (``LLM_ROUTING_PATH``).
+
+    Each task may name a provider (used when the caller doesn't ask for one),
+    the model to use on that provider (``model``) or on any provider
+    (``models``), a temperature and a max_tokens cap; unset fields fall back
+    to the provider defaults. Routes may only name providers in
+    default_models (every provider the service knows). The file is re-read when its mtime changes
+    (checked at most every ``LLM_ROUTING_CHECK_SECONDS``) or on reload(); a
+    table that fails validation is reported and the previous one kept.
+    """
+
+    def __init__(self, path: str, default_models: Dict[str, str], check_interval: float = 5.0, window: int = 200):
+        self.path = path
+        self.default_models = default_models
+        self.check_interval = check_interval
+        self.window = window
+        self._lock = threading.Lock()
+        self._config = {'tasks': {}, 'prices': {}}
+        self._mtime = None
+        self._checked_at = 0.0
+        self.version = 0
+        self.loaded_at = None
+        self.last_error = None
+        self._stats: Dict[str, TaskStats] = {task: TaskStats(window) for task in TASKS}
+        try:
+            self.reload()
+        except ValueError as e:
+            print(f"Model routing defaults in use: {e}")
+
+    # -------------------------
+    # Table
+    # -------------------------
+    def reload(self) -> Dict:
+        """Re-read the routing file; raises ValueError (keeping the current table) if it is invalid"""
+        with self._lock:
+            self._checked_at = time.time()
+            if not os.path.exists(self.path):
+                self._apply({'tasks': {}, 'prices': {}}, None)
+                return self.get_config()
+            mtime = os.stat(self.path).st_mtime_ns
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    config = validate_config(json.load(f), self.default_models)
+            except (OSError, ValueError) as e:
+                self.last_error = f"{self.path}: {e}"
+                self._mtime = mtime  # don't retry the same broken file on every call
+                raise ValueError(self.last_error)
+            self._apply(config, mtime)
+        return self.get_config()
+
+    def update(self, config: Dict) -> Dict:
+        """Validate, write and apply a new table"""
+        config = validate_config(config, self.default_models)
+        with self._lock:
+            tmp = f'{self.path}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=2)
+            os.replace(tmp, self.path)
+            self._apply(config, os.stat(self.path).st_mtime_ns)
+        return self.get_config()
+
+    def _apply(self, config: Dict, mtime: Optional[int]):
+        self._config = config
+        self._mtime = mtime
+        self.version += 1
+        self.loaded_at = time.time()
+        self.last_error = None
+
+    def _maybe_reload(self):
+        """Pick up edits to the routing file (cheap: one stat every check_interval)"""
+        if time.time() - self._checked_at < self.check_interval:
+            return
+        self._checked_at = time.time()
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            try:
+                self.reload()
+            except ValueError as e:
+                print(f"Model routing not reloaded: {e}")
+
+    def route(self, task: str) -> Dict:
+        self._maybe_reload()
+        return self._config['tasks'].get(task, {})
+
+    def provider_for(self, task: str) -> Optional[str]:
+        """Provider the table assigns to a task (None: use the default provider)"""
+        return self.route(task).get('provider')
+
+    def settings(self, task: str, provider: str) -> Dict:
+        """Model, temperature and max_tokens for a task's call to one provider"""
+        route = self.route(task)
+        model = (route.get('models') or {}).get(provider)
+        if model is None and route.get('provider') == provider:
+            model = route.get('model')
+        return {
+            'model': model or self.default_models.get(provider, ''),
+            'temperature': route.get('temperature'),
+            'max_tokens': route.get('max_tokens')
+        }
+
+    # -------------------------
+    # Accounting
+    # -------------------------
+    def price(self, model: str) -> Optional[tuple]:
+        return self._config['prices'].get(model) or MODEL_PRICES.get(model)
+
+    def record(self, task: str, model: str, latency: float, ok: bool,
+               prompt: str = '', user_message: str = '', response=None):
+        """Account one provider call of a task (tokens are the ~4 chars/token estimate)"""
+        input_tokens = estimate_tokens(prompt, user_message)
+        output_tokens = estimate_tokens(json.dumps(response, ensure_ascii=False)) if ok and response is not None else 0
+        price = self.price(model)
+        with self._lock:
+            stats = self._stats.get(task)
+            if stats is None:
+                stats = self._stats[task] = TaskStats(self.window)
+            stats.record(latency, ok)
+            stats.models[model] = stats.models.get(model, 0) + 1
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            if price is None:
+                stats.unpriced_calls += 1
+            else:
+                stats.cost += (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000
+
+    def get_config(self) -> Dict:
+        return {
+            'path': self.path,
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'last_error': self.last_error,
+            'tasks': {task: dict(self._config['tasks'].get(task, {})) for task in TASKS},
+            'prices': dict(self._config['prices'])
+        }
+
+    def get_stats(self) -> Dict:
+        """Per-task calls, latency, tokens and estimated cost"""
+        with self._lock:
+            tasks = {}
+            for task, stats in self._stats.items():
+                if not stats.total_calls:
+                    continue
+                p50 = stats.percentile(50)
+                p95 = stats.percentile(95)
+                calls = stats.total_calls
+                tasks[task] = {
+                    'calls': calls,
+                    'errors': stats.total_errors,
+                    'p50_latency': round(p50, 3) if p50 is not None else None,
+                    'p95_latency': round(p95, 3) if p95 is not None else None,
+                    'input_tokens': stats.input_tokens,
+                    'output_tokens': stats.output_tokens,
+                    'estimated_cost': round(stats.cost, 6),
+                    'cost_per_call': round(stats.cost / calls, 8),
+                    'unpriced_calls': stats.unpriced_calls,
+                    'models': dict(stats.models)
+                }
+        return {'version': self.version, 'tasks': tasks}
@@ -0,0 +1,321 @@
+"""
+On-demand sampling CPU profiler and tracemalloc snapshots for the live backend
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+def frame_label(code) -> str:
+    """One flamegraph frame: qualified function name and file"""
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+
+def collapse(frame, root: str, limit: int) -> str:
+    """Stack of frame as 'root;outermost;...;innermost' (the collapsed format flamegraph tools read)"""
+    labels = []
+    while frame is not None and len(labels) < limit:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(root)
+    return ';'.join(reversed(labels))
+
+
+def allocation_sites(stats, limit: int) -> List[Dict]:
+    return [
+        {
+            'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            'size_kib': round(stat.size / 1024, 1),
+            'count': stat.count
+        }
+        for stat in stats[:limit]
+    ]
+
+
+def allocation_diff(stats, limit: int) -> List[Dict]:
+    return [
+        {
+            'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            'size_diff_kib': round(stat.size_diff / 1024, 1),
+            'size_kib': round(stat.size / 1024, 1),
+            'count_diff': stat.count_diff
+        }
+        for stat in stats[:limit]
+    ]
+
+
+class ProfileSession:
+    """One profiling run: stacks sampled from request threads until its stop condition"""
+
+    def __init__(self, requests: Optional[int], seconds: float, interval: float,
+                 memory: bool, all_threads: bool, path_prefix: Optional[str]):
+        self.id = uuid.uuid4().hex[:12]
+        self.requests_target = requests
+        self.seconds = seconds
+        self.interval = interval
+        self.memory = memory
+        self.all_threads = all_threads
+        self.path_prefix = path_prefix
+        self.status = 'running'
+        self.started_at = time.time()
+        self.finished_at = None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.requests_profiled = 0
+        self.sampler_cpu = 0.0
+        self.memory_baseline = None
+        self.memory_result = None
+        self.done = threading.Event()
+
+    def mode(self) -> str:
+        return 'requests' if self.requests_target else 'window'
+
+    def summary(self, top: int = 20) -> Dict:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        stacks = dict(self.stacks)  # the sampler may be adding to it
+        for stack, count in stacks.items():
+            frames = stack.split(';')[1:]  # drop the request / thread root
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'id': self.id,
+            'mode': self.mode(),
+            'status': self.status,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed_seconds': round(elapsed, 3),
+            'interval_ms': round(self.interval * 1000, 3),
+            'requests_target': self.requests_target,
+            'requests_profiled': self.requests_profiled,
+            'samples': self.samples,
+            'stack_samples': sum(stacks.values()),
+            'sampler_cpu_seconds': round(self.sampler_cpu, 4),
+            'top_self': [{'frame': f, 'samples': n} for f, n in own.most_common(top)],
+            'top_total': [{'frame': f, 'samples': n} for f, n in total.most_common(top)],
+            'memory': self.memory_result
+        }
+
+    def collapsed(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in Counter(dict(self.stacks)).most_common())
+
+
+class Profiler:
+    """
+    Samples the Python stacks of threads handling requests.
+
+    A session runs for the next N requests or for a time window (capped by
+    max_seconds either way). A sampler thread reads every interval what the
+    registered request threads are executing (sys._current_frames); stacks
+    are rooted at "METHOD /route" so a flamegraph splits by endpoint. With
+    memory=True, tracemalloc runs for the session and the result holds the top
+    allocation sites and the growth since the session started.
+
+    While no session runs, request hooks only test `active`, and tracemalloc
+    is off unless snapshots were asked for.
+    """
+
+    def __init__(self, interval_ms: float = 5.0, max_seconds: float = 300.0,
+                 stack_limit: int = 64, memory_frames: int = 1):
+        self.interval = interval_ms / 1000.0
+        self.max_seconds = max_seconds
+        self.stack_limit = stack_limit
+        self.memory_frames = memory_frames
+        self.active = False
+        self._lock = threading.Lock()
+        self._session: Optional[ProfileSession] = None
+        self._last: Optional[ProfileSession] = None
+        self._request_threads: Dict[int, str] = {}
+        # Ad-hoc tracemalloc snapshots (take_snapshot)
+        self._snapshots: List[tuple] = []
+        self._tracing_for_snapshots = False
+
+    # -------------------------
+    # Sessions
+    # -------------------------
+    def start(self, requests: Optional[int] = None, seconds: Optional[float] = None,
+              interval_ms: Optional[float] = None, memory: bool = False,
+              all_threads: bool = False, path_prefix: Optional[str] = None) -> Dict:
+        """Start profiling the next `requests` requests, or for `seconds`; raises RuntimeError if one is running"""
+        if requests is not None and requests < 1:
+            raise ValueError('requests must be at least 1')
+        if not requests and not seconds:
+            raise ValueError('Give requests (profile the next N requests) or seconds (a time window)')
+        seconds = min(float(seconds or self.max_seconds), self.max_seconds)
+        if seconds <= 0:
+            raise ValueError('seconds must be positive')
+        interval = (interval_ms / 1000.0) if interval_ms else self.interval
+        if interval < 0.0005:
+            raise ValueError('interval_ms must be at least 0.5')
+
+        with self._lock:
+            if self._session is not None:
+                raise RuntimeError(f"Profile {self._session.id} is already running")
+            session = ProfileSession(requests, seconds, interval, memory, all_threads, path_prefix)
+            if memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(self.memory_frames)
+                session.memory_baseline = tracemalloc.take_snapshot()
+            self._session = session
+            self.active = True
+        threading.Thread(target=self._sample_loop, args=(session,), name='profiler', daemon=True).start()
+        return session.summary()
+
+    def stop(self) -> Optional[Dict]:
+        """End the running session early; returns its result (None if nothing was running)"""
+        with self._lock:
+            session = self._session
+        if session is None:
+            return None
+        self._finish(session, 'stopped')
+        return session.summary()
+
+    def result(self, session_id: Optional[str] = None) -> Optional[ProfileSession]:
+        """The running session, else the last finished one (optionally by id)"""
+        with self._lock:
+            for session in (self._session, self._last):
+                if session is not None and (session_id is None or session.id == session_id):
+                    return session
+        return None
+
+    def _finish(self, session: ProfileSession, status: str):
+        with self._lock:
+            if self._session is not session:
+                return
+            self._session = None
+            self.active = False
+            self._request_threads.clear()
+        session.done.set()
+        session.status = status
+        session.finished_at = time.time()
+        if session.memory and not tracemalloc.is_tracing():
+            session.memory_result = {'error': 'tracemalloc was stopped while the profile ran'}
+        elif session.memory:
+            snapshot = tracemalloc.take_snapshot()
+            session.memory_result = {
+                'traced_kib': round(tracemalloc.get_traced_memory()[0] / 1024, 1),
+                'peak_kib': round(tracemalloc.get_traced_memory()[1] / 1024, 1),
+                'top': allocation_sites(snapshot.statistics('lineno'), 20),
+                'diff': allocation_diff(snapshot.compare_to(session.memory_baseline, 'lineno'), 20)
+            }
+            session.memory_baseline = None
+            if not self._tracing_for_snapshots:
+                tracemalloc.stop()
+        with self._lock:
+            self._last = session
+
+    def _sample_loop(self, session: ProfileSession):
+        me = threading.get_ident()
+        cpu_start = time.thread_time()
+        deadline = session.started_at + session.seconds
+        while not session.done.wait(session.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                roots = dict(self._request_threads)
+            if session.all_threads:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident in frames:
+                    roots.setdefault(ident, f'thread {names.get(ident, ident)}')
+            for ident, root in roots.items():
+                frame = frames.get(ident)
+                if frame is not None and ident != me:
+                    session.stacks[collapse(frame, root, self.stack_limit)] += 1
+            del frames
+            session.samples += 1
+            session.sampler_cpu = time.thread_time() - cpu_start
+            if time.time() >= deadline:
+                self._finish(session, 'completed')
+
+    # -------------------------
+    # Request hooks (only called while a session is active)
+    # -------------------------
+    def request_started(self, method: str, path: str, rule: Optional[str]):
+        session = self._session
+        if session is None or (session.path_prefix and not path.startswith(session.path_prefix)):
+            return
+        with self._lock:
+            self._request_threads[threading.get_ident()] = f'{method} {rule or path}'
+
+    def request_finished(self):
+        session = self._session
+        if session is None:
+            return
+        with self._lock:
+            if self._request_threads.pop(threading.get_ident(), None) is None:
+                return
+            session.requests_profiled += 1
+            done = session.requests_target and session.requests_profiled >= session.requests_target
+        if done:
+            self._finish(session, 'completed')
+
+    # -------------------------
+    # Memory snapshots
+    # -------------------------
+    def take_snapshot(self, limit: int = 20, keep: int = 5) -> Dict:
+        """
+        Snapshot traced allocations: top sites, and the diff against the previous
+        snapshot. The first call starts tracemalloc, so it only sees later allocations.
+        """
+        with self._lock:
+            started = False
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.memory_frames)
+                started = True
+            self._tracing_for_snapshots = True
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__)
+            ])
+            previous = self._snapshots[-1] if self._snapshots else None
+            taken_at = time.time()
+            self._snapshots = (self._snapshots + [(taken_at, snapshot)])[-keep:]
+        current, peak = tracemalloc.get_traced_memory()
+        result = {
+            'taken_at': taken_at,
+            'tracing_started': started,
+            'snapshots_kept': len(self._snapshots),
+            'traced_kib': round(current / 1024, 1),
+            'peak_kib': round(peak / 1024, 1),
+            'top': allocation_sites(snapshot.statistics('lineno'), limit)
+        }
+        if previous is not None:
+            result['since'] = previous[0]
+            result['diff'] = allocation_diff(snapshot.compare_to(previous[1], 'lineno'), limit)
+        return result
+
+    def stop_tracing(self) -> bool:
+        """Drop kept snapshots and stop tracemalloc (unless a memory profile still needs it)"""
+        with self._lock:
+            was_tracing = self._tracing_for_snapshots
+            self._snapshots = []
+            self._tracing_for_snapshots = False
+            session = self._session
+            if not (session is not None and session.memory):
+                tracemalloc.stop()
+        return was_tracing
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            running = self._session
+            last = self._last
+        return {
+            'active': self.active,
+            'running': running.id if running else None,
+            'last': last.id if last else None,
+            'tracemalloc': tracemalloc.is_tracing(),
+            'snapshots_kept': len(self._snapshots)
+        }
+
+
+# Singleton
+profiler = Profiler(
+    interval_ms=float(os.getenv('PROFILE_INTERVAL_MS', 5)),
+    max_seconds=float(os.getenv('PROFILE_MAX_SECONDS', 300))
+)
@@ -0,0 +1,121 @@
+"""
+Rule-level deduplication for chatbot prompts that grow with every improvement
+"""
+import re
+from typing import Dict, List, Tuple
+
+# Leading bullet or list number, e.g. "- ", "* ", "3. ", "2) "
+_BULLET = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+')
+_WORD = re.compile(r"[a-z0-9']+")
+_NUMBER = re.compile(r'\d[\d,]*(?:\.\d+)?')
+# Words that flip or fix a rule's polarity ("Never mention ..." vs "Always mention ...")
+_POLARITY = frozenset({'not', 'no', 'never', 'always', 'cannot', 'nothing', 'none', 'avoid'})
+
+
+def _normalize(line: str) -> str:
+    text = _BULLET.sub('', line).lower().replace('\u2019', "'")
+    return ' '.join(_WORD.findall(text))
+
+
+def _numbers(line: str) -> frozenset:
+    """Numbers stated in a rule (fees, durations, amounts), with thousands separators dropped"""
+    return frozenset(number.replace(',', '') for number in _NUMBER.findall(_BULLET.sub('', line)))
+
+
+def _is_polar(word: str) -> bool:
+    return word in _POLARITY or word.endswith("n't")
+
+
+def _polarity(words: set) -> frozenset:
+    """A rule's negation and polarity words (don't, isn't, ... all count as 'not')"""
+    return frozenset('not' if word.endswith("n't") else word for word in words if _is_polar(word))
+
+
+def _is_rule(line: str) -> bool:
+    """Bullets and sentence-length lines are rules; blank lines and headings are structure"""
+    stripped = line.strip()
+    if not stripped or stripped.startswith('#') or stripped.endswith(':'):
+        return False
+    return bool(_BULLET.match(line)) or len(stripped.split()) >= 4
+
+
+def _similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def compact_rules(prompt: str, similarity: float = 0.8) -> Tuple[str, Dict]:
+    """
+    Drop repeated rules and merge near-duplicates.
+
+    Rules whose word sets overlap by at least `similarity` (Jaccard) are
+    merged into the more detailed wording (the later rule on a tie, since it is
+    the newer edit), kept at the first rule's position. Rules stating different
+    numbers are never merged, so a corrected fee or duration isn't lost. Rules
+    that differ in negation or polarity ("Always ..." / "Never ...", "Do not
+    ..." / "Do ...") are never merged either: if their remaining words overlap
+    as much, they conflict and only the later rule is kept, whatever its length.
+    Headings and section structure are left alone; runs of blank lines are
+    collapsed. Returns (compacted prompt, {'duplicates', 'merged', 'conflicts'}).
+    """
+    lines: List[str] = prompt.splitlines()
+    kept: List[str] = []
+    # For each kept rule: (index in kept, normalized text, word set, numbers)
+    rules: List[Tuple[int, str, set, frozenset]] = []
+    duplicates = merged = conflicts = 0
+
+    for line in lines:
+        if not line.strip():
+            if kept and not kept[-1].strip():
+                continue
+            kept.append(line)
+            continue
+        if not _is_rule(line):
+            kept.append(line)
+            continue
+
+        normalized = _normalize(line)
+        words = set(normalized.split())
+        numbers = _numbers(line)
+        match = None
+        for index, (position, other, other_words, other_numbers) in enumerate(rules):
+            if normalized == other:
+                match = ('duplicate', index, position)
+                break
+            if numbers != other_numbers:
+                continue
+            if _polarity(words) != _polarity(other_words):
+                content = {word for word in words if not _is_polar(word)}
+                other_content = {word for word in other_words if not _is_polar(word)}
+                if len(content) >= 4 and len(other_content) >= 4 and _similarity(content, other_content) >= similarity:
+                    match = ('conflict', index, position)
+                    break
+                continue
+            if len(words) >= 4 and len(other_words) >= 4 and _similarity(words, other_words) >= similarity:
+                match = ('merge', index, position)
+                break
+
+        if match is None:
+            rules.append((len(kept), normalized, words, numbers))
+            kept.append(line)
+        elif match[0] == 'duplicate':
+            duplicates += 1
+        elif match[0] == 'conflict':
+            # The later rule is the newer edit (a correction): it replaces the earlier one
+            conflicts += 1
+            _, index, position = match
+            kept[position] = line
+            rules[index] = (position, normalized, words, numbers)
+        else:
+            merged += 1
+            _, index, position = match
+            if len(normalized) >= len(rules[index][1]):
+                kept[position] = line
+                rules[index] = (position, normalized, words, numbers)
+
+    return '\n'.join(kept).strip('\n') + ('\n' if prompt.endswith('\n') else ''), {
+        'duplicates': duplicates,
+        'merged': merged,
+        'conflicts': conflicts
+    }
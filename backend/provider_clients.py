@@ -0,0 +1,183 @@
+"""
+Long-lived provider HTTP clients: pooled connections, timeouts and retries with backoff
+"""
+import email.utils
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# Statuses worth another attempt: timeouts, conflicts, rate limits and server errors
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class ProviderCallError(Exception):
+    """A provider call that failed for good (after any retries)"""
+
+    def __init__(self, provider: str, message: str, status: Optional[int] = None,
+                 retryable: bool = False, attempts: int = 1, retry_after: Optional[float] = None,
+                 timed_out: bool = False):
+        self.provider = provider
+        self.status = status
+        self.retryable = retryable
+        self.attempts = attempts
+        self.retry_after = retry_after
+        self.timed_out = timed_out
+        details = provider
+        if status:
+            details += f', HTTP {status}'
+        elif timed_out:
+            details += ', timed out'
+        if attempts > 1:
+            details += f', {attempts} attempts'
+        super().__init__(f"LLM API call failed ({details}): {message}")
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait from retry-after-ms / Retry-After (seconds or an HTTP date)"""
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        moment = email.utils.parsedate_to_datetime(value)
+        return max(0.0, moment.timestamp() - time.time()) if moment else None
+
+
+class RetryPolicy:
+    """
+    Retries transient failures with jittered exponential backoff.
+
+    The n-th retry waits a random time between half and all of
+    min(max_delay, base_delay * 2**n). A server's Retry-After replaces the
+    backoff; one longer than max_retry_after fails the call at once rather
+    than holding the request.
+    """
+
+    def __init__(self, max_retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0,
+                 max_retry_after: float = 30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict] = {}
+
+    def delay(self, retry: int, retry_after: Optional[float]) -> Optional[float]:
+        """Seconds before retry number `retry` (0-based), or None to give up"""
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+        backoff = min(self.max_delay, self.base_delay * 2 ** retry)
+        return random.uniform(backoff / 2, backoff)
+
+    def _count(self, provider: str, key: str, amount: float = 1):
+        with self._lock:
+            stats = self._stats.setdefault(provider, {
+                'calls': 0, 'retries': 0, 'retry_after_honoured': 0, 'recovered': 0,
+                'failed': 0, 'backoff_seconds': 0.0, 'errors': {}
+            })
+            stats[key] += amount
+
+    def _count_error(self, provider: str, kind: str):
+        with self._lock:
+            errors = self._stats[provider]['errors']
+            errors[kind] = errors.get(kind, 0) + 1
+
+    def run(self, provider: str, call: Callable[[], Dict],
+            classify: Callable[[Exception], Tuple[bool, Optional[int], Optional[float]]]) -> Dict:
+        """
+        Run call, retrying while classify(error) -> (retryable, status, retry_after) says so.
+        Failures are raised as ProviderCallError.
+        """
+        self._count(provider, 'calls')
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = call()
+            except Exception as e:
+                retryable, status, retry_after = classify(e)
+                self._count_error(provider, str(status) if status else type(e).__name__)
+                wait = self.delay(attempt - 1, retry_after) if retryable and attempt <= self.max_retries else None
+                if wait is None:
+                    self._count(provider, 'failed')
+                    # SDK and transport timeouts (APITimeoutError, ReadTimeout, ...) all carry it in their name
+                    timed_out = 'Timeout' in type(e).__name__
+                    raise ProviderCallError(provider, str(e), status, retryable, attempt, retry_after, timed_out) from e
+                self._count(provider, 'retries')
+                self._count(provider, 'backoff_seconds', wait)
+                if retry_after is not None:
+                    self._count(provider, 'retry_after_honoured')
+                time.sleep(wait)
+                continue
+            if attempt > 1:
+                self._count(provider, 'recovered')
+            return result
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                provider: {**stats, 'backoff_seconds': round(stats['backoff_seconds'], 3), 'errors': dict(stats['errors'])}
+                for provider, stats in self._stats.items()
+            }
+
+
+class ConnectionStats:
+    """Requests vs new connections on a pooled httpx client (via httpcore trace events)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.connect_seconds = 0.0
+        self._connect_started: Dict[int, float] = {}
+
+    def on_request(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions['trace'] = self._trace
+
+    def _trace(self, event: str, info: Dict):
+        if event == 'connection.connect_tcp.started':
+            self._connect_started[threading.get_ident()] = time.perf_counter()
+        elif event == 'connection.connect_tcp.complete':
+            started = self._connect_started.pop(threading.get_ident(), None)
+            with self._lock:
+                self.connections_opened += 1
+                if started is not None:
+                    self.connect_seconds += time.perf_counter() - started
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            reused = max(0, self.requests - self.connections_opened)
+            return {
+                'requests': self.requests,
+                'connections_opened': self.connections_opened,
+                'reused': reused,
+                'reuse_rate': round(reused / self.requests, 4) if self.requests else 0,
+                'connect_ms_total': round(self.connect_seconds * 1000, 1)
+            }
+
+
+def pooled_http_client(stats: ConnectionStats, connect_timeout: float, read_timeout: float,
+                       max_connections: int, max_keepalive: int, keepalive_expiry: float):
+    """httpx client with a bounded keepalive pool, explicit timeouts and connection accounting"""
+    import httpx
+    return httpx.Client(
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        ),
+        event_hooks={'request': [stats.on_request]}
+    )
@@ -0,0 +1,233 @@
+"""
+Latency-aware provider routing with failover and hedged requests
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class AllProvidersFailed(Exception):
+    """Every candidate provider failed; errors lists (provider, exception) in the order tried"""
+
+    def __init__(self, errors: List[Tuple[str, Exception]]):
+        self.errors = errors
+        super().__init__('; '.join(f"{name}: {e}" for name, e in errors))
+
+
+class ProviderStats:
+    """Rolling latency and error window for one provider"""
+
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.total_calls = 0
+        self.total_errors = 0
+        self.last_error_at = 0.0
+
+    def record(self, latency: float, ok: bool):
+        self.outcomes.append(ok)
+        self.total_calls += 1
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.total_errors += 1
+            self.last_error_at = time.time()
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class ProviderRouter:
+    """
+    Routes a request across registered providers.
+
+    The requested provider is tried first unless its recent error rate marks it
+    unhealthy (until it has gone a cooldown period without errors). Failures
+    fail over to the next provider. When a call runs past the provider's
+    observed p95, a hedged request is sent to the next candidate
+    (or the same provider if it is the only one) and the first success wins.
+    Python threads can't be interrupted, so the losing call is cancelled if it
+    hasn't started and otherwise left to finish with its result discarded.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        failover: bool = True,
+        hedging: bool = True,
+        hedge_min_samples: int = 20,
+        unhealthy_error_rate: float = 0.5,
+        unhealthy_cooldown: float = 30.0,
+        max_workers: int = 16
+    ):
+        self.window = window
+        self.failover = failover
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+        self.unhealthy_error_rate = unhealthy_error_rate
+        self.unhealthy_cooldown = unhealthy_cooldown
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-hedge')
+        self._lock = threading.Lock()
+        self._stats: Dict[str, ProviderStats] = {}
+        self._decisions = {
+            'primary': 0,
+            'rerouted_unhealthy': 0,
+            'failover': 0,
+            'hedges_sent': 0,
+            'hedge_wins': 0,
+            'hedges_cancelled': 0,
+            'hedges_abandoned': 0
+        }
+
+    def _provider_stats(self, provider: str) -> ProviderStats:
+        stats = self._stats.get(provider)
+        if stats is None:
+            stats = self._stats[provider] = ProviderStats(self.window)
+        return stats
+
+    def _count(self, decision: str, amount: int = 1):
+        with self._lock:
+            self._decisions[decision] += amount
+
+    def _is_healthy(self, provider: str) -> bool:
+        stats = self._stats.get(provider)
+        if stats is None or len(stats.outcomes) < self.hedge_min_samples:
+            return True
+        # After a quiet cooldown the provider gets traffic again so it can recover
+        if time.time() - stats.last_error_at > self.unhealthy_cooldown:
+            return True
+        return stats.error_rate() < self.unhealthy_error_rate
+
+    def rank(self, preferred: str, available: List[str]) -> List[str]:
+        """Order candidate providers for a request"""
+        with self._lock:
+            if not self.failover:
+                return [preferred] if preferred in available else []
+
+            others = [p for p in available if p != preferred]
+            # Faster providers first; providers without data keep their order
+            others.sort(key=lambda p: self._provider_stats(p).percentile(50) or 0)
+            candidates = ([preferred] if preferred in available else []) + others
+
+            healthy = [p for p in candidates if self._is_healthy(p)]
+            unhealthy = [p for p in candidates if not self._is_healthy(p)]
+            return healthy + unhealthy
+
+    def hedge_delay(self, provider: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None if there isn't enough data"""
+        if not self.hedging:
+            return None
+        with self._lock:
+            stats = self._stats.get(provider)
+            if stats is None or len(stats.latencies) < self.hedge_min_samples:
+                return None
+            return stats.percentile(95)
+
+    def _timed_call(self, provider: str, call: Callable[[], Dict]) -> Dict:
+        start = time.time()
+        try:
+            result = call()
+        except Exception:
+            with self._lock:
+                self._provider_stats(provider).record(time.time() - start, False)
+            raise
+        with self._lock:
+            self._provider_stats(provider).record(time.time() - start, True)
+        return result
+
+    def execute(self, preferred: str, providers: Dict[str, Callable[[], Dict]]) -> Dict:
+        """Run a request through the ranked providers and return the first success"""
+        candidates = self.rank(preferred, list(providers))
+        if not candidates:
+            raise ValueError(f"Provider {preferred} not available")
+
+        if candidates[0] == preferred:
+            self._count('primary')
+        else:
+            self._count('rerouted_unhealthy')
+
+        errors = []
+        while candidates:
+            primary = candidates.pop(0)
+            if errors:
+                self._count('failover')
+            try:
+                return self._attempt(primary, candidates, providers)
+            except Exception as e:
+                errors.append((primary, e))
+
+        # A lone failure keeps its type (and status) for the caller
+        if len(errors) == 1:
+            raise errors[0][1]
+        raise AllProvidersFailed(errors) from errors[-1][1]
+
+    def _attempt(self, primary: str, remaining: List[str], providers: Dict[str, Callable[[], Dict]]) -> Dict:
+        delay = self.hedge_delay(primary)
+        if delay is None:
+            return self._timed_call(primary, providers[primary])
+
+        first = self._pool.submit(self._timed_call, primary, providers[primary])
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        # Primary is slower than its p95 - hedge to the next candidate
+        hedge_target = remaining[0] if remaining else primary
+        self._count('hedges_sent')
+        second = self._pool.submit(self._timed_call, hedge_target, providers[hedge_target])
+        pending = {first, second}
+        error = None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for loser in pending:
+                    # A loser already running can't be cancelled; it finishes in the background
+                    self._count('hedges_cancelled' if loser.cancel() else 'hedges_abandoned')
+                if future is second:
+                    self._count('hedge_wins')
+                    if hedge_target in remaining:
+                        remaining.remove(hedge_target)
+                return future.result()
+
+        if hedge_target in remaining:
+            remaining.remove(hedge_target)
+        raise error
+
+    def get_stats(self) -> Dict:
+        """Get routing decisions and per-provider latency/error stats"""
+        with self._lock:
+            decisions = dict(self._decisions)
+            providers = {}
+            for name, stats in self._stats.items():
+                p50 = stats.percentile(50)
+                p95 = stats.percentile(95)
+                providers[name] = {
+                    'calls': stats.total_calls,
+                    'errors': stats.total_errors,
+                    'error_rate': round(stats.error_rate(), 4),
+                    'p50_latency': round(p50, 3) if p50 is not None else None,
+                    'p95_latency': round(p95, 3) if p95 is not None else None,
+                    'healthy': self._is_healthy(name)
+                }
+
+        requests = decisions['primary'] + decisions['rerouted_unhealthy']
+        decisions['hedge_rate'] = round(decisions['hedges_sent'] / requests, 4) if requests else 0
+        return {
+            'decisions': decisions,
+            'providers': providers
+        }
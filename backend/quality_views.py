@@ -0,0 +1,202 @@
+"""
+Reply-quality views kept up to date as conversations are saved: sentiment, confidence, review queues
+"""
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+# Confidence histogram: ten bins of width 0.1; scores below 0.7 are flagged for review
+BINS = 10
+LOW_CONFIDENCE_BINS = 7
+
+
+def _cell() -> Dict:
+    return {
+        'conversations': 0,
+        'sentiment': {},
+        'confidence_histogram': [0] * BINS,
+        'confidence_sum': 0.0,
+        'confidence_count': 0,
+        'should_review': 0
+    }
+
+
+def _add(into: Dict, cell: Dict):
+    into['conversations'] += cell['conversations']
+    for label, count in cell['sentiment'].items():
+        into['sentiment'][label] = into['sentiment'].get(label, 0) + count
+    histogram = into['confidence_histogram']
+    for i, count in enumerate(cell['confidence_histogram']):
+        histogram[i] += count
+    into['confidence_sum'] += cell['confidence_sum']
+    into['confidence_count'] += cell['confidence_count']
+    into['should_review'] += cell['should_review']
+
+
+def _report(cell: Dict) -> Dict:
+    n = cell['conversations']
+    scored = cell['confidence_count']
+    return {
+        'conversations': n,
+        'sentiment': dict(sorted(cell['sentiment'].items())),
+        'confidence': {
+            'mean': round(cell['confidence_sum'] / scored, 3) if scored else None,
+            'low': sum(cell['confidence_histogram'][:LOW_CONFIDENCE_BINS]),
+            'histogram': list(cell['confidence_histogram'])
+        },
+        'should_review': cell['should_review'],
+        'review_rate': round(cell['should_review'] / n, 4) if n else 0
+    }
+
+
+class QualityViews:
+    """
+    Materialized quality aggregates per (time bucket, provider, prompt version).
+
+    Each saved conversation adds one to its cell: sentiment label counts, a
+    ten-bin confidence histogram with a running mean, and the should_review
+    count; flagged conversations also go on a bounded review queue for their
+    provider and prompt version. All-time totals per provider and version are
+    kept next to the buckets, so they outlive bucket retention. Reads sum
+    cells and never touch the conversations, so their cost depends on the
+    buckets and providers asked for, not on how many chats were stored.
+    Callers serialize access (DatabaseService holds its lock).
+    """
+
+    def __init__(self, bucket_seconds: int = 3600, buckets_kept: int = 24 * 30, queue_size: int = 100):
+        self.bucket_seconds = bucket_seconds
+        self.buckets_kept = buckets_kept
+        self.queue_size = queue_size
+        self.reset()
+
+    def reset(self):
+        self.updates = 0
+        self._buckets: Dict[int, Dict[Tuple, Dict]] = {}
+        self._totals: Dict[Tuple, Dict] = {}
+        self._queues: Dict[Tuple, deque] = {}
+
+    def rebuild(self, conversations: Iterable):
+        """Recompute every view from stored conversations (after loading a snapshot)"""
+        self.reset()
+        for conversation in conversations:
+            self.add(conversation)
+
+    # -------------------------
+    # Updates
+    # -------------------------
+    def add(self, conversation):
+        """Count one conversation (a dict or a ConversationRecord)"""
+        timestamp = conversation.get('timestamp')
+        seconds = int(datetime.fromisoformat(timestamp).timestamp()) if timestamp else 0
+        bucket = seconds - seconds % self.bucket_seconds
+        key = (conversation.get('provider') or 'unknown', conversation.get('prompt_version'))
+        sentiment = conversation.get('sentiment') or {}
+        confidence = conversation.get('confidence') or {}
+
+        cells = self._buckets.get(bucket)
+        if cells is None:
+            cells = self._buckets[bucket] = {}
+            if len(self._buckets) > self.buckets_kept:
+                del self._buckets[min(self._buckets)]
+        targets = [self._totals.setdefault(key, _cell())]
+        if bucket in self._buckets:
+            targets.append(cells.setdefault(key, _cell()))
+
+        label = sentiment.get('sentiment', 'unknown')
+        score = confidence.get('score')
+        review = bool(confidence.get('should_review'))
+        for cell in targets:
+            cell['conversations'] += 1
+            cell['sentiment'][label] = cell['sentiment'].get(label, 0) + 1
+            if isinstance(score, (int, float)):
+                cell['confidence_histogram'][min(BINS - 1, max(0, int(score * BINS + 1e-9)))] += 1
+                cell['confidence_sum'] += score
+                cell['confidence_count'] += 1
+            if review:
+                cell['should_review'] += 1
+        if review:
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque(maxlen=self.queue_size)
+            queue.append({
+                'id': conversation.get('id'),
+                'timestamp': timestamp,
+                'provider': key[0],
+                'prompt_version': key[1],
+                'confidence': score,
+                'sentiment': label,
+                'flags': list(confidence.get('flags') or [])
+            })
+        self.updates += 1
+
+    # -------------------------
+    # Reads
+    # -------------------------
+    @staticmethod
+    def _matches(key: Tuple, provider: Optional[str], version: Optional[int]) -> bool:
+        return (provider is None or key[0] == provider) and (version is None or key[1] == version)
+
+    def query(self, since: Optional[float] = None, provider: Optional[str] = None,
+              version: Optional[int] = None, by: Optional[str] = None, review_limit: int = 20) -> Dict:
+        """
+        Quality summary, optionally since an epoch time (bucket-aligned) and for
+        one provider / prompt version. by='provider', 'version' or 'bucket' adds
+        a breakdown. Without since, totals are all-time.
+        """
+        if by not in (None, 'provider', 'version', 'bucket'):
+            raise ValueError("by must be provider, version or bucket")
+        total = _cell()
+        groups: Dict = {}
+        if since is None and by != 'bucket':
+            cells = [(None, key, cell) for key, cell in self._totals.items()]
+        else:
+            start = (since or 0) - (since or 0) % self.bucket_seconds
+            cells = [
+                (bucket, key, cell)
+                for bucket in sorted(self._buckets) if bucket >= start
+                for key, cell in self._buckets[bucket].items()
+            ]
+        for bucket, key, cell in cells:
+            if not self._matches(key, provider, version):
+                continue
+            _add(total, cell)
+            if by:
+                group = {'provider': key[0], 'version': key[1], 'bucket': bucket}[by]
+                _add(groups.setdefault(group, _cell()), cell)
+
+        queued = [
+            entry
+            for key, queue in self._queues.items() if self._matches(key, provider, version)
+            for entry in queue
+        ]
+        queued.sort(key=lambda entry: entry['timestamp'] or '', reverse=True)
+        if since is not None:
+            cutoff = datetime.fromtimestamp(since).isoformat()
+            queued = [entry for entry in queued if (entry['timestamp'] or '') >= cutoff]
+
+        result = {
+            'bucket_seconds': self.bucket_seconds,
+            'since': datetime.fromtimestamp(since).isoformat() if since is not None else None,
+            'filters': {'provider': provider, 'version': version},
+            'totals': _report(total),
+            'review_queue': queued[:review_limit]
+        }
+        if by == 'bucket':
+            result['buckets'] = [
+                {'start': datetime.fromtimestamp(bucket).isoformat(), **_report(cell)}
+                for bucket, cell in sorted(groups.items())
+            ]
+        elif by:
+            result[f'by_{by}'] = [
+                {by: group, **_report(cell)}
+                for group, cell in sorted(groups.items(), key=lambda item: (item[0] is None, str(item[0])))
+            ]
+        return result
+
+    def get_stats(self) -> Dict:
+        return {
+            'updates': self.updates,
+            'buckets': len(self._buckets),
+            'cells': sum(len(cells) for cells in self._buckets.values()),
+            'review_queues': len(self._queues)
+        }
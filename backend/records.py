@@ -0,0 +1,234 @@
+"""
+Compact in-memory records: slotted conversations and columnar performance metrics
+"""
+import math
+import sys
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Packed analytics tuples shared between records (most sentiment/confidence results repeat)
+PACKED_CACHE_MAX = 65536
+_packed_cache: Dict[tuple, tuple] = {}
+_shapes: Dict[tuple, tuple] = {}
+
+
+def to_micros(timestamp: Optional[str]) -> int:
+    """ISO timestamp (as written by datetime.now().isoformat()) -> integer epoch microseconds"""
+    if not timestamp:
+        return 0
+    moment = datetime.fromisoformat(timestamp)
+    return int(moment.replace(microsecond=0).timestamp()) * 1_000_000 + moment.microsecond
+
+
+def from_micros(micros: int) -> Optional[str]:
+    """Inverse of to_micros, exact to the microsecond"""
+    if not micros:
+        return None
+    seconds, fraction = divmod(micros, 1_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=fraction).isoformat()
+
+
+def _intern(value: Any) -> Any:
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return tuple(_intern(item) for item in value)
+    return value
+
+
+def pack(mapping: Optional[Dict]) -> Optional[tuple]:
+    """
+    Small dict -> (keys, *values) with the keys tuple and string values
+    interned, and identical packs shared.
+    """
+    if mapping is None:
+        return None
+    keys = tuple(mapping)
+    keys = _shapes.setdefault(keys, keys)
+    packed = (keys,) + tuple(_intern(mapping[key]) for key in keys)
+    try:
+        shared = _packed_cache.get(packed)
+    except TypeError:  # an unhashable value (nested dict) - keep this one unshared
+        return packed
+    if shared is not None:
+        return shared
+    if len(_packed_cache) < PACKED_CACHE_MAX:
+        _packed_cache[packed] = packed
+    return packed
+
+
+def unpack(packed: Optional[tuple]) -> Optional[Dict]:
+    if packed is None:
+        return None
+    return {
+        key: list(value) if isinstance(value, tuple) else value
+        for key, value in zip(packed[0], packed[1:])
+    }
+
+
+class ConversationRecord:
+    """
+    One stored conversation. Use to_dict() for the API shape; get() reads a
+    field by its dict key so filters work on records and dicts alike.
+    """
+
+    __slots__ = ('id', 'created', 'client_message', 'ai_reply', 'sentiment', 'confidence',
+                 'response_time', 'provider', 'session_id', 'user_id', 'contact_id', 'extra', 'prompt_version')
+
+    OPTIONAL = ('session_id', 'user_id', 'contact_id', 'prompt_version')
+
+    @classmethod
+    def from_dict(cls, conversation: Dict) -> 'ConversationRecord':
+        fields = dict(conversation)
+        record = cls.__new__(cls)
+        record.id = fields.pop('id', None)
+        record.created = to_micros(fields.pop('timestamp', None))
+        record.client_message = fields.pop('client_message', '')
+        record.ai_reply = fields.pop('ai_reply', '')
+        record.sentiment = pack(fields.pop('sentiment', None))
+        record.confidence = pack(fields.pop('confidence', None))
+        record.response_time = fields.pop('response_time', None)
+        provider = fields.pop('provider', None)
+        record.provider = sys.intern(provider) if isinstance(provider, str) else provider
+        for name in cls.OPTIONAL:
+            setattr(record, name, fields.pop(name, None))
+        record.extra = fields or None
+        return record
+
+    def to_dict(self) -> Dict:
+        conversation = {
+            'id': self.id,
+            'timestamp': from_micros(self.created),
+            'client_message': self.client_message,
+            'ai_reply': self.ai_reply,
+            'sentiment': unpack(self.sentiment),
+            'confidence': unpack(self.confidence),
+            'response_time': self.response_time,
+            'provider': self.provider
+        }
+        for name in self.OPTIONAL:
+            value = getattr(self, name)
+            if value is not None:
+                conversation[name] = value
+        if self.extra:
+            conversation.update(self.extra)
+        return conversation
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in ('client_message', 'ai_reply', 'provider', 'id', 'response_time') or key in self.OPTIONAL:
+            value = getattr(self, key)
+        elif key in ('sentiment', 'confidence'):
+            value = unpack(getattr(self, key))
+        elif key == 'timestamp':
+            value = from_micros(self.created)
+        else:
+            value = (self.extra or {}).get(key)
+        return default if value is None else value
+
+    # Pickled as a plain tuple (snapshots) rather than a dict of slot names per record
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        # Snapshots from before a slot was added hold shorter tuples
+        state = tuple(state) + (None,) * (len(self.__slots__) - len(state))
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+class MetricColumns:
+    """
+    Performance metrics as parallel typed arrays, one row per metric.
+
+    Numbers are float64 (NaN = not logged; whole token counts are read back
+    as ints), timestamps epoch microseconds, endpoint and provider small integer
+    codes into one label table. Running totals keep the summary O(1); dicts
+    are only built for rows a caller asks for.
+    """
+
+    NUMERIC = ('response_time', 'queue_wait', 'tokens_used', 'estimated_cost')
+    INTEGER = ('tokens_used',)
+    LABELS = ('endpoint', 'provider')
+    KNOWN = ('timestamp', 'prompt_version') + NUMERIC + LABELS
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.numbers = {name: array('d') for name in self.NUMERIC}
+        self.codes = {name: array('H') for name in self.LABELS}
+        self.prompt_versions = array('l')  # 0 = none
+        self.labels: List[Optional[str]] = [None]
+        self._label_codes: Dict[Optional[str], int] = {None: 0}
+        self.extra: Dict[int, Dict] = {}  # row -> keys outside the known columns (rare)
+        self.totals = dict.fromkeys(self.NUMERIC, 0.0)
+
+    @classmethod
+    def from_dicts(cls, metrics: List[Dict]) -> 'MetricColumns':
+        columns = cls()
+        for metric in metrics:
+            columns.append(metric)
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _code(self, label: Optional[str]) -> int:
+        code = self._label_codes.get(label)
+        if code is None:
+            code = len(self.labels)
+            self.labels.append(sys.intern(label) if isinstance(label, str) else label)
+            self._label_codes[label] = code
+        return code
+
+    def append(self, metric: Dict):
+        row = len(self.timestamps)
+        for name in self.NUMERIC:
+            value = metric.get(name)
+            value = math.nan if value is None else float(value)
+            self.numbers[name].append(value)
+            if not math.isnan(value):
+                self.totals[name] += value
+        for name in self.LABELS:
+            self.codes[name].append(self._code(metric.get(name)))
+        self.prompt_versions.append(metric.get('prompt_version') or 0)
+        extra = {key: value for key, value in metric.items() if key not in self.KNOWN}
+        if extra:
+            self.extra[row] = extra
+        # Appended last: a row exists for readers once its timestamp does
+        self.timestamps.append(to_micros(metric.get('timestamp')))
+
+    def row(self, index: int) -> Dict:
+        # Columns a metric didn't log (NaN, label code 0, version 0) are left out of its dict
+        metric = {'timestamp': from_micros(self.timestamps[index])}
+        if self.codes['endpoint'][index]:
+            metric['endpoint'] = self.labels[self.codes['endpoint'][index]]
+        for name in self.NUMERIC:
+            value = self.numbers[name][index]
+            if not math.isnan(value):
+                # Token estimates may be fractional; only whole counts become ints again
+                metric[name] = int(value) if name in self.INTEGER and value.is_integer() else value
+        if self.codes['provider'][index]:
+            metric['provider'] = self.labels[self.codes['provider'][index]]
+        if self.prompt_versions[index]:
+            metric['prompt_version'] = self.prompt_versions[index]
+        if index in self.extra:
+            metric.update(self.extra[index])
+        return metric
+
+    def tail(self, limit: int) -> List[Dict]:
+        """Dicts for the last `limit` rows, oldest first"""
+        count = len(self)
+        return [self.row(index) for index in range(max(0, count - limit), count)]
+
+    def copy(self) -> 'MetricColumns':
+        """Independent copy (arrays are copied in one memcpy each)"""
+        clone = MetricColumns.__new__(MetricColumns)
+        clone.timestamps = array('q', self.timestamps)
+        clone.numbers = {name: array('d', values) for name, values in self.numbers.items()}
+        clone.codes = {name: array('H', values) for name, values in self.codes.items()}
+        clone.prompt_versions = array('l', self.prompt_versions)
+        clone.labels = list(self.labels)
+        clone._label_codes = dict(self._label_codes)
+        clone.extra = dict(self.extra)
+        clone.totals = dict(self.totals)
+        return clone
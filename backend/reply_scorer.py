@@ -0,0 +1,225 @@
+"""
+Local predicted-vs-actual reply similarity, used to skip editor calls that wouldn't change anything
+"""
+import os
+import re
+import threading
+import zlib
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from semantic_index import features
+
+# Amounts and durations the editor must not let the chatbot get wrong
+_NUMBER = r'(\d[\d,]*(?:\.\d+)?)'
+_MONEY_BEFORE = re.compile(r'(฿|thb|baht|usd|\$|€|eur)\s*' + _NUMBER + r'\s*(k|m|million)?(?!\w)', re.I)
+_MONEY_AFTER = re.compile(_NUMBER + r'\s*(k|m|million)?\s*(฿|thb|baht|usd|dollars?|€|eur|euros?)(?!\w)', re.I)
+_DURATION = re.compile(
+    _NUMBER + r'(?:\s*(?:-|–|to)\s*' + _NUMBER + r')?\s*(?:business |working |calendar )?(day|week|month|year)s?\b',
+    re.I
+)
+_PERCENT = re.compile(_NUMBER + r'\s*%')
+
+CURRENCY = {'฿': 'thb', 'thb': 'thb', 'baht': 'thb', 'usd': 'usd', '$': 'usd', 'dollar': 'usd', 'dollars': 'usd',
+            '€': 'eur', 'eur': 'eur', 'euro': 'eur', 'euros': 'eur'}
+MULTIPLIER = {None: 1, 'k': 1_000, 'm': 1_000_000, 'million': 1_000_000}
+DAYS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+
+def _number(text: str) -> float:
+    return float(text.replace(',', ''))
+
+
+def extract_facts(text: str) -> Set[Tuple[str, float]]:
+    """Money amounts (per currency), durations (in days) and percentages stated in text"""
+    text = text or ''
+    facts = set()
+    for currency, amount, scale in _MONEY_BEFORE.findall(text):
+        facts.add((CURRENCY[currency.lower()], _number(amount) * MULTIPLIER[scale.lower() or None]))
+    for amount, scale, currency in _MONEY_AFTER.findall(text):
+        facts.add((CURRENCY[currency.lower()], _number(amount) * MULTIPLIER[scale.lower() or None]))
+    for low, high, unit in _DURATION.findall(text):
+        for value in (low, high):
+            if value:
+                facts.add(('days', _number(value) * DAYS[unit.lower()]))
+    for value in _PERCENT.findall(text):
+        facts.add(('percent', _number(value)))
+    return facts
+
+
+def compare_facts(predicted: Set, actual: Set) -> Dict:
+    """
+    Facts of the actual reply the prediction lacks, and predicted facts that
+    contradict the actual reply (same kind, different value). Predicted facts
+    of a kind the actual reply doesn't mention can't be checked and are ignored.
+    """
+    kinds = {kind for kind, _ in actual}
+    missing = sorted(actual - predicted)
+    wrong = sorted(fact for fact in predicted - actual if fact[0] in kinds)
+    return {'missing': missing, 'wrong': wrong, 'ok': not missing and not wrong}
+
+
+class ReplyScorer:
+    """
+    Scores predicted replies against what the consultant actually wrote.
+
+    Similarity is the mean of a TF-IDF cosine (unigram, bigram and concept
+    features from semantic_index, hashed; IDF fitted on the consultant replies
+    of the training data) and the F1 overlap of their word sets. A pair is
+    close enough to skip the editor when the similarity reaches the threshold
+    and every fee, duration and amount in the actual reply is in the
+    prediction, with none contradicted. Whole batches are scored with a few
+    numpy operations over all pairs at once.
+    """
+
+    def __init__(self, threshold: float = 0.7, enabled: bool = True, dim: int = 1 << 16):
+        self.threshold = threshold
+        self.enabled = enabled
+        self.dim = dim
+        self._idf: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._similarities: deque = deque(maxlen=1000)
+        self._stats = {
+            'scored': 0,
+            'skipped': 0,
+            'editor_calls': 0,
+            'fact_mismatches': 0
+        }
+        self._saved = {'input_tokens': 0, 'output_tokens': 0, 'estimated_cost': 0.0, 'seconds': 0.0}
+
+    # -------------------------
+    # Vectors
+    # -------------------------
+    def _hashed(self, text: str) -> Tuple[List[int], List[float], Set[int]]:
+        """Feature slots and weights, plus the slots of plain words (for the overlap)"""
+        slots, weights, words = [], [], set()
+        for feature, weight in features(text):
+            slot = zlib.crc32(feature.encode('utf-8')) % self.dim
+            slots.append(slot)
+            weights.append(weight)
+            if ' ' not in feature and not feature.startswith('#'):
+                words.add(slot)
+        return slots, weights, words
+
+    def idf(self) -> np.ndarray:
+        """Smoothed IDF per hashed slot, fitted on the training data's consultant replies once"""
+        if self._idf is None:
+            with self._lock:
+                if self._idf is None:
+                    self._idf = self._fit_idf()
+        return self._idf
+
+    def _fit_idf(self) -> np.ndarray:
+        try:
+            from training_dataset import training_dataset
+            replies = {' '.join(seq['consultant_reply']) for seq in training_dataset.get_many(range(len(training_dataset)))}
+        except Exception as e:
+            print(f"Reply scorer: no training data for IDF ({e}); using plain term frequencies")
+            return np.ones(self.dim, dtype=np.float32)
+        df = np.zeros(self.dim, dtype=np.float64)
+        for reply in replies:
+            slots, _, _ = self._hashed(reply)
+            df[np.unique(np.array(slots, dtype=np.int64))] += 1
+        n = len(replies)
+        return (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+
+    def _sparse(self, texts: Sequence[str]):
+        """(row * dim + slot) keys with TF-IDF values, and the same keys for the word sets"""
+        rows, slots, weights, word_keys = [], [], [], []
+        for row, text in enumerate(texts):
+            text_slots, text_weights, words = self._hashed(text)
+            rows += [row] * len(text_slots)
+            slots += text_slots
+            weights += text_weights
+            word_keys += [row * self.dim + slot for slot in words]
+        keys = np.array(rows, dtype=np.int64) * self.dim + np.array(slots, dtype=np.int64)
+        keys, inverse = np.unique(keys, return_inverse=True)
+        tf = np.bincount(inverse, weights=np.array(weights, dtype=np.float64), minlength=len(keys))
+        values = np.log1p(tf) * self.idf()[keys % self.dim]
+        return keys, values, np.unique(np.array(word_keys, dtype=np.int64))
+
+    # -------------------------
+    # Scoring
+    # -------------------------
+    def score_batch(self, predicted: Sequence[str], actual: Sequence[str]) -> List[Dict]:
+        """Similarity and fact check for each (predicted, actual) pair"""
+        n = len(predicted)
+        if n != len(actual):
+            raise ValueError('predicted and actual must be the same length')
+        if n == 0:
+            return []
+
+        p_keys, p_values, p_words = self._sparse(predicted)
+        a_keys, a_values, a_words = self._sparse(actual)
+        p_norm = np.sqrt(np.bincount(p_keys // self.dim, weights=p_values ** 2, minlength=n))
+        a_norm = np.sqrt(np.bincount(a_keys // self.dim, weights=a_values ** 2, minlength=n))
+        _, p_at, a_at = np.intersect1d(p_keys, a_keys, assume_unique=True, return_indices=True)
+        dots = np.bincount(p_keys[p_at] // self.dim, weights=p_values[p_at] * a_values[a_at], minlength=n)
+        denominator = p_norm * a_norm
+        cosine = np.divide(dots, denominator, out=np.zeros(n), where=denominator > 0)
+
+        common = np.bincount(np.intersect1d(p_words, a_words, assume_unique=True) // self.dim, minlength=n)
+        sizes = np.bincount(p_words // self.dim, minlength=n) + np.bincount(a_words // self.dim, minlength=n)
+        overlap = np.divide(2 * common, sizes, out=np.zeros(n), where=sizes > 0)
+        similarity = (cosine + overlap) / 2
+
+        results = []
+        for i in range(n):
+            facts = compare_facts(extract_facts(predicted[i]), extract_facts(actual[i]))
+            sim = round(float(similarity[i]), 4)
+            results.append({
+                'similarity': sim,
+                'cosine': round(float(cosine[i]), 4),
+                'overlap': round(float(overlap[i]), 4),
+                'facts': facts,
+                'skip_editor': self.enabled and facts['ok'] and sim >= self.threshold
+            })
+        return results
+
+    def score(self, predicted: str, actual: str) -> Dict:
+        return self.score_batch([predicted], [actual])[0]
+
+    # -------------------------
+    # Accounting
+    # -------------------------
+    def record(self, result: Dict, saved: Optional[Dict] = None):
+        """Count one gate decision; saved holds the estimated cost of a skipped editor call"""
+        with self._lock:
+            self._stats['scored'] += 1
+            self._similarities.append(result['similarity'])
+            if not result['facts']['ok']:
+                self._stats['fact_mismatches'] += 1
+            if result['skip_editor']:
+                self._stats['skipped'] += 1
+                for key, value in (saved or {}).items():
+                    self._saved[key] += value or 0
+            else:
+                self._stats['editor_calls'] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            scored = self._stats['scored']
+            ordered = sorted(self._similarities)
+            return {
+                **self._stats,
+                'enabled': self.enabled,
+                'threshold': self.threshold,
+                'skip_rate': round(self._stats['skipped'] / scored, 4) if scored else 0,
+                'similarity_p50': round(ordered[len(ordered) // 2], 4) if ordered else None,
+                'saved': {
+                    'editor_calls': self._stats['skipped'],
+                    'input_tokens': self._saved['input_tokens'],
+                    'output_tokens': self._saved['output_tokens'],
+                    'estimated_cost': round(self._saved['estimated_cost'], 6),
+                    'seconds': round(self._saved['seconds'], 3)
+                }
+            }
+
+
+# Singleton
+reply_scorer = ReplyScorer(
+    threshold=float(os.getenv('REPLY_SIMILARITY_THRESHOLD', 0.7)),
+    enabled=os.getenv('EDITOR_SKIP_ENABLED', 'true').lower() != 'false'
+)
@@ -0,0 +1,98 @@
+"""
+Single-flight coalescing for identical in-flight LLM requests
+"""
+import copy
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+
+class _InFlightCall:
+    __slots__ = ('event', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class RequestCoalescer:
+    """
+    Lets concurrent callers with the same key share one in-flight call.
+
+    The first caller (the leader) runs the function; callers that arrive while
+    it is still running wait for its result instead of issuing their own call.
+    Nothing is kept once the call finishes - this is not a cache.
+    """
+
+    def __init__(self, timeout: float = 60.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Tuple, _InFlightCall] = {}
+        self._stats = {
+            'leader_calls': 0,
+            'coalesced_calls': 0,
+            'leader_errors': 0,
+            'timeouts': 0
+        }
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, user_message: str) -> Tuple:
+        """Build the coalescing key (the system prompt is hashed to keep keys small)"""
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return (provider, model, prompt_hash, user_message)
+
+    def run(self, key: Tuple, fn: Callable[[], Any]) -> Any:
+        """Run fn once per key among concurrent callers and share its result"""
+        with self._lock:
+            call = self._in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._in_flight[key] = call
+                self._stats['leader_calls'] += 1
+            else:
+                call.followers += 1
+                self._stats['coalesced_calls'] += 1
+
+        if is_leader:
+            try:
+                result = fn()
+                with self._lock:
+                    # No follower can join once the call is out of _in_flight
+                    self._in_flight.pop(key, None)
+                    followers = call.followers
+                # Followers copy from a snapshot taken before the leader's caller can touch the result
+                if followers:
+                    call.result = copy.deepcopy(result)
+                return result
+            except Exception as e:
+                call.error = e
+                with self._lock:
+                    self._stats['leader_errors'] += 1
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+                call.event.set()
+
+        if not call.event.wait(self.timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise TimeoutError(f"Timed out after {self.timeout}s waiting for in-flight request")
+
+        if call.error is not None:
+            raise call.error
+
+        # Each follower gets its own copy of the snapshot so callers can't mutate each other's result
+        return copy.deepcopy(call.result)
+
+    def get_stats(self) -> Dict:
+        """Get coalescing counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._in_flight)
+        total = stats['leader_calls'] + stats['coalesced_calls']
+        stats['coalesced_ratio'] = round(stats['coalesced_calls'] / total, 4) if total else 0
+        return stats
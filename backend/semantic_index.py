@@ -0,0 +1,214 @@
+"""
+Offline semantic search: hashed text features in an int8, memory-mappable vector index
+"""
+import os
+import re
+import threading
+import zlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+STOP_WORDS = {
+    'a', 'an', 'the', 'and', 'or', 'but', 'if', 'of', 'to', 'in', 'on', 'at', 'for', 'with', 'by',
+    'from', 'is', 'are', 'was', 'be', 'been', 'am', 'i', 'me', 'my', 'you', 'your', 'we', 'our',
+    'it', 'its', 'this', 'that', 'do', 'does', 'can', 'could', 'would', 'will', 'have', 'has',
+    'so', 'as', 'there', 'what', 'how', 'please', 'hi', 'hello'
+}
+
+# Words that mean the same thing to a visa client. A shared concept feature lets
+# "money in my bank" match "500,000 THB balance" without any embedding model.
+CONCEPTS = {
+    'funds': {'money', 'balance', 'fund', 'saving', 'baht', 'thb', 'bank', 'account', 'statement',
+              'deposit', 'cash', 'financial', 'finance', 'income', 'salary'},
+    'visa': {'visa', 'dtv', 'permit', 'stamp', 'extension', 'extend', 'overstay', 'entry', 'reentry'},
+    'documents': {'document', 'passport', 'photo', 'copy', 'proof', 'letter', 'certificate', 'pdf', 'scan'},
+    'fees': {'fee', 'cost', 'price', 'much', 'pay', 'payment', 'payable', 'charge', 'expensive', 'cheap'},
+    'timing': {'time', 'take', 'day', 'week', 'month', 'year', 'long', 'duration', 'process', 'processing',
+               'wait', 'when', 'fast', 'quick'},
+    'work': {'remote', 'work', 'job', 'employer', 'freelance', 'company', 'contract', 'employment'},
+    'training': {'muay', 'course', 'school', 'class', 'training', 'gym'},
+    'embassy': {'embassy', 'consulate', 'immigration', 'office', 'appointment', 'apply', 'application', 'submit'}
+}
+_CONCEPT_OF = {word: concept for concept, words in CONCEPTS.items() for word in words}
+
+UNIGRAM_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.5
+CONCEPT_WEIGHT = 0.7
+
+
+def _stem(word: str) -> str:
+    """Crude plural folding: statements -> statement, fees -> fee"""
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def features(text: str) -> List[Tuple[str, float]]:
+    """Weighted features of text: unigrams, bigrams and domain concepts"""
+    words = [_stem(w) for w in _WORD.findall((text or '').lower()) if w not in STOP_WORDS]
+    words = ['<num>' if w[0].isdigit() else w for w in words]
+    feats = [(w, UNIGRAM_WEIGHT) for w in words]
+    feats += [(f'{a} {b}', BIGRAM_WEIGHT) for a, b in zip(words, words[1:])]
+    feats += [(f'#{_CONCEPT_OF[w]}', CONCEPT_WEIGHT) for w in words if w in _CONCEPT_OF]
+    return feats
+
+
+def vectorize(text: str, dim: int) -> np.ndarray:
+    """Unit-length float32 feature-hashed vector (all zeros for empty text)"""
+    slots, weights = [], []
+    for feature, weight in features(text):
+        h = zlib.crc32(feature.encode('utf-8'))
+        # Low bits pick the slot, the top bit the sign, so collisions tend to cancel
+        slots.append(h % dim)
+        weights.append(weight if h & 0x80000000 else -weight)
+    if not slots:
+        return np.zeros(dim, dtype=np.float32)
+    vector = np.bincount(slots, weights=weights, minlength=dim)
+    # Sublinear term frequency, then L2-normalize
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = np.sqrt(vector.dot(vector))
+    return (vector / norm).astype(np.float32) if norm else vector.astype(np.float32)
+
+
+def quantize(vector: np.ndarray) -> np.ndarray:
+    """Unit vector -> int8 with 127 as 1.0"""
+    return np.clip(np.rint(vector * 127), -127, 127).astype(np.int8)
+
+
+class SemanticIndex:
+    """
+    One int8 row per conversation, in conversation order.
+
+    Rows live in a growable array, or, with a directory, in an append-only
+    file (``vectors-<dim>.i8``) that searches read through a memory map, so the
+    index costs page cache rather than heap and survives restarts.
+    """
+
+    CHUNK_ROWS = 4096
+
+    def __init__(self, dim: int = 256, directory: Optional[str] = None):
+        self.dim = dim
+        self.path = None
+        self._lock = threading.Lock()
+        self._count = 0
+        self._file = None
+        self._mapped: Optional[np.ndarray] = None
+        self._vectors = np.zeros((1024, dim), dtype=np.int8)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, f'vectors-{dim}.i8')
+            self._file = open(self.path, 'ab')
+            size = os.path.getsize(self.path)
+            # A torn final row from a crash is dropped
+            self._count = size // dim
+            if size % dim:
+                self._file.truncate(self._count * dim)
+
+    def __len__(self) -> int:
+        return self._count
+
+    # -------------------------
+    # Writes
+    # -------------------------
+    def encode(self, text: str) -> np.ndarray:
+        """int8 row for text (lets callers vectorize before taking their own locks)"""
+        return quantize(vectorize(text, self.dim))
+
+    def add(self, row: int, text: str, vector: Optional[np.ndarray] = None):
+        """Index text as row; rows must arrive in order, already-indexed rows are skipped"""
+        if row < self._count:
+            return
+        if vector is None:
+            vector = self.encode(text)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(vector.tobytes())
+            else:
+                if self._count == len(self._vectors):
+                    grown = np.zeros((len(self._vectors) * 2, self.dim), dtype=np.int8)
+                    grown[:self._count] = self._vectors[:self._count]
+                    self._vectors = grown
+                self._vectors[self._count] = vector
+            self._count += 1
+
+    def truncate(self, rows: int):
+        """Forget rows from this one on (the store they described was lost)"""
+        with self._lock:
+            if rows >= self._count:
+                return
+            self._count = rows
+            self._mapped = None
+            if self._file is not None:
+                self._file.flush()
+                self._file.truncate(rows * self.dim)
+
+    def sync(self, texts: List[str]):
+        """Make the index hold exactly one row per text, indexing only missing rows"""
+        self.truncate(len(texts))
+        for row in range(self._count, len(texts)):
+            self.add(row, texts[row])
+
+    # -------------------------
+    # Search
+    # -------------------------
+    def _matrix(self) -> np.ndarray:
+        """Current rows; call with self._lock held"""
+        if self._file is None:
+            return self._vectors[:self._count]
+        if self._mapped is None or len(self._mapped) != self._count:
+            self._file.flush()
+            self._mapped = np.memmap(self.path, dtype=np.int8, mode='r', shape=(self._count, self.dim)) \
+                if self._count else np.zeros((0, self.dim), dtype=np.int8)
+        return self._mapped
+
+    def search(self, query: str, k: int = 20, min_score: float = 0.1,
+               rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k rows by cosine similarity to query, as (row, score) best first.
+
+        rows optionally restricts the search to those row numbers.
+        """
+        q = vectorize(query, self.dim)
+        if not q.any() or k <= 0:
+            return []
+        with self._lock:
+            matrix = self._matrix()
+
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            rows = rows[rows < len(matrix)]
+            candidates = ((rows[i:i + self.CHUNK_ROWS], matrix[rows[i:i + self.CHUNK_ROWS]])
+                          for i in range(0, len(rows), self.CHUNK_ROWS))
+        else:
+            candidates = ((None, matrix[i:i + self.CHUNK_ROWS]) for i in range(0, len(matrix), self.CHUNK_ROWS))
+
+        best_rows, best_scores = [], []
+        offset = 0
+        for row_ids, chunk in candidates:
+            scores = chunk.astype(np.float32) @ q
+            if len(scores) > k:
+                top = np.argpartition(scores, -k)[-k:]
+            else:
+                top = np.arange(len(scores))
+            best_rows.append(row_ids[top] if row_ids is not None else top + offset)
+            best_scores.append(scores[top])
+            offset += len(chunk)
+
+        if not best_rows:
+            return []
+        all_rows = np.concatenate(best_rows)
+        all_scores = np.concatenate(best_scores) / 127
+        order = np.argsort(-all_scores)[:k]
+        return [(int(all_rows[i]), round(float(all_scores[i]), 4)) for i in order if all_scores[i] >= min_score]
+
+    def memory_bytes(self) -> int:
+        """Bytes of vector data (heap for the in-memory index, file size when mapped)"""
+        return self._count * self.dim if self._file is not None else self._vectors.nbytes
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,126 @@
+"""
+Server-side chat sessions: history kept on the server, formatted incrementally
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from ai_service import format_chat_line
+
+EMPTY_HISTORY = "(No previous conversation)"
+
+
+class ChatSession:
+    """
+    Append-only chat history for one conversation.
+
+    Each message is formatted once when it arrives; the history text handed
+    to the LLM is re-joined only after something was appended.
+    """
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.turns = 0
+        self.lock = threading.Lock()
+        # Held by /generate-reply for a whole turn (read history, call the LLM, append)
+        self.turn_lock = threading.Lock()
+        self._messages: List[Dict] = []
+        self._lines: List[str] = []
+        self._text: Optional[str] = None
+
+    def append(self, role: str, message: str):
+        with self.lock:
+            self._messages.append({'role': role, 'message': message})
+            self._lines.append(format_chat_line(role, message))
+            self._text = None
+
+    def append_turn(self, client_messages: List[str], reply: str):
+        for message in client_messages:
+            self.append('client', message)
+        self.append('consultant', reply)
+        with self.lock:
+            self.turns += 1
+
+    def history_text(self) -> str:
+        with self.lock:
+            if self._text is None:
+                self._text = '\n'.join(self._lines) if self._lines else EMPTY_HISTORY
+            return self._text
+
+    def messages(self) -> List[Dict]:
+        with self.lock:
+            return list(self._messages)
+
+    def summary(self) -> Dict:
+        return {
+            'sessionId': self.id,
+            'turns': self.turns,
+            'messages': len(self._messages),
+            'createdAt': self.created_at,
+            'lastUsed': self.last_used
+        }
+
+
+class SessionStore:
+    """Sessions by id, least recently used first; idle or surplus sessions are evicted"""
+
+    def __init__(self):
+        self.idle_timeout = float(os.getenv('SESSION_IDLE_TIMEOUT', 1800))
+        self.max_sessions = int(os.getenv('SESSION_MAX', 10000))
+        self._lock = threading.Lock()
+        self._sessions: 'OrderedDict[str, ChatSession]' = OrderedDict()
+        self._stats = {'created': 0, 'resumed': 0, 'expired': 0, 'evicted': 0}
+
+    def _evict(self, now: float):
+        """Drop idle sessions from the LRU end, then any over the cap; call with self._lock held"""
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used < self.idle_timeout:
+                break
+            del self._sessions[session.id]
+            self._stats['expired'] += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self._stats['evicted'] += 1
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            self._stats['resumed'] += 1
+            return session
+
+    def create(self, chat_history: List[Dict] = None, session_id: Optional[str] = None) -> ChatSession:
+        """New session, optionally seeded with a client-supplied history"""
+        session = ChatSession(session_id or uuid.uuid4().hex)
+        for msg in chat_history or []:
+            session.append(str(msg.get('role', '')), str(msg.get('message', '')))
+        now = time.time()
+        with self._lock:
+            self._sessions[session.id] = session
+            self._sessions.move_to_end(session.id)
+            self._stats['created'] += 1
+            self._evict(now)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, 'active': len(self._sessions)}
+
+
+# Singleton
+session_store = SessionStore()
@@ -0,0 +1,248 @@
+"""
+Shadow evaluation of candidate prompts on sampled /generate-reply traffic
+"""
+import os
+import random
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from ai_service import ai_service
+from admission_control import AdmissionRejected, estimate_tokens
+
+
+class Candidate:
+    """A prompt waiting for promotion, with paired (live, shadow) samples"""
+
+    def __init__(self, prompt: str, metadata: Dict, base_version: int, window: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.prompt = prompt
+        self.metadata = metadata
+        self.base_version = base_version
+        self.created_at = datetime.now().isoformat()
+        # (live version, live sample, shadow sample); samples are (latency, output tokens, confidence)
+        self.pairs: deque = deque(maxlen=window)
+        self.errors = 0
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def _p50(values: List[float]) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+class ShadowService:
+    """
+    Candidate prompts run alongside the live prompt on a sample of
+    /generate-reply requests. Shadow calls go through a small background
+    pool at `batch` priority, so they add no user latency and are shed first
+    under load. Each shadow sample is paired with the live reply to the same
+    request, and a candidate can only be promoted once enough pairs against
+    the current live version meet the latency, output token and confidence
+    budgets.
+    """
+
+    def __init__(self):
+        self.ai = ai_service
+        self.enabled = os.getenv('PROMPT_SHADOW_MODE', 'false').lower() != 'false'
+        self.sample_rate = float(os.getenv('SHADOW_SAMPLE_RATE', 0.1))
+        self.min_samples = int(os.getenv('SHADOW_MIN_SAMPLES', 20))
+        self.max_latency_ratio = float(os.getenv('SHADOW_MAX_LATENCY_RATIO', 1.2))
+        self.max_token_ratio = float(os.getenv('SHADOW_MAX_TOKEN_RATIO', 1.2))
+        self.max_confidence_drop = float(os.getenv('SHADOW_MAX_CONFIDENCE_DROP', 0.02))
+        self.window = int(os.getenv('SHADOW_WINDOW', 500))
+
+        workers = int(os.getenv('SHADOW_MAX_WORKERS', 2))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prompt-shadow')
+        # Sampled requests beyond this many queued shadow runs are skipped
+        self.max_pending = workers * 4
+
+        self._lock = threading.Lock()
+        self._candidates: Dict[str, Candidate] = {}
+        self._pending = 0
+        self._stats = {'sampled': 0, 'skipped_busy': 0, 'shed': 0, 'errors': 0}
+
+    # -------------------------
+    # Candidates
+    # -------------------------
+    def add_candidate(self, prompt: str, metadata: Dict = None) -> Dict:
+        _, version = self.ai.db.get_prompt_version()
+        candidate = Candidate(prompt, metadata or {}, version, self.window)
+        with self._lock:
+            self._candidates[candidate.id] = candidate
+        return self.report(candidate.id)
+
+    def list_candidates(self) -> List[Dict]:
+        with self._lock:
+            ids = list(self._candidates)
+        return [self.report(candidate_id) for candidate_id in ids]
+
+    def reject(self, candidate_id: str) -> bool:
+        with self._lock:
+            candidate = self._candidates.pop(candidate_id, None)
+        return candidate is not None
+
+    def promote(self, candidate_id: str, force: bool = False) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """
+        Make a candidate the live prompt if it meets the budgets.
+
+        Returns (set_prompt result, report); the result is None when the
+        candidate is unknown (report None too) or misses its budgets.
+        """
+        report = self.report(candidate_id)
+        if report is None:
+            return None, None
+        if not report['meets_budgets'] and not force:
+            return None, report
+
+        with self._lock:
+            candidate = self._candidates.pop(candidate_id, None)
+        if candidate is None:
+            return None, None
+
+        metadata = {**candidate.metadata, 'shadow': report['comparison'], 'candidate_id': candidate_id}
+        if force and not report['meets_budgets']:
+            metadata['forced'] = True
+        return self.ai.db.set_prompt(candidate.prompt, metadata), report
+
+    # -------------------------
+    # Sampling
+    # -------------------------
+    def observe(self, client_sequence, history_text: str, provider: Optional[str], live_result: Dict):
+        """Called after a live reply; maybe schedules shadow runs of every candidate"""
+        confidence = (live_result.get('confidence') or {}).get('score')
+        if confidence is None:
+            return
+        with self._lock:
+            if not self._candidates or random.random() >= self.sample_rate:
+                return
+            if self._pending >= self.max_pending:
+                self._stats['skipped_busy'] += 1
+                return
+            self._pending += 1
+            self._stats['sampled'] += 1
+            candidates = list(self._candidates.values())
+
+        _, version = self.ai.db.get_prompt_version()
+        live = (
+            live_result['response_time'] - live_result.get('queue_wait', 0),
+            estimate_tokens(live_result['reply']),
+            confidence
+        )
+        self._pool.submit(self._run, candidates, version, live, client_sequence, history_text, provider)
+
+    def _run(self, candidates: List[Candidate], live_version: int, live: Tuple,
+             client_sequence, history_text: str, provider: Optional[str]):
+        try:
+            for candidate in candidates:
+                try:
+                    result = self.ai.generate_reply(
+                        client_sequence, [], provider, include_analytics=False, priority='batch',
+                        chatbot_prompt=candidate.prompt, history_text=history_text
+                    )
+                    confidence = self.ai.calculate_confidence(
+                        result['reply'], [], provider=provider, priority='batch'
+                    )
+                except AdmissionRejected:
+                    with self._lock:
+                        self._stats['shed'] += 1
+                    continue
+                except Exception:
+                    with self._lock:
+                        candidate.errors += 1
+                        self._stats['errors'] += 1
+                    continue
+
+                shadow = (
+                    result['response_time'] - result.get('queue_wait', 0),
+                    estimate_tokens(result['reply']),
+                    confidence['score']
+                )
+                with self._lock:
+                    candidate.pairs.append((live_version, live, shadow))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    # -------------------------
+    # Comparison
+    # -------------------------
+    def report(self, candidate_id: str) -> Optional[Dict]:
+        _, version = self.ai.db.get_prompt_version()
+        with self._lock:
+            candidate = self._candidates.get(candidate_id)
+            if candidate is None:
+                return None
+            # Only pairs taken against the current live prompt are comparable
+            pairs = [(live, shadow) for live_version, live, shadow in candidate.pairs if live_version == version]
+            report = {
+                'id': candidate.id,
+                'base_version': candidate.base_version,
+                'live_version': version,
+                'created_at': candidate.created_at,
+                'metadata': candidate.metadata,
+                'prompt_tokens': estimate_tokens(candidate.prompt),
+                'errors': candidate.errors
+            }
+
+        live = [pair[0] for pair in pairs]
+        shadow = [pair[1] for pair in pairs]
+        comparison = {
+            'samples': len(pairs),
+            'live': self._summarize(live),
+            'candidate': self._summarize(shadow)
+        }
+        checks = self._check_budgets(comparison)
+        report['comparison'] = comparison
+        report['budgets'] = checks
+        report['meets_budgets'] = all(check['ok'] for check in checks.values())
+        return report
+
+    def _summarize(self, samples: List[Tuple]) -> Dict:
+        return {
+            'p50_latency': round(_p50([s[0] for s in samples]), 3),
+            'avg_output_tokens': round(_mean([s[1] for s in samples]), 1),
+            'avg_confidence': round(_mean([s[2] for s in samples]), 3)
+        }
+
+    def _check_budgets(self, comparison: Dict) -> Dict:
+        live, candidate = comparison['live'], comparison['candidate']
+        return {
+            'samples': {
+                'ok': comparison['samples'] >= self.min_samples,
+                'limit': self.min_samples
+            },
+            'latency': {
+                'ok': candidate['p50_latency'] <= live['p50_latency'] * self.max_latency_ratio,
+                'limit': round(live['p50_latency'] * self.max_latency_ratio, 3)
+            },
+            'output_tokens': {
+                'ok': candidate['avg_output_tokens'] <= live['avg_output_tokens'] * self.max_token_ratio,
+                'limit': round(live['avg_output_tokens'] * self.max_token_ratio, 1)
+            },
+            'confidence': {
+                'ok': candidate['avg_confidence'] >= live['avg_confidence'] - self.max_confidence_drop,
+                'limit': round(live['avg_confidence'] - self.max_confidence_drop, 3)
+            }
+        }
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['candidates'] = len(self._candidates)
+            stats['pending'] = self._pending
+        stats['enabled'] = self.enabled
+        stats['sample_rate'] = self.sample_rate
+        return stats
+
+
+# Singleton
+shadow_service = ShadowService()
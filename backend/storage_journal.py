@@ -0,0 +1,245 @@
+"""
+Write-ahead log and snapshots for the in-memory database
+"""
+import glob
+import json
+import os
+import pickle
+import threading
+import time
+import traceback
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class StorageJournal:
+    """
+    Durability for DatabaseService's in-memory storage.
+
+    Every mutation is appended to a write-ahead log as one JSON line
+    ``[seq, op, record]``. A background flusher writes whatever has queued up
+    since its last fsync in one go (group commit), so concurrent writers share
+    fsyncs instead of paying for one each. Every ``snapshot_every`` entries the
+    storage is pickled to a snapshot and the log rolls over to a new segment;
+    once the snapshot is on disk, older snapshots and segments are deleted.
+    Recovery loads the newest snapshot and replays the log entries after it.
+    If a log write or fsync fails the flusher stops (what reached the disk is
+    unknown) and every writer waiting for durability gets that error.
+    """
+
+    def __init__(self, directory: str, snapshot_every: int = 50000, fsync: bool = True):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+
+        self._cond = threading.Condition()
+        self._pending: List[bytes] = []
+        self._seq = 0
+        self._durable_seq = 0
+        self._since_snapshot = 0
+        self._snapshotting = False
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._file = None
+        self._flusher: Optional[threading.Thread] = None
+        self._stats = {
+            'appends': 0,
+            'commits': 0,
+            'snapshots': 0,
+            'last_snapshot_seconds': 0,
+            'recovered_entries': 0
+        }
+
+    # -------------------------
+    # Recovery
+    # -------------------------
+    def _segments(self) -> List[Tuple[int, str]]:
+        segments = []
+        for path in glob.glob(os.path.join(self.directory, 'wal-*.log')):
+            segments.append((int(os.path.basename(path)[4:-4]), path))
+        return sorted(segments)
+
+    def _snapshots(self) -> List[Tuple[int, str]]:
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'snapshot-*.pkl')):
+            snapshots.append((int(os.path.basename(path)[9:-4]), path))
+        return sorted(snapshots)
+
+    def _read_segment(self, path: str) -> Iterator[Tuple[int, str, Any]]:
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    seq, op, record = json.loads(line)
+                except ValueError:
+                    # Torn write at the tail of the log - everything after it is lost
+                    break
+                yield seq, op, record
+
+    def recover(self) -> Tuple[Optional[Dict], List[Tuple[str, Any]]]:
+        """
+        Load the newest snapshot and the log entries written after it.
+
+        Returns (snapshot storage dict or None, [(op, record), ...]). The caller
+        installs the snapshot, applies the entries in order, then calls start().
+        """
+        state = None
+        snapshot_seq = 0
+        for seq, path in reversed(self._snapshots()):
+            try:
+                with open(path, 'rb') as f:
+                    state = pickle.load(f)
+                snapshot_seq = seq
+                break
+            except Exception:
+                continue  # Incomplete snapshot - fall back to an older one
+
+        last_seq = snapshot_seq
+        entries = []
+        for _, path in self._segments():
+            for seq, op, record in self._read_segment(path):
+                if seq > last_seq:
+                    entries.append((op, record))
+                    last_seq = seq
+
+        self._seq = self._durable_seq = last_seq
+        self._since_snapshot = len(entries)
+        self._stats['recovered_entries'] = len(entries)
+        return state, entries
+
+    def start(self):
+        """Open a fresh log segment and start the group-commit flusher"""
+        self._open_segment(self._seq + 1)
+        self._flusher = threading.Thread(target=self._flush_loop, name='storage-journal', daemon=True)
+        self._flusher.start()
+
+    # -------------------------
+    # Logging
+    # -------------------------
+    def _open_segment(self, first_seq: int):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(os.path.join(self.directory, f'wal-{first_seq:012d}.log'), 'ab')
+
+    def append(self, op: str, record: Any) -> int:
+        """
+        Queue a mutation for the log and return its sequence number.
+
+        Callers apply the mutation and append under the same lock so log order
+        matches memory order, then call wait_durable() after releasing it.
+        """
+        with self._cond:
+            self._seq += 1
+            self._pending.append(json.dumps(
+                [self._seq, op, record], separators=(',', ':'), ensure_ascii=False, default=str
+            ).encode('utf-8') + b'\n')
+            self._since_snapshot += 1
+            self._stats['appends'] += 1
+            self._cond.notify_all()
+            return self._seq
+
+    def wait_durable(self, seq: int):
+        """Block until the entry with this sequence number has been committed; raises the flusher's error"""
+        with self._cond:
+            while self._durable_seq < seq and not self._closed and self._error is None:
+                self._cond.wait()
+            if self._durable_seq < seq and self._error is not None:
+                raise self._error
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                batch, self._pending = self._pending, []
+                upto = self._seq
+
+            try:
+                self._file.write(b''.join(batch))
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except Exception as e:
+                print(f"Write-ahead log failed, writes are no longer durable: {e}")
+                traceback.print_exc()
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                self._durable_seq = upto
+                self._stats['commits'] += 1
+                self._cond.notify_all()
+
+    # -------------------------
+    # Snapshots
+    # -------------------------
+    def snapshot_due(self) -> bool:
+        return self._since_snapshot >= self.snapshot_every and not self._snapshotting
+
+    def start_snapshot(self, state: Dict):
+        """
+        Roll the log and write state as a snapshot in the background.
+
+        Must be called with the caller's storage lock held (so no appends race
+        the rollover) and with a copy of storage that later writes won't touch.
+        """
+        with self._cond:
+            # Drain the current segment so it only holds entries up to this snapshot
+            while self._durable_seq < self._seq and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+            seq = self._seq
+            self._open_segment(seq + 1)
+            self._since_snapshot = 0
+            self._snapshotting = True
+
+        threading.Thread(target=self._write_snapshot, args=(seq, state), name='storage-snapshot', daemon=True).start()
+
+    def _write_snapshot(self, seq: int, state: Dict):
+        start = time.time()
+        path = os.path.join(self.directory, f'snapshot-{seq:012d}.pkl')
+        try:
+            with open(path + '.tmp', 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + '.tmp', path)
+
+            # Everything up to seq is now covered by the snapshot
+            for old_seq, old_path in self._snapshots():
+                if old_seq < seq:
+                    os.remove(old_path)
+            for first_seq, old_path in self._segments():
+                if first_seq <= seq:
+                    os.remove(old_path)
+        finally:
+            with self._cond:
+                self._snapshotting = False
+                self._stats['snapshots'] += 1
+                self._stats['last_snapshot_seconds'] = round(time.time() - start, 3)
+                self._cond.notify_all()
+
+    def close(self):
+        """Flush pending entries, wait for any running snapshot and stop the flusher"""
+        with self._cond:
+            while self._snapshotting:
+                self._cond.wait()
+            self._closed = True
+            self._cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._file is not None:
+            self._file.close()
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['last_seq'] = self._seq
+            stats['durable_seq'] = self._durable_seq
+            stats['error'] = str(self._error) if self._error is not None else None
+        stats['avg_entries_per_commit'] = round(stats['appends'] / stats['commits'], 2) if stats['commits'] else 0
+        return stats
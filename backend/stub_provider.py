@@ -0,0 +1,64 @@
+"""
+Deterministic local LLM provider for benchmarks and offline runs
+"""
+import hashlib
+import time
+from typing import Dict
+
+_WORDS = (
+    "visa dtv thailand application documents passport bank statement balance "
+    "embassy processing days fee thb remote work proof employment soft power "
+    "course muay thai extension months entry stay please share details"
+).split()
+
+
+class StubProvider:
+    """
+    Returns canned JSON shaped like the real providers' answers.
+
+    Output depends only on the inputs, so repeated runs are identical. The
+    request kind (chat reply, confidence check, editor, manual edit) is
+    recognised from the markers AIService puts in its messages; routing
+    settings (model, temperature, max_tokens) are accepted and ignored.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, reply_words: int = 40):
+        self.latency_ms = latency_ms
+        self.reply_words = reply_words
+        self.calls = 0
+
+    def _text(self, seed: str, words: int) -> str:
+        digest = hashlib.sha256(seed.encode('utf-8')).digest()
+        return ' '.join(_WORDS[digest[i % len(digest)] % len(_WORDS)] for i in range(words))
+
+    def __call__(self, prompt: str, user_message: str, **settings) -> Dict:
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+        seed = prompt[-200:] + user_message
+        if 'rate its confidence' in user_message:
+            digest = hashlib.sha256(seed.encode('utf-8')).digest()
+            return {
+                'confidence': round(0.6 + (digest[0] % 40) / 100, 2),
+                'reasoning': 'Stub confidence assessment',
+                'flags': []
+            }
+        if user_message.startswith('EXISTING_PROMPT:'):
+            return {
+                'updated_prompt': prompt_from_editor_message(user_message),
+                'analysis': self._text(seed, 12),
+                'changes_made': 'No changes (stub provider)'
+            }
+        if user_message.startswith('CURRENT PROMPT:'):
+            current = user_message.split('CURRENT PROMPT:\n', 1)[1].split('\n\nUSER INSTRUCTIONS:', 1)[0]
+            return {
+                'explanation': 'No changes (stub provider)',
+                'updated_prompt': current
+            }
+        return {'reply': self._text(seed, self.reply_words)}
+
+
+def prompt_from_editor_message(user_message: str) -> str:
+    """Pull EXISTING_PROMPT back out of an editor request"""
+    return user_message.split('EXISTING_PROMPT:\n', 1)[1].split('\n\nCHAT HISTORY:', 1)[0]
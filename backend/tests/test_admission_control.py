@@ -0,0 +1,69 @@
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admission_control
+from admission_control import AdmissionController, AdmissionRejected, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen monotonic clock for admission_control; advance it by setting clock.now"""
+    fake = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(admission_control, 'time', types.SimpleNamespace(monotonic=lambda: fake.now))
+    return fake
+
+
+def test_bucket_refills_at_its_per_minute_rate(clock):
+    bucket = TokenBucket(60)
+    assert bucket.time_until(60) == 0
+    bucket.consume(60)
+    assert bucket.time_until(1) == pytest.approx(1.0)
+
+    clock.now += 30
+    assert bucket.time_until(30) == 0
+    assert bucket.time_until(40) == pytest.approx(10.0)
+
+    # Refill stops at capacity, and a request larger than it only waits for a full bucket
+    clock.now += 3600
+    assert bucket.tokens <= 60
+    assert bucket.time_until(1000) == 0
+    assert bucket.tokens == 60
+
+
+def test_request_over_the_rate_limit_is_rejected_with_retry_after(monkeypatch):
+    monkeypatch.setenv('LIMITED_RPM', '1')
+    monkeypatch.setenv('LLM_QUEUE_TIMEOUT_INTERACTIVE', '0.05')
+    controller = AdmissionController()
+
+    assert controller.acquire('limited', 'interactive', tokens=10) < 0.05
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('limited', 'interactive', tokens=10)
+    # One request a minute: the next slot is about a minute away
+    assert 55 < rejected.value.retry_after <= 60
+
+    stats = controller.get_stats()
+    assert stats['classes']['interactive']['admitted'] == 1
+    assert stats['classes']['interactive']['rejected'] == 1
+    assert stats['queued']['limited'] == 0
+
+
+def test_token_limit_applies_per_provider(monkeypatch):
+    monkeypatch.setenv('LIMITED_TPM', '100')
+    monkeypatch.setenv('LLM_QUEUE_TIMEOUT_BATCH', '0.05')
+    controller = AdmissionController()
+
+    controller.acquire('limited', 'batch', tokens=80)
+    with pytest.raises(AdmissionRejected):
+        controller.acquire('limited', 'batch', tokens=80)
+    # Other providers have their own (here unlimited) buckets
+    controller.acquire('other', 'batch', tokens=80)
+
+
+def test_unknown_priority_class_is_an_error():
+    with pytest.raises(ValueError):
+        AdmissionController().acquire('any', 'urgent', tokens=1)
@@ -0,0 +1,87 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_stream import EventBus
+
+
+def publish(bus, count, kind='conversation'):
+    """Publish count events after the bus's last one; returns their sequence numbers"""
+    seqs = []
+    for _ in range(count):
+        seq = bus.get_stats()['last_seq'] + 1
+        bus.publish(seq, kind, {'seq': seq})
+        seqs.append(seq)
+    return seqs
+
+
+def frame_ids(chunk):
+    return [line[4:].decode() for line in chunk.split(b'\n') if line.startswith(b'id: ')]
+
+
+def test_stream_resumes_after_the_given_event_id(monkeypatch):
+    monkeypatch.setenv('EVENT_COALESCE_MS', '0')
+    bus = EventBus()
+    first, second, third = publish(bus, 3)
+
+    stream = bus.stream(bus.cursor(first))
+    try:
+        assert next(stream).startswith(b'retry: ')
+        chunk = next(stream)
+        # Everything after the cursor goes out in one write, oldest first
+        assert frame_ids(chunk) == [bus.cursor(second), bus.cursor(third)]
+        assert b'event: conversation\ndata: {"seq":%d}' % third in chunk
+
+        fourth, = publish(bus, 1, kind='metric')
+        assert frame_ids(next(stream)) == [bus.cursor(fourth)]
+    finally:
+        stream.close()
+    assert bus.get_stats()['resets'] == 0
+
+
+def test_stream_filters_by_kind(monkeypatch):
+    monkeypatch.setenv('EVENT_COALESCE_MS', '0')
+    bus = EventBus()
+    start = bus.cursor(bus.get_stats()['last_seq'])
+    publish(bus, 1, kind='metric')
+    conversation, = publish(bus, 1)
+
+    stream = bus.stream(start, kinds={'conversation'})
+    try:
+        next(stream)
+        assert frame_ids(next(stream)) == [bus.cursor(conversation)]
+    finally:
+        stream.close()
+
+
+def test_cursor_older_than_the_buffer_gets_a_reset(monkeypatch):
+    monkeypatch.setenv('EVENT_BUFFER', '2')
+    monkeypatch.setenv('EVENT_COALESCE_MS', '0')
+    bus = EventBus()
+    first, _, _, last = publish(bus, 4)
+
+    stream = bus.stream(bus.cursor(first))
+    try:
+        next(stream)
+        chunk = next(stream)
+        assert b'event: reset' in chunk
+        # The reset carries the newest id so the client resumes from its fresh snapshot
+        assert frame_ids(chunk) == [bus.cursor(last)]
+    finally:
+        stream.close()
+    assert bus.get_stats()['resets'] == 1
+
+
+def test_cursor_from_another_process_gets_a_reset():
+    bus = EventBus()
+    publish(bus, 2)
+
+    stream = bus.stream('deadbeef-1')
+    try:
+        assert next(stream).startswith(b'retry: ')
+        chunk = next(stream)
+        assert b'event: reset' in chunk
+        assert frame_ids(chunk) == [bus.cursor(bus.get_stats()['last_seq'])]
+    finally:
+        stream.close()
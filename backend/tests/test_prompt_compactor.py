@@ -0,0 +1,47 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_compactor import compact_rules
+
+
+def test_rules_with_different_numbers_are_not_merged():
+    prompt = (
+        "- The DTV visa fee is 10,000 THB and is paid at the embassy.\n"
+        "- The DTV visa fee is 12,000 THB and is paid at the embassy.\n"
+    )
+    compacted, info = compact_rules(prompt)
+    assert info == {'duplicates': 0, 'merged': 0, 'conflicts': 0}
+    assert '10,000 THB' in compacted and '12,000 THB' in compacted
+
+
+def test_merge_keeps_the_later_rule_on_a_tie():
+    prompt = (
+        "- Always greet the client warmly by their first name.\n"
+        "- Always greet the client warmly to their first name.\n"
+    )
+    compacted, info = compact_rules(prompt)
+    assert info['merged'] == 1
+    assert compacted == "- Always greet the client warmly to their first name.\n"
+
+
+
+def test_opposite_rules_are_not_merged_and_the_newer_one_wins():
+    prompt = (
+        "- Always mention the visa processing fee when you quote the DTV package price to new clients by email.\n"
+        "- Never mention the visa processing fee when you quote the DTV package price to clients by email.\n"
+    )
+    compacted, info = compact_rules(prompt)
+    assert info == {'duplicates': 0, 'merged': 0, 'conflicts': 1}
+    assert compacted == "- Never mention the visa processing fee when you quote the DTV package price to clients by email.\n"
+
+
+def test_negation_is_not_merged_into_the_positive_rule():
+    prompt = (
+        "- Do not offer a free consultation call to every new client.\n"
+        "- Do offer a free consultation call to every new client.\n"
+    )
+    compacted, info = compact_rules(prompt)
+    assert info == {'duplicates': 0, 'merged': 0, 'conflicts': 1}
+    assert compacted == "- Do offer a free consultation call to every new client.\n"
@@ -0,0 +1,81 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from provider_router import AllProvidersFailed, ProviderRouter
+
+
+def replying(reply, delay=0.0):
+    def call():
+        time.sleep(delay)
+        return {'reply': reply}
+    return call
+
+
+def failing():
+    raise RuntimeError('primary down')
+
+
+def warm_up(router, provider, calls=3, delay=0.01):
+    """Give the provider enough latency samples for hedging to kick in"""
+    for _ in range(calls):
+        router.execute(provider, {provider: replying('warm', delay)})
+
+
+def test_failure_falls_back_to_the_secondary():
+    router = ProviderRouter(hedging=False)
+    result = router.execute('primary', {'primary': failing, 'secondary': replying('from secondary')})
+    assert result == {'reply': 'from secondary'}
+    assert router.get_stats()['decisions']['failover'] == 1
+
+
+def test_every_provider_failing_raises_all_errors():
+    router = ProviderRouter(hedging=False)
+    with pytest.raises(AllProvidersFailed) as raised:
+        router.execute('primary', {'primary': failing, 'secondary': failing})
+    assert [name for name, _ in raised.value.errors] == ['primary', 'secondary']
+
+
+def test_slow_primary_is_hedged_and_the_running_loser_abandoned():
+    router = ProviderRouter(hedge_min_samples=3)
+    warm_up(router, 'primary')
+    result = router.execute('primary', {
+        'primary': replying('from primary', delay=0.5),
+        'secondary': replying('from secondary')
+    })
+    assert result == {'reply': 'from secondary'}
+    decisions = router.get_stats()['decisions']
+    assert decisions['hedges_sent'] == 1
+    assert decisions['hedge_wins'] == 1
+    # The primary was already running, so it couldn't be cancelled
+    assert decisions['hedges_cancelled'] == 0
+    assert decisions['hedges_abandoned'] == 1
+
+
+def test_queued_loser_is_cancelled_and_counted():
+    # One worker, and the primary queues a blocker ahead of the hedge: when the
+    # primary wins, the hedge has not started and can still be cancelled
+    router = ProviderRouter(hedge_min_samples=3, max_workers=1)
+    warm_up(router, 'primary')
+    release = threading.Event()
+
+    def primary():
+        router._pool.submit(release.wait, 5)
+        time.sleep(0.2)
+        return {'reply': 'from primary'}
+
+    try:
+        result = router.execute('primary', {'primary': primary, 'secondary': replying('from secondary')})
+    finally:
+        release.set()
+    assert result == {'reply': 'from primary'}
+    decisions = router.get_stats()['decisions']
+    assert decisions['hedges_sent'] == 1
+    assert decisions['hedge_wins'] == 0
+    assert decisions['hedges_cancelled'] == 1
+    assert decisions['hedges_abandoned'] == 0
@@ -0,0 +1,101 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_coalescer import RequestCoalescer
+
+
+def run_concurrently(coalescer, fn, followers=3, on_leader_result=None):
+    """Start a leader, then followers while its call is in flight; returns (leader outcome, follower outcomes)"""
+    started = threading.Event()
+
+    def leader_fn():
+        started.set()
+        return fn()
+
+    outcomes = {}
+
+    def leader():
+        try:
+            result = coalescer.run('key', leader_fn)
+            if on_leader_result:
+                on_leader_result(result)
+            outcomes['leader'] = result
+        except Exception as e:
+            outcomes['leader'] = e
+
+    def follower(index):
+        try:
+            outcomes[index] = coalescer.run('key', leader_fn)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    started.wait(5)
+    threads += [threading.Thread(target=follower, args=(i,)) for i in range(followers)]
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return outcomes.pop('leader'), [outcomes[i] for i in range(followers)]
+
+
+def slow(result, delay=0.2):
+    def fn():
+        time.sleep(delay)
+        return result
+    return fn
+
+
+def test_followers_share_the_leaders_single_call():
+    coalescer = RequestCoalescer()
+    leader, followers = run_concurrently(coalescer, slow({'reply': 'hello'}))
+    assert leader == {'reply': 'hello'}
+    assert followers == [{'reply': 'hello'}] * 3
+    stats = coalescer.get_stats()
+    assert stats['leader_calls'] == 1 and stats['coalesced_calls'] == 3
+
+
+def test_mutating_the_leaders_result_does_not_reach_followers():
+    def mutate(result):
+        result['reply'] = 'changed by the leader'
+        result['tags'].append('leader')
+
+    coalescer = RequestCoalescer()
+    leader, followers = run_concurrently(coalescer, slow({'reply': 'hello', 'tags': []}), on_leader_result=mutate)
+    assert leader == {'reply': 'changed by the leader', 'tags': ['leader']}
+    assert followers == [{'reply': 'hello', 'tags': []}] * 3
+    # and each follower has its own copy
+    followers[0]['tags'].append('follower')
+    assert followers[1]['tags'] == []
+
+
+def test_leader_error_reaches_followers():
+    def fn():
+        time.sleep(0.2)
+        raise RuntimeError('provider down')
+
+    coalescer = RequestCoalescer()
+    leader, followers = run_concurrently(coalescer, fn)
+    assert isinstance(leader, RuntimeError)
+    assert all(isinstance(error, RuntimeError) and str(error) == 'provider down' for error in followers)
+    assert coalescer.get_stats()['leader_errors'] == 1
+
+
+def test_nothing_is_kept_after_the_call():
+    coalescer = RequestCoalescer()
+    assert coalescer.run('key', lambda: 1) == 1
+    assert coalescer.run('key', lambda: 2) == 2
+
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        coalescer.run('key', fail)
+    assert coalescer.get_stats()['in_flight'] == 0
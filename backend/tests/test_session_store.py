@@ -0,0 +1,79 @@
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import session_store
+from ai_service import format_chat_line
+from session_store import EMPTY_HISTORY, SessionStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen wall clock for session_store; advance it by setting clock.now"""
+    fake = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(session_store, 'time', types.SimpleNamespace(time=lambda: fake.now))
+    return fake
+
+
+def test_history_grows_with_each_turn(clock):
+    store = SessionStore()
+    session = store.create([{'role': 'client', 'message': 'Hi'}])
+    assert session.history_text() == format_chat_line('client', 'Hi')
+
+    session.append_turn(['Is it in stock?', 'And in blue?'], 'Yes, both.')
+    assert session.history_text() == '\n'.join([
+        format_chat_line('client', 'Hi'),
+        format_chat_line('client', 'Is it in stock?'),
+        format_chat_line('client', 'And in blue?'),
+        format_chat_line('consultant', 'Yes, both.')
+    ])
+    assert session.turns == 1
+    assert [m['role'] for m in session.messages()] == ['client', 'client', 'client', 'consultant']
+
+    assert store.get(session.id) is session
+    assert store.get('missing') is None
+    assert store.create().history_text() == EMPTY_HISTORY
+
+
+def test_idle_sessions_expire(monkeypatch, clock):
+    monkeypatch.setenv('SESSION_IDLE_TIMEOUT', '60')
+    store = SessionStore()
+    idle = store.create()
+    active = store.create()
+
+    clock.now += 45
+    assert store.get(active.id) is active
+    clock.now += 30
+    # idle was last used 75s ago, active only 30s ago
+    assert store.get(idle.id) is None
+    assert store.get(active.id) is active
+    assert store.get_stats()['expired'] == 1
+
+
+def test_least_recently_used_session_is_evicted_over_the_cap(monkeypatch, clock):
+    monkeypatch.setenv('SESSION_MAX', '2')
+    store = SessionStore()
+    first = store.create()
+    second = store.create()
+    clock.now += 1
+    store.get(first.id)
+    clock.now += 1
+    third = store.create()
+
+    assert store.get(second.id) is None
+    assert store.get(first.id) is first
+    assert store.get(third.id) is third
+    stats = store.get_stats()
+    assert stats['evicted'] == 1 and stats['active'] == 2
+
+
+def test_deleted_session_is_gone(clock):
+    store = SessionStore()
+    session = store.create(session_id='abc')
+    assert store.delete('abc')
+    assert not store.delete('abc')
+    assert store.get(session.id) is None
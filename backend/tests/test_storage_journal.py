@@ -0,0 +1,77 @@
+import glob
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage_journal import StorageJournal
+
+
+def test_failed_fsync_is_raised_to_waiting_writers(tmp_path, monkeypatch):
+    journal = StorageJournal(str(tmp_path))
+    journal.recover()
+
+    def broken_fsync(fd):
+        raise OSError(5, 'Input/output error')
+
+    monkeypatch.setattr(os, 'fsync', broken_fsync)
+    journal.start()
+
+    errors = []
+
+    def writer():
+        try:
+            journal.wait_durable(journal.append('save', {'id': 1}))
+        except OSError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert errors and errors[0].errno == 5
+
+    # Later writers fail at once instead of waiting for a flusher that is gone
+    with pytest.raises(OSError):
+        journal.wait_durable(journal.append('save', {'id': 2}))
+    assert journal.get_stats()['error']
+
+
+def test_recovery_from_snapshot_and_log_with_a_torn_tail(tmp_path):
+    journal = StorageJournal(str(tmp_path), snapshot_every=3)
+    assert journal.recover() == (None, [])
+    journal.start()
+
+    state = {'conversations': []}
+    for i in range(1, 4):
+        state['conversations'].append({'id': i})
+        journal.wait_durable(journal.append('save', {'id': i}))
+    assert journal.snapshot_due()
+    journal.start_snapshot({'conversations': list(state['conversations'])})
+    for i in range(4, 6):
+        journal.wait_durable(journal.append('save', {'id': i}))
+    deadline = time.time() + 5
+    while journal.get_stats()['snapshots'] < 1 and time.time() < deadline:
+        time.sleep(0.01)
+
+    # Crash mid-write: no close(), and half an entry at the end of the live segment
+    segment = max(glob.glob(os.path.join(str(tmp_path), 'wal-*.log')))
+    with open(segment, 'ab') as f:
+        f.write(b'[6,"save",{"id":')
+
+    reopened = StorageJournal(str(tmp_path), snapshot_every=3)
+    snapshot, entries = reopened.recover()
+    assert snapshot == {'conversations': [{'id': 1}, {'id': 2}, {'id': 3}]}
+    assert entries == [('save', {'id': 4}), ('save', {'id': 5})]
+    # Segments up to the snapshot were deleted once it was on disk
+    assert len(glob.glob(os.path.join(str(tmp_path), 'wal-*.log'))) == 1
+
+    # New writes continue the sequence after the last intact entry
+    reopened.start()
+    assert reopened.append('save', {'id': 6}) == 6
+    reopened.close()
+    journal.close()
@@ -0,0 +1,273 @@
+"""
+Training sequences compiled once into a memory-mapped binary file
+"""
+import hashlib
+import os
+import random
+import struct
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from data_processor import load_conversations, extract_sequences
+
+MAGIC = b'ISSASEQ1'
+# magic, sequences, conversations, items, strings, source size, source mtime_ns, source digest
+HEADER = struct.Struct('<8sIIIIQQ16s')
+
+# One row per sequence: its conversation, where that conversation's turn stream
+# starts, and how many turns are history / client messages / consultant reply
+SEQUENCE_DTYPE = np.dtype([('conversation', '<u4'), ('start', '<u4'), ('history', '<u4'),
+                           ('client', '<u2'), ('reply', '<u2')])
+# Per conversation: string ids of contact_id and scenario
+CONVERSATION_DTYPE = np.dtype([('contact', '<u4'), ('scenario', '<u4')])
+ROLES = ('client', 'consultant')
+
+
+def _digest(path: str) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.digest()
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def compile_dataset(source: str, target: str) -> int:
+    """Extract sequences from source and write them to target; returns the sequence count"""
+    conversations = load_conversations(source)
+    strings: Dict[str, int] = {}
+    string_list: List[str] = []
+
+    def string_id(value) -> int:
+        value = '' if value is None else str(value)
+        sid = strings.get(value)
+        if sid is None:
+            sid = strings[value] = len(string_list)
+            string_list.append(value)
+        return sid
+
+    # A sequence's history, client messages and reply are consecutive turns of its
+    # conversation, so each conversation's turns are stored once and sequences slice them
+    items: List[int] = []
+    conversation_rows = []
+    sequence_rows = []
+    for conv_index, convo in enumerate(conversations):
+        start = len(items)
+        conversation_rows.append((string_id(convo.get('contact_id')), string_id(convo.get('scenario'))))
+        for seq in extract_sequences([convo]):
+            history = len(seq['chat_history'])
+            # Turns up to this sequence are already in the stream; append what's new
+            turns = [(m['role'], m['message']) for m in seq['chat_history']]
+            turns += [('client', text) for text in seq['client_sequence']]
+            turns += [('consultant', text) for text in seq['consultant_reply']]
+            for role, text in turns[len(items) - start:]:
+                items.append(string_id(text) << 1 | ROLES.index(role))
+            sequence_rows.append((conv_index, start, history, len(seq['client_sequence']), len(seq['consultant_reply'])))
+
+    encoded = [s.encode('utf-8') for s in string_list]
+    string_offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum([len(b) for b in encoded], out=string_offsets[1:])
+
+    stat = os.stat(source)
+    header = HEADER.pack(MAGIC, len(sequence_rows), len(conversation_rows), len(items), len(encoded),
+                         stat.st_size, stat.st_mtime_ns, _digest(source))
+    sections = [
+        np.array(sequence_rows, dtype=SEQUENCE_DTYPE).tobytes(),
+        np.array(conversation_rows, dtype=CONVERSATION_DTYPE).tobytes(),
+        np.array(items, dtype='<u4').tobytes(),
+        string_offsets.tobytes(),
+        b''.join(encoded)
+    ]
+
+    tmp = f'{target}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        for section in sections:
+            f.write(b'\0' * (_align(f.tell()) - f.tell()))
+            f.write(section)
+    os.replace(tmp, target)
+    return len(sequence_rows)
+
+
+class TrainingDataset:
+    """
+    Extracted training sequences for one source file, compiled to
+    ``<source>.seq`` and read through a memory map.
+
+    The compiled file is rebuilt when the source's size and mtime changed and
+    its content hash no longer matches. Sequences are materialized on access,
+    so opening the dataset costs the same however large the corpus is.
+    """
+
+    def __init__(self, source: str, path: Optional[str] = None):
+        self.source = source
+        self.path = path or f'{source}.seq'
+        self._lock = threading.Lock()
+        self._opened_for = None
+        self._by_scenario: Optional[Dict[str, np.ndarray]] = None
+        self.stats = {'compiles': 0, 'loads': 0}
+
+    # -------------------------
+    # Loading
+    # -------------------------
+    def _fresh(self, stat) -> bool:
+        """Whether the compiled file matches the source (touching it up when only the mtime moved)"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'rb') as f:
+            raw = f.read(HEADER.size)
+        if len(raw) < HEADER.size:
+            return False
+        magic, *_, size, mtime_ns, digest = HEADER.unpack(raw)
+        if magic != MAGIC:
+            return False
+        if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+            return True
+        if size != stat.st_size or digest != _digest(self.source):
+            return False
+        # Same content, new mtime (checkout, copy): record the mtime so the next check is cheap
+        with open(self.path, 'r+b') as f:
+            f.write(HEADER.pack(*HEADER.unpack(raw)[:6], stat.st_mtime_ns, digest))
+        return True
+
+    def _ensure(self):
+        """Open (compiling first if needed) or reopen after the source changed"""
+        stat = os.stat(self.source)
+        key = (stat.st_size, stat.st_mtime_ns)
+        if self._opened_for == key:
+            return
+        with self._lock:
+            if self._opened_for == key:
+                return
+            if not self._fresh(stat):
+                compile_dataset(self.source, self.path)
+                self.stats['compiles'] += 1
+            self._open()
+            self._opened_for = key
+            self.stats['loads'] += 1
+
+    def _open(self):
+        data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        _, n_seq, n_conv, n_items, n_strings, *_ = HEADER.unpack(bytes(data[:HEADER.size]))
+        offset = HEADER.size
+
+        def section(dtype, count):
+            nonlocal offset
+            offset = _align(offset)
+            dtype = np.dtype(dtype)
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += dtype.itemsize * count
+            return array
+
+        self._sequences = section(SEQUENCE_DTYPE, n_seq)
+        self._conversations = section(CONVERSATION_DTYPE, n_conv)
+        self._items = section('<u4', n_items)
+        self._string_offsets = section('<u8', n_strings + 1)
+        self._blob = data[_align(offset):]
+        self._strings: Dict[int, str] = {}
+        self._by_scenario = None
+
+    def _string(self, sid: int) -> str:
+        value = self._strings.get(sid)
+        if value is None:
+            start, end = self._string_offsets[sid], self._string_offsets[sid + 1]
+            value = self._strings[sid] = bytes(self._blob[start:end]).decode('utf-8')
+        return value
+
+    # -------------------------
+    # Access
+    # -------------------------
+    def __len__(self) -> int:
+        self._ensure()
+        return len(self._sequences)
+
+    def __getitem__(self, index: int) -> Dict:
+        """Sequence dict as extract_sequences returns it, plus its index"""
+        self._ensure()
+        conv, start, history, client, reply = self._sequences[index].tolist()
+        contact, scenario = self._conversations[conv].tolist()
+        turns = self._items[start:start + history + client + reply].tolist()
+        return {
+            'index': int(index),
+            'contact_id': self._string(contact),
+            'scenario': self._string(scenario),
+            'client_sequence': [self._string(t >> 1) for t in turns[history:history + client]],
+            'consultant_reply': [self._string(t >> 1) for t in turns[history + client:]],
+            'chat_history': [{'role': ROLES[t & 1], 'message': self._string(t >> 1)} for t in turns[:history]]
+        }
+
+    def get_many(self, indices) -> List[Dict]:
+        return [self[i] for i in indices]
+
+    def by_scenario(self) -> Dict[str, np.ndarray]:
+        """Sequence indices per scenario"""
+        self._ensure()
+        if self._by_scenario is None:
+            scenario_ids = self._conversations['scenario'][self._sequences['conversation']]
+            self._by_scenario = {
+                self._string(int(sid)): np.flatnonzero(scenario_ids == sid)
+                for sid in np.unique(scenario_ids)
+            }
+        return self._by_scenario
+
+    def sample(self, n: int, stratified: bool = True, seed: Optional[int] = None,
+               scenario: Optional[str] = None) -> List[int]:
+        """
+        n sequence indices, in index order.
+
+        Stratified samples give each scenario its share of n (largest
+        remainder; every scenario gets one when n allows), so small
+        scenarios aren't crowded out by the big ones.
+        """
+        rng = random.Random(seed)
+        groups = self.by_scenario()
+        if scenario is not None:
+            groups = {scenario: groups.get(scenario, np.array([], dtype=np.int64))}
+        if not stratified or len(groups) == 1:
+            pool = np.concatenate(list(groups.values())) if groups else []
+            return sorted(rng.sample([int(i) for i in pool], min(n, len(pool))))
+
+        total = sum(len(g) for g in groups.values())
+        n = min(n, total)
+        quotas = {name: n * len(g) / total for name, g in groups.items()}
+        counts = {name: int(q) for name, q in quotas.items()}
+        if n >= len(groups):
+            for name in counts:
+                counts[name] = max(1, counts[name])
+        # Hand out what's left by largest remainder, then trim any overshoot from the largest strata
+        by_remainder = sorted(quotas, key=lambda name: quotas[name] - int(quotas[name]), reverse=True)
+        for name in by_remainder:
+            if sum(counts.values()) >= n:
+                break
+            if counts[name] < len(groups[name]):
+                counts[name] += 1
+        for name in sorted(counts, key=counts.get, reverse=True):
+            while sum(counts.values()) > n and counts[name] > 1:
+                counts[name] -= 1
+
+        chosen = []
+        for name, count in counts.items():
+            chosen += rng.sample([int(i) for i in groups[name]], min(count, len(groups[name])))
+        return sorted(chosen)
+
+    def get_stats(self) -> Dict:
+        self._ensure()
+        return {
+            **self.stats,
+            'path': self.path,
+            'sequences': len(self._sequences),
+            'conversations': len(self._conversations),
+            'bytes': os.path.getsize(self.path),
+            'scenarios': {name: len(indices) for name, indices in sorted(self.by_scenario().items())}
+        }
+
+
+# Singleton
+training_dataset = TrainingDataset(
+    os.getenv('TRAINING_DATA_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'conversations.json'))
+)
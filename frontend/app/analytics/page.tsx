@@ -41,6 +41,12 @@ export default function AnalyticsPage() {
     improvements: idx + 1
   })) || [];
 
+  const promptSizeData = analytics?.prompt_versions?.map((item: any) => ({
+    version: item.version,
+    tokens: item.prompt_tokens,
+    latency: item.avg_response_time
+  })) || [];
+
   return (
     <div className="min-h-screen bg-gradient-to-br from-blue-50 to-indigo-100 p-8">
       <div className="max-w-6xl mx-auto">
@@ -131,6 +137,41 @@ export default function AnalyticsPage() {
           </ResponsiveContainer>
         </div>
 
+        {/* Prompt Size vs Latency */}
+        <div className="bg-white rounded-lg shadow-lg p-6 mb-8">
+          <h2 className="text-2xl font-bold mb-4">Prompt Size &amp; Reply Latency</h2>
+          <p className="text-gray-600 mb-4">
+            Estimated prompt tokens and average measured reply time for each prompt version.
+          </p>
+          <ResponsiveContainer width="100%" height={300}>
+            <LineChart data={promptSizeData}>
+              <CartesianGrid strokeDasharray="3 3" />
+              <XAxis dataKey="version" />
+              <YAxis yAxisId="tokens" />
+              <YAxis yAxisId="latency" orientation="right" unit="s" />
+              <Tooltip />
+              <Legend />
+              <Line 
+                yAxisId="tokens" 
+                type="monotone" 
+                dataKey="tokens" 
+                stroke="#8b5cf6" 
+                strokeWidth={2}
+                name="Prompt Tokens"
+              />
+              <Line 
+                yAxisId="latency" 
+                type="monotone" 
+                dataKey="latency" 
+                stroke="#f59e0b" 
+                strokeWidth={2}
+                connectNulls
+                name="Avg Reply Time"
+              />
+            </LineChart>
+          </ResponsiveContainer>
+        </div>
+
         {/* Recent Improvements */}
         <div className="bg-white rounded-lg shadow-lg p-6">
           <h2 className="text-2xl font-bold mb-4">Recent Improvements</h2>
@@ -25,6 +25,8 @@ export default function ChatInterface() {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
+  // The backend keeps the history for this session, so each turn only sends the new message
+  const [sessionId, setSessionId] = useState<string | null>(null);
 
   // Build chat history from current state
   const chatHistory: ChatMessage[] = useMemo(() => {
@@ -46,17 +48,24 @@ export default function ChatInterface() {
     setLoading(true);
 
     try {
-      // include the newest user message (avoid stale state)
-      const nextChatHistory: ChatMessage[] = [
-        ...chatHistory,
-        { role: 'client', message: trimmed },
-      ];
-
-      const response = await api.generateReply({
-        clientSequence: trimmed,
-        chatHistory: nextChatHistory,
-        includeAnalytics: true,
-      });
+      let response;
+      try {
+        response = await api.generateReply(
+          sessionId
+            ? { clientSequence: trimmed, sessionId, includeAnalytics: true }
+            : { clientSequence: trimmed, chatHistory, session: true, includeAnalytics: true }
+        );
+      } catch (error: any) {
+        if (error?.response?.status !== 404) throw error;
+        // Session expired on the server: start a new one from the history we have
+        response = await api.generateReply({
+          clientSequence: trimmed,
+          chatHistory,
+          session: true,
+          includeAnalytics: true,
+        });
+      }
+      setSessionId(response.sessionId);
 
       setMessages((prev) => [
         ...prev,
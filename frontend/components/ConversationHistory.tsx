@@ -1,24 +1,43 @@
 'use client';
 
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { api, Conversation } from '@/lib/api';
 import { Search, Download, RefreshCw } from 'lucide-react';
 
+const PAGE_SIZE = 50;
+
 export default function ConversationHistory() {
   const [conversations, setConversations] = useState<Conversation[]>([]);
   const [loading, setLoading] = useState(true);
   const [searchQuery, setSearchQuery] = useState('');
   const [searching, setSearching] = useState(false);
+  const [newCount, setNewCount] = useState(0);
+  const showingSearch = useRef(false);
+  const pageLength = useRef(0);
 
   useEffect(() => {
-    loadConversations();
+    let unsubscribe = () => {};
+    const connect = async () => {
+      unsubscribe();
+      const data = await loadConversations();
+      unsubscribe = api.subscribeEvents(data?.cursor, {
+        conversation: applyConversation,
+        reset: connect
+      });
+    };
+    connect();
+    return () => unsubscribe();
   }, []);
 
   const loadConversations = async () => {
     setLoading(true);
     try {
-      const data = await api.getConversations(50, 0);
+      const data = await api.getConversations(PAGE_SIZE, 0);
       setConversations(data.conversations);
+      pageLength.current = data.conversations.length;
+      setNewCount(0);
+      showingSearch.current = false;
+      return data;
     } catch (error) {
       console.error('Error loading conversations:', error);
     } finally {
@@ -26,6 +45,19 @@ export default function ConversationHistory() {
     }
   };
 
+  // Pushed conversations fill the page in place; past a full page they are only counted
+  const applyConversation = (conversation: Conversation) => {
+    if (showingSearch.current) return;
+    if (pageLength.current >= PAGE_SIZE) {
+      setNewCount((n) => n + 1);
+      return;
+    }
+    pageLength.current += 1;
+    setConversations((current) =>
+      current.some((c) => c.id === conversation.id) ? current : [...current, conversation]
+    );
+  };
+
   const handleSearch = async () => {
     if (!searchQuery.trim()) {
       loadConversations();
@@ -35,6 +67,7 @@ export default function ConversationHistory() {
     setSearching(true);
     try {
       const data = await api.searchConversations(searchQuery);
+      showingSearch.current = true;
       setConversations(data.results);
     } catch (error) {
       console.error('Error searching:', error);
@@ -63,7 +96,12 @@ export default function ConversationHistory() {
   return (
     <div className="bg-white rounded-lg shadow-lg p-6">
       <div className="flex justify-between items-center mb-6">
-        <h3 className="text-2xl font-bold">Conversation History</h3>
+        <h3 className="text-2xl font-bold">
+          Conversation History
+          {newCount > 0 && (
+            <span className="ml-3 text-sm font-normal text-blue-600">{newCount} new</span>
+          )}
+        </h3>
         <div className="flex gap-2">
           <button
             onClick={loadConversations}
@@ -1,7 +1,7 @@
 'use client';
 
 import { useState, useEffect } from 'react';
-import { api } from '@/lib/api';
+import { api, PerformanceMetric } from '@/lib/api';
 import { LineChart, Line, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import { Activity, Clock, DollarSign, Zap } from 'lucide-react';
 
@@ -10,15 +10,25 @@ export default function PerformanceDashboard() {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    loadMetrics();
-    const interval = setInterval(loadMetrics, 30000); // Refresh every 30s
-    return () => clearInterval(interval);
+    let unsubscribe = () => {};
+    const connect = async () => {
+      unsubscribe();
+      const data = await loadMetrics();
+      // New metrics are pushed as they are logged instead of polling every 30s
+      unsubscribe = api.subscribeEvents(data?.cursor, {
+        metric: applyMetric,
+        reset: connect
+      });
+    };
+    connect();
+    return () => unsubscribe();
   }, []);
 
   const loadMetrics = async () => {
     try {
       const data = await api.getPerformanceMetrics(100);
       setMetrics(data);
+      return data;
     } catch (error) {
       console.error('Error loading metrics:', error);
     } finally {
@@ -26,6 +36,28 @@ export default function PerformanceDashboard() {
     }
   };
 
+  const applyMetric = (metric: PerformanceMetric & { queue_wait?: number }) => {
+    setMetrics((current: any) => {
+      if (!current) return current;
+      const s = current.summary || {};
+      const n = (s.total_requests || 0) + 1;
+      const totalTokens = (s.total_tokens || 0) + (metric.tokens_used || 0);
+      return {
+        ...current,
+        summary: {
+          ...s,
+          total_requests: n,
+          avg_response_time: +(((s.avg_response_time || 0) * (n - 1) + (metric.response_time || 0)) / n).toFixed(3),
+          avg_queue_wait: +(((s.avg_queue_wait || 0) * (n - 1) + (metric.queue_wait || 0)) / n).toFixed(3),
+          total_tokens: totalTokens,
+          avg_tokens_per_request: Math.round(totalTokens / n),
+          total_cost: +((s.total_cost || 0) + (metric.estimated_cost || 0)).toFixed(4)
+        },
+        recent_metrics: [...(current.recent_metrics || []), metric].slice(-20)
+      };
+    });
+  };
+
   if (loading) {
     return <div className="text-center py-8">Loading performance metrics...</div>;
   }
@@ -44,11 +44,25 @@ export interface PerformanceMetric {
   provider: string;
 }
 
+// Consultant (userId) and/or client (contactId) to scope conversations and documents to
+export interface Scope {
+  userId?: string;
+  contactId?: string;
+}
+
+export type DashboardEvent = 'conversation' | 'metric' | 'prompt_version' | 'reset';
+
+export type DashboardEventHandlers = Partial<Record<DashboardEvent, (data: any) => void>>;
+
 export const api = {
   // Chat
   async generateReply(data: {
     clientSequence: string | string[];
-    chatHistory: ChatMessage[];
+    chatHistory?: ChatMessage[];
+    session?: boolean;
+    sessionId?: string;
+    userId?: string;
+    contactId?: string;
     provider?: string;
     includeAnalytics?: boolean;
   }) {
@@ -63,10 +77,16 @@ export const api = {
     consultantReply: string | string[];
     provider?: string;
   }) {
+    // Returns a queued job ({ jobId, status, ... }); poll getImproveJob for the result
     const response = await axios.post(`${API_URL}/improve-ai`, data);
     return response.data;
   },
 
+  async getImproveJob(jobId: string) {
+    const response = await axios.get(`${API_URL}/improve-ai/jobs/${jobId}`);
+    return response.data;
+  },
+
   async improveAIManual(instructions: string) {
     const response = await axios.post(`${API_URL}/improve-ai-manual`, { instructions });
     return response.data;
@@ -91,20 +111,23 @@ export const api = {
 
   // Analytics
   async getAnalytics() {
-    const response = await axios.get(`${API_URL}/analytics`);
+    // The page never shows the historical prompt texts, so don't download them
+    const response = await axios.get(`${API_URL}/analytics`, {
+      params: { fields: 'version,timestamp,metadata' }
+    });
     return response.data;
   },
 
   // Conversations
-  async getConversations(limit = 50, offset = 0) {
+  async getConversations(limit = 50, offset = 0, scope: Scope = {}) {
     const response = await axios.get(`${API_URL}/conversations`, {
-      params: { limit, offset }
+      params: { limit, offset, ...scope }
     });
     return response.data;
   },
 
-  async searchConversations(query: string) {
-    const response = await axios.post(`${API_URL}/conversations/search`, { query });
+  async searchConversations(query: string, scope: Scope = {}) {
+    const response = await axios.post(`${API_URL}/conversations/search`, { query, ...scope });
     return response.data;
   },
 
@@ -123,10 +146,24 @@ export const api = {
     return response.data;
   },
 
+  // Live updates: resumes after `cursor` (from /performance or /conversations) and
+  // reconnects on its own. 'reset' means events were missed - refetch the snapshot.
+  subscribeEvents(cursor: string | undefined, handlers: DashboardEventHandlers) {
+    const params = new URLSearchParams({ types: Object.keys(handlers).filter((t) => t !== 'reset').join(',') });
+    if (cursor) params.set('since', cursor);
+    const source = new EventSource(`${API_URL}/events?${params}`);
+    for (const [type, handler] of Object.entries(handlers)) {
+      source.addEventListener(type, (e) => handler!(JSON.parse((e as MessageEvent).data)));
+    }
+    return () => source.close();
+  },
+
   // Documents
-  async uploadDocument(file: File) {
+  async uploadDocument(file: File, scope: Scope = {}) {
     const formData = new FormData();
     formData.append('file', file);
+    if (scope.userId) formData.append('userId', scope.userId);
+    if (scope.contactId) formData.append('contactId', scope.contactId);
     
     const response = await axios.post(`${API_URL}/upload-document`, formData, {
       headers: { 'Content-Type': 'multipart/form-data' }
@@ -134,8 +171,8 @@ export const api = {
     return response.data;
   },
 
-  async getDocuments() {
-    const response = await axios.get(`${API_URL}/documents`);
+  async getDocuments(scope: Scope = {}) {
+    const response = await axios.get(`${API_URL}/documents`, { params: scope });
     return response.data;
   },
 